@@ -12,6 +12,8 @@ from util.data import data
 import util.nn.pes_compNet_multifid as pes
 from util.sfi import daev
 
+from kinbot import nn_server
+
 os.environ['KMP_DUPLICATE_LIB_OK']='True'
 
 
@@ -19,7 +21,7 @@ class Nn_surr(Calculator):
     implemented_properties = ['energy', 'forces']
 
     def __init__(self, fname, restart=None, ignore_bad_restart_file=False, 
-                 label='surrogate', atoms=None, tnsr=False, **kwargs):
+                 label='surrogate', atoms=None, tnsr=False, server=None, **kwargs):
         Calculator.__init__(self, restart=restart, 
                             ignore_bad_restart_file=ignore_bad_restart_file, 
                             label=label,
@@ -28,9 +30,35 @@ class Nn_surr(Calculator):
             self.multinn = True
         else:
             self.multinn = False
-        self.surrogate = Nnpes_calc(fname, self.multinn)
+        self.fname = fname
+        # socket of the nn_server holding the models, if any,
+        # in which case the models are only loaded if it cannot be reached
+        self.server = server
+        if server is None:
+            self.surrogate = Nnpes_calc(fname, self.multinn)
         self.tnsr = tnsr
-    
+
+    def request(self, atoms_list, forces):
+        """
+        Evaluate the geometries on the server, or load the models
+        and stop using the server if it is not available or fails.
+        """
+        try:
+            answer = nn_server.request(self.server, atoms_list[0].symbols,
+                                       [atoms.positions for atoms in atoms_list],
+                                       forces=forces)
+        except (OSError, ValueError, RuntimeError) as err:
+            # ConnectionError is an OSError, a broken answer a ValueError,
+            # and the error reported by the server a RuntimeError
+            warnings.warn(f'nn_pes server on {self.server} is not available ({err}), '
+                          'loading the models.')
+            self.server = None
+            self.surrogate = Nnpes_calc(self.fname, self.multinn)
+            return None
+        if self.tnsr:
+            return {key: torch.tensor(val) for key, val in answer.items()}
+        return {key: np.array(val) for key, val in answer.items()}
+
     def calculate(self, atoms=None, properties=['energy', 'forces'], 
                   system_changes=all_changes, loaddb=None, args=None, xid=None):
         Calculator.calculate(self, atoms, properties, system_changes)
@@ -39,6 +67,18 @@ class Nn_surr(Calculator):
         else:
             favail = False
 
+        if self.server is not None:
+            answer = self.request([atoms], favail)
+            if answer is not None:
+                self.results['energy'] = answer['energies'][0]
+                self.results['energy_std'] = answer['energy_std'][0]
+                if favail:
+                    self.results['forces'] = answer['forces'][0]
+                    self.results['forces_std'] = answer['forces_std'][0]
+                if not self.tnsr:
+                    self.results['energy'] = float(self.results['energy'])
+                return
+
         xyzd = [[[s for s in atoms.symbols], np.array(atoms.positions)]]
         self.surrogate.dpes.aev_from_xyz(xyzd, 32, 8, 8, [4.6,3.1], False, 
                                          self.surrogate.myaev)
@@ -77,6 +117,75 @@ class Nn_surr(Calculator):
                 if self.multinn:
                     self.results['all_forces'] = force_ind.detach().numpy()
 
+    def calculate_many(self, atoms_list, forces=True):
+        """
+        Evaluate many geometries of the same molecule in one pass.
+        Returns a dictionary with the energies (n), energy_std (n),
+        and if requested the forces (n, natom, 3) and forces_std (n, natom, 3).
+        """
+        symbols = [s for s in atoms_list[0].symbols]
+        for atoms in atoms_list[1:]:
+            if [s for s in atoms.symbols] != symbols:
+                raise ValueError('All geometries must have the same atoms in the same order.')
+        natom = len(symbols)
+        ngeom = len(atoms_list)
+
+        if self.server is not None:
+            answer = self.request(atoms_list, forces)
+            if answer is not None:
+                return answer
+
+        xyzd = [[symbols, np.array(atoms.positions)] for atoms in atoms_list]
+        self.surrogate.dpes.aev_from_xyz(xyzd, 32, 8, 8, [4.6,3.1], False,
+                                         self.surrogate.myaev)
+        self.surrogate.nforce = natom * 3
+
+        results = {}
+        if self.multinn:
+            _, Estd, E_hf = self.surrogate.eval()
+            results['energies'] = torch.mean(E_hf, 1)
+            results['energy_std'] = Estd
+            if forces:
+                force, Fstd, _ = self.surrogate.evalforce()
+                results['forces'] = force.view(ngeom, natom, 3)
+                results['forces_std'] = Fstd.view(ngeom, natom, 3)
+        else:
+            results['energies'] = self.surrogate.eval().reshape(-1)
+            results['energy_std'] = torch.zeros(ngeom)
+            if forces:
+                force = self.surrogate.evalforce()
+                results['forces'] = force.reshape(ngeom, natom, 3)
+                results['forces_std'] = torch.zeros((ngeom, natom, 3))
+
+        if not self.tnsr:
+            results = {key: val.detach().numpy() for key, val in results.items()}
+        return results
+
+    def get_hessian(self, atoms, delta=0.005):
+        """
+        Hessian in eV/Angstrom^2, by central finite differences of the
+        analytic forces. The AEVs are computed from the positions outside
+        of torch, so the Hessian cannot be taken by autograd; instead, the
+        forces of all the 6N displaced geometries are evaluated in a single
+        batch, and nothing is written to disk.
+        delta: displacement in Angstrom
+        """
+        ncoord = 3 * len(atoms)
+        displaced = []
+        for i in range(ncoord):
+            for sign in [1., -1.]:
+                disp = atoms.copy()
+                pos = disp.get_positions().reshape(-1)
+                pos[i] += sign * delta
+                disp.set_positions(pos.reshape(-1, 3))
+                displaced.append(disp)
+        forces = self.calculate_many(displaced)['forces']
+        if self.tnsr:
+            forces = forces.detach().numpy()
+        forces = np.reshape(forces, (ncoord, 2, ncoord))
+        hessian = -(forces[:, 0] - forces[:, 1]) / (2. * delta)
+        return 0.5 * (hessian + hessian.T)
+
 
 class My_args():
 
@@ -1,50 +1,22 @@
 import itertools
 import numpy as np
 
-from kinbot import find_motif
 from kinbot.stationary_pt import StationaryPoint
 
 
-def equivalent_bond(b1, b2, species):
-    """
-    Method checks if the current bond is equivalent to
-    one of the bonds in the bonds list.
-    Bonds are always defined by the smallest atom index
-    first and the largest second.
-    """
-    # check if the first atoms of both bonds are in the
-    # same equivalency list and if the second atoms of
-    # both bonds are in the same equivalency list
-    b1_e1 = -1  # first bond first atom equivalence index
-    b1_e2 = -1  # first bond second atom equivalence index
-    b2_e1 = -1  # second bond first atom equivalence index
-    b2_e2 = -1  # second bond second atom equivalence index
-    for i, eq in enumerate(species.atom_eqv):
-        if b1[0] in eq:
-            b1_e1 = i
-        if b1[1] in eq:
-            b1_e2 = i
-        if b2[0] in eq:
-            b2_e1 = i
-        if b2[1] in eq:
-            b2_e2 = i
-    return b1_e1 == b2_e1 and b1_e2 == b2_e2
-
-
 def generate_all_product_bond_matrices(mol, par):
     """
     Generate all product bond matrices with the maximum number of bonds
-    being 2 or 3
+    being 2 or 3.
+    The reactions are generated one by one.
     """
-    reactions = []
     # generate the reactions for closed shell species
     # and for the non-radical part of open shell species
     if par['comb_molec']:
         nbonds_list = range(par['min_bond_break'], par['max_bond_break'] + 1)
         for bond in mol.bonds:
             for nbonds in nbonds_list:
-                rxns = generate_product_bond_matrices(mol, bond, nbonds, par, rad=-1)
-                reactions.extend(rxns)
+                yield from generate_product_bond_matrices(mol, bond, nbonds, par, rad=-1)
     # generate the reactions in which radicals participate
     nbonds_list = range(par['min_bond_break'] - 1, par['max_bond_break'])
     for i, bond in enumerate(mol.bonds):
@@ -55,29 +27,22 @@ def generate_all_product_bond_matrices(mol, par):
             # and another atom only has bond breaking, no forming
             if par['comb_rad']:
                 for rad in rads:
-                    rxns = generate_product_bond_matrices(mol, bond,
-                                                          nbonds, par, rad=rad)
-                    reactions.extend(rxns)
+                    yield from generate_product_bond_matrices(mol, bond, nbonds, par, rad=rad)
             # reactions involving a pi electron leading to a new lone pair
             if par['comb_pi']:
                 for i in range(mol.natom):
                     if any(bij == 2 for bij in mol.bond[i]):
-                        rxns = generate_product_bond_matrices(mol, bond,
-                                                              nbonds, par, rad=i)
-                        reactions.extend(rxns)
+                        yield from generate_product_bond_matrices(mol, bond, nbonds, par, rad=i)
             # TODO: reactions with lone electron pairs
             if par['comb_lone']:
                 for i, ai in enumerate(mol.atom):
                     if ai == 'O':
-                        rxns = generate_product_bond_matrices(mol, bond,
-                                                              nbonds, par, rad=i)
-                        reactions.extend(rxns)
-    return reactions
+                        yield from generate_product_bond_matrices(mol, bond, nbonds, par, rad=i)
 
 
 def get_product_bonds(bonds, par, rad=-1):
     """
-    This method creates a list of new atom pairs
+    This method generates the lists of new atom pairs
     which are all different than the atom pairs in
     the bonds provided as argument.
     """
@@ -88,7 +53,7 @@ def get_product_bonds(bonds, par, rad=-1):
     if rad > -1:
         for bond in bonds:
             if rad in bond:
-                return []
+                return
         atoms.append(rad)
     # generate all the possible (new) atom pairs
     pairs = []
@@ -96,94 +61,95 @@ def get_product_bonds(bonds, par, rad=-1):
         for at2 in atoms[i+1:]:
             if not sorted([at1, at2]) in bonds:
                 pairs.append([at1, at2])
-    # generate all the lists of pairs which are
-    # of the same length as the bonds list
-    all_prods = itertools.combinations(pairs, len(bonds))
-    # final list of all products
-    prods = []
-    for prod in all_prods:
-        prod_atoms = []
-        for pi in prod:
-            prod_atoms.extend(pi)
+    # number of new bonds each atom can form,
+    # the number of its broken bonds
+    budget = {at: atoms.count(at) for at in atoms}
+    for prod in valence_combinations(pairs, len(bonds), budget):
         if rad == -1:
-            # to verify if a list of product bonds is meaningful
-            # the list of product atoms needs to be identical to
-            # the list of reactant atoms
-            if sorted(atoms) == sorted(prod_atoms):
-                prods.append(sorted(prod))
-                # also make a list in which one of the bonds is not formed,
-                # this is needed to break the valence of atoms and form
-                # for example zwitterionic species.
-                if par['break_valence']:
-                    for i in range(len(prod)):
-                        prods.append(prod[:i]+prod[i+1:])
+            # to be meaningful, the list of product atoms
+            # needs to be identical to the list of reactant atoms,
+            # which is the case when all of the budget is used
+            yield sorted(prod)
+            # also make a list in which one of the bonds is not formed,
+            # this is needed to break the valence of atoms and form
+            # for example zwitterionic species.
+            if par['break_valence']:
+                for i in range(len(prod)):
+                    yield prod[:i]+prod[i+1:]
         else:
-            # to verify if a list of product bonds is meaningful
             # the list of product atoms should be the list of
-            # reactant atoms minus one atoms, which cannot be the
-            # radical atom
-            count = 0  # number of atoms for which there is a discrepancy
-            atom = []  # list of atoms for which there is a discrepancy
-            for at in atoms:
-                if atoms.count(at) != prod_atoms.count(at):
-                    count += np.abs(atoms.count(at) - prod_atoms.count(at))
-                    atom.append(at)
-            if count == 1:
-                if atom[0] != rad:
-                    prods.append(sorted(prod))
-    return prods
+            # reactant atoms minus one atom, which cannot be the
+            # radical atom, and has to be in only one broken bond
+            left = [at for at in budget if budget[at] > 0][0]
+            if left != rad and atoms.count(left) == 1:
+                yield sorted(prod)
 
 
-def is_identical(prod1, prod2, mol):
+def valence_combinations(pairs, npair, budget, start=0, prod=()):
     """
-    Check if two products are unique by verifying if the
-    shorted chain between the new bonds is equivalent
-    Idential chains are chains of the same length of which
-    all elements are pairwise equivalent.
+    The combinations of npair pairs, in the order of itertools.combinations,
+    in which no atom is in more pairs than its budget.
+    The combinations exceeding the budget are abandoned as soon as the
+    first pair exceeding it is added.
+    budget: dictionary of the atoms, updated in place, holds the remaining
+    budget of each atom when a combination is yielded
     """
-    # Check if all bonds of one product are equivalent to a bond
-    # of the other product and put this in a dictionary
-    eq = {}
-    for i, pi in enumerate(prod1):
-        if i not in eq.values():
-            for j, pj in enumerate(prod2):
-                if j not in eq:
-                    if equivalent_bond(pi, pj, mol):
-                        eq[j] = i
-    if len(eq) == len(prod1):
-        # this means all bonds have one equivalent bond in the
-        # other bonds list
-
-        # now, create chains between the two members of each new bond
-        # and check if the full chain is of identical length
-        for i in eq:
-            b1 = prod1[eq[i]]
-            b2 = prod2[i]
-            chain1 = get_chain(b1[0], b1[1], mol)
-            chain2 = get_chain(b2[0], b2[1], mol)
-            if len(chain1) != len(chain2):
-                return 0
-        return 1
-    else:
-        return 0
+    if len(prod) == npair:
+        yield prod
+        return
+    for k in range(start, len(pairs) - (npair - len(prod)) + 1):
+        at1, at2 = pairs[k]
+        budget[at1] -= 1
+        budget[at2] -= 1
+        if budget[at1] >= 0 and budget[at2] >= 0:
+            yield from valence_combinations(pairs, npair, budget, k + 1, prod + (pairs[k],))
+        budget[at1] += 1
+        budget[at2] += 1
+
+
+def equivalence_classes(mol):
+    """
+    Index of the equivalence list of each atom in mol.atom_eqv,
+    if an atom is in more than one list, the last one.
+    """
+    eqv_class = [-1] * mol.natom
+    for i, eq in enumerate(mol.atom_eqv):
+        for at in eq:
+            eqv_class[at] = i
+    return eqv_class
 
 
-def get_chain(a1, a2, mol):
+def distances(mol):
     """
-    Get the shortest chain between two atoms
+    Number of bonds on the shortest path between each pair of atoms,
+    -1 if they are not connected.
     """
-    for i in range(1, mol.natom):
-        motif = ['X' for j in range(i)]
-        instances = find_motif.start_motif(motif,
-                                           mol.natom,
-                                           mol.bond,
-                                           mol.atom,
-                                           a1,
-                                           [[k] for k in range(mol.natom)])
-        for ins in instances:
-            if ins[-1] == a2:
-                return ins
-    return []
+    neighbors = [[j for j in range(mol.natom) if mol.bond[i][j] > 0] for i in range(mol.natom)]
+    dist = np.full((mol.natom, mol.natom), -1, dtype=int)
+    for i in range(mol.natom):
+        dist[i][i] = 0
+        front = [i]
+        while front:
+            new_front = []
+            for at in front:
+                for nb in neighbors[at]:
+                    if dist[i][nb] == -1:
+                        dist[i][nb] = dist[i][at] + 1
+                        new_front.append(nb)
+            front = new_front
+    return dist
+
+
+def reaction_key(reac, prod, eqv_class, dist):
+    """
+    Canonical key of a reaction: two reactions are identical if their
+    broken and their formed bonds are between the same equivalent atoms,
+    whose shortest chains are of the same length.
+    """
+    def bond_key(b):
+        return (*sorted([eqv_class[b[0]], eqv_class[b[1]]]), dist[b[0]][b[1]])
+    return (tuple(sorted(bond_key(b) for b in reac)),
+            tuple(sorted(bond_key(b) for b in prod)))
 
 
 def generate_ts(reac, prod, bond):
@@ -209,67 +175,56 @@ def generate_ts(reac, prod, bond):
 def generate_product_bond_matrices(mol, bond, nbonds, par, rad=-1):
     """
     This method does the following:
-    1. Generate all possible combinations of three bonds in the molecule
-    2. For each combination, create all the possible
-       permutation of the 6 atoms involved
+    1. Generate all possible combinations of nbonds bonds in the molecule
+    2. For each combination, generate all the possible
+       new pairs of the atoms involved
     3. Filter the combinations that lead to identical atom rearrangements
-    4. Create (and return) a list of bond matrices of the product
-       and the transition state
+    4. Generate the reactions with the bond matrix of the transition state
     rad: index of the radical site to consider, -1 if this search is applied
     to closed shell (or the non-radical part of a) molecule.
     """
-    # list of all reactions to explore
-    reactions = []
-
     bonds = []
     for i in range(len(mol.atom)-1):
         for j in range(i+1, len(mol.atom)):
             if bond[i, j] > 0:
                 bonds.append([i, j])
 
-    reactive_atoms = itertools.combinations(bonds, nbonds)
-
-    # contains product bonds
-    all_prods = []
-    # contains react bonds
-    all_reacts = []
-
-    for comb in reactive_atoms:
-        # instead of directly adding the reactions to the all_prods
-        # and all_reacts list, first add them to this rxns list.
-        # Reactions from one comb are compared to one another to
-        # assure uniqueness. Reactions from different comb lists
-        # are always different form one another.
-        # This significantly speeds up the generation of the reactions
-        rxns = []
-
+    eqv_class = equivalence_classes(mol)
+    dist = distances(mol)
+    # keys of the reactions generated so far
+    keys = set()
+    for comb in itertools.combinations(bonds, nbonds):
         # look for all possibilies in which all of the nbonds break
-        prod_bonds = get_product_bonds(comb, par, rad=rad)
-
-        for prod in prod_bonds:
+        for prod in get_product_bonds(comb, par, rad=rad):
             # verify if this reaction is unique
-            new = 1
-            for rxn in reactions:
-                if (is_identical(rxn[1], prod, mol) and
-                        is_identical(rxn[0], comb, mol)):
-                    new = 0
-            if new:
-                ts = generate_ts(comb, prod, bond)
-                # add the reaction three times, with an early, a mid
-                # and a late ts
-                # reactions.append([comb, prod, ts, 0])
-                reactions.append([comb, prod, ts, 1])
-                # reactions.append([comb, prod, ts, 2])
-    return reactions
+            key = reaction_key(comb, prod, eqv_class, dist)
+            if key in keys:
+                continue
+            keys.add(key)
+            ts = generate_ts(comb, prod, bond)
+            # add the reaction three times, with an early, a mid
+            # and a late ts
+            # yield [comb, prod, ts, 0]
+            yield [comb, prod, ts, 1]
+            # yield [comb, prod, ts, 2]
 
 
 def main():
     smi = '[CH2]CC'
     mult = 1
     charge = 0
+    # the default combinatorial parameters
+    par = {'min_bond_break': 2,
+           'max_bond_break': 3,
+           'comb_molec': 1,
+           'comb_rad': 1,
+           'comb_pi': 1,
+           'comb_lone': 1,
+           'break_valence': 1,
+           }
     mol = StationaryPoint('well0', charge, mult, smiles=smi)
     mol.characterize()
-    reactions = generate_all_product_bond_matrices(mol)
+    reactions = list(generate_all_product_bond_matrices(mol, par))
 
 
 if __name__ == "__main__":
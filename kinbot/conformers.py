@@ -1,6 +1,5 @@
 import os
 import random
-import time
 import copy
 import logging
 from shutil import copyfile
@@ -16,6 +15,7 @@ from kinbot import geometry
 from kinbot import zmatrix
 from kinbot.stationary_pt import StationaryPoint
 from kinbot import constants
+from kinbot.profiling import profiler
 
 logger = logging.getLogger('KinBot')
 
@@ -160,8 +160,9 @@ class Conformers:
             else:
                 self.cyc_conf_geoms.append(copy.deepcopy(cart))
 
-        for ci in range(self.cyc_conf):
-            self.start_ring_conformer_search(ci, copy.deepcopy(self.species.geom))
+        with self.qc.job_array():
+            for ci in range(self.cyc_conf):
+                self.start_ring_conformer_search(ci, copy.deepcopy(self.species.geom))
 
     def start_ring_conformer_search(self, index, cart):
         """
@@ -258,7 +259,9 @@ class Conformers:
                 return 1, geoms
             else:
                 if wait:
-                    time.sleep(1)
+                    running = [self.get_job_name(i, cyc=1) 
+                               for i, si in enumerate(self.cyc_conf_status) if si == -1]
+                    self.qc.wait_for_jobs(running)
                 else:
                     return 0, np.zeros((self.species.natom, 3))
 
@@ -582,7 +585,12 @@ class Conformers:
 
             else:
                 if wait:
-                    time.sleep(1)
+                    add = ''
+                    if self.semi_emp:
+                        add = 'semi_emp_'
+                    running = [self.get_job_name(i, add=add) 
+                               for i, si in enumerate(status) if si == -1]
+                    self.qc.wait_for_jobs(running)
                 else:
                     return 0, lowest_conf, np.zeros((self.species.natom, 3)), \
                            self.species.energy, np.zeros((self.species.natom, 3)), \
@@ -622,6 +630,7 @@ class Conformers:
                 
         return geom, energy, zpe 
 
+    @profiler.timed('conformer dedup')
     def find_unique(self, conformers, energies, frequencies, valid, temp=None, boltz=None):
         """
         Given a set of conformers, finds the set of unique ones.
@@ -114,6 +114,8 @@ for e in epsilon:
 qsubmit = {'pbs': 'qsub'}
 qsubmit['slurm'] = 'sbatch'
 qsubmit['puget'] = './'
+qcancel = {'pbs': 'qdel'}
+qcancel['slurm'] = 'scancel'
 # extensions
 qext = {'pbs': '.pbs',
         'slurm': '.sbatch',
@@ -0,0 +1,87 @@
+import logging
+
+import numpy as np
+
+from kinbot.db_shards import merge_shards
+
+logger = logging.getLogger('KinBot')
+
+
+class DatabaseCache:
+    """
+    In-memory index over the ase database, mapping each job name to the
+    information KinBot reads from the last row written under that name.
+    The rows are only read once: each refresh selects the rows whose id
+    is larger than the last one seen. The potentially large arrays, such
+    as the Hessian, are not kept, but are read on demand from the row.
+    """
+    def __init__(self, db, shard_dir=None):
+        """
+        db: the ase database connection
+        shard_dir: directory of the rows written by the jobs, which are
+            merged into the database before each refresh
+        """
+        self.db = db
+        self.shard_dir = shard_dir
+        # job name -> dictionary of the last row's information
+        self.entries = {}
+        # job name -> number of rows written under that name
+        self.nrows = {}
+        self.last_id = 0
+
+    def refresh(self):
+        """
+        Add the rows written since the last refresh.
+        """
+        if self.shard_dir is not None:
+            merge_shards(self.shard_dir, self.db)
+        for row in self.db.select(f'id>{self.last_id}'):
+            self.add(row)
+            self.last_id = row.id
+
+    def add(self, row):
+        prev = self.entries.get(row.name)
+        data = row.get('data')
+        entry = {'id': row.id,
+                 'positions': np.array(row.positions),
+                 'prev_positions': None,
+                 'symbols': np.array(list(''.join(row.symbols))),
+                 'status': None,
+                 'energy': None,
+                 'zpe': None,
+                 'frequencies': None,
+                 }
+        if prev is not None:
+            entry['prev_positions'] = prev['positions']
+            entry['frequencies'] = prev['frequencies']
+        if data is not None:
+            entry['status'] = data.get('status')
+            entry['energy'] = data.get('energy')
+            entry['zpe'] = data.get('zpe')
+            if data.get('frequencies') is not None:
+                entry['frequencies'] = list(data.get('frequencies'))
+        self.entries[row.name] = entry
+        self.nrows[row.name] = self.nrows.get(row.name, 0) + 1
+
+    def get(self, name):
+        """
+        The information of the last row of the job, or None if it is not in the database.
+        """
+        self.refresh()
+        return self.entries.get(name)
+
+    def count(self, name):
+        """
+        Number of rows written under the name of the job.
+        """
+        self.refresh()
+        return self.nrows.get(name, 0)
+
+    def get_data(self, name, key):
+        """
+        Read one item of the data of the last row of the job from the database.
+        """
+        entry = self.get(name)
+        if entry is None:
+            return None
+        return self.db.get(id=entry['id']).data.get(key)
@@ -0,0 +1,60 @@
+"""
+Sharded writing of the job results.
+
+When the shards directory exists in the working directory, the job
+templates do not write into the shared kinbot.db, but each row goes into
+a small database file of its own, which is moved into the shards directory
+once complete. KinBot then merges the shards into kinbot.db, so that the
+main database has a single writer.
+"""
+import os
+import time
+import uuid
+import glob
+import logging
+
+from ase.db import connect
+
+logger = logging.getLogger('KinBot')
+
+
+class ShardWriter:
+    """
+    Writes each row into a new shard file, with the interface of the
+    ase database used by the templates.
+    """
+    def __init__(self, shard_dir):
+        self.shard_dir = shard_dir
+
+    def write(self, atoms, **kwargs):
+        # the shard is only visible under its final name when complete
+        name = f'{time.time_ns():020d}_{os.getpid()}_{uuid.uuid4().hex}'
+        tmp = f'{self.shard_dir}/.{name}.tmp'
+        connect(tmp, type='db').write(atoms, **kwargs)
+        os.rename(tmp, f'{self.shard_dir}/{name}.db')
+
+
+def connect_db(working_dir):
+    """
+    The database the job writes its results into.
+    """
+    shard_dir = f'{working_dir}/shards'
+    if os.path.isdir(shard_dir):
+        return ShardWriter(shard_dir)
+    return connect(f'{working_dir}/kinbot.db')
+
+
+def merge_shards(shard_dir, db):
+    """
+    Move the rows of the complete shards into the database, in the
+    order they were written. Returns the number of merged rows.
+    """
+    nrow = 0
+    for shard in sorted(glob.glob(f'{shard_dir}/*.db')):
+        for row in connect(shard).select():
+            db.write(row.toatoms(), key_value_pairs=row.key_value_pairs, data=row.data)
+            nrow += 1
+        os.remove(shard)
+    if nrow > 0:
+        logger.debug(f'Merged {nrow} rows from {shard_dir}.')
+    return nrow
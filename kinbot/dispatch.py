@@ -0,0 +1,136 @@
+import logging
+
+logger = logging.getLogger('KinBot')
+
+# relative cost of the methods, by the jobtype given to submit_qc
+method_cost = {'am1': 0.1, 'pm3': 0.1, 'mp2': 3., 'high': 5.}
+# suffixes of the jobs of a reaction after its instance name, longest first
+reaction_suffixes = ['_IRC_F_prod', '_IRC_R_prod', '_IRC_F', '_IRC_R', '_prod', '_high']
+
+
+def job_stage(job):
+    """
+    Rank of the job in the exploration, the lower the earlier it is dispatched.
+    Jobs finishing a reaction (IRCs and product optimizations) go before
+    the refinements (high level, conformers, rotors, VRC-TST), and these
+    go before the searches of new saddle points.
+    """
+    if '_IRC_' in job or job.endswith('_well') or job.endswith('_well_mp2') \
+            or job.endswith('_well_bls'):
+        return 0
+    if job.endswith('_high'):
+        return 1
+    if job.startswith('conf/') or job.startswith('hir/'):
+        return 2
+    if '/' in job:
+        return 3
+    return 4
+
+
+class Dispatcher:
+    """
+    Outbound queue of the jobs to be submitted to the queuing system.
+    Jobs are handed over to the queuing system only while the user has
+    fewer than queue_job_limit jobs there, the others wait here. Instead
+    of blocking the caller until a slot frees up, the queue is drained
+    whenever KinBot checks the status of its jobs.
+    When slots free up, the waiting jobs are taken by their stage, then
+    by the L1 barrier of their reaction (lowest first, if known), then
+    by their estimated cost (cheapest first), then in order of request.
+    """
+    def __init__(self, submit, queue_status, limit):
+        """
+        submit: function submitting a job, called as submit(job, template_head_file)
+        queue_status: instance of QueueStatus
+        limit: maximum number of jobs in the queue, no limit if not positive
+        """
+        self.submit_job = submit
+        self.queue_status = queue_status
+        self.limit = limit
+        # job -> (queue template, sort key without the barrier)
+        self.pending = {}
+        self.nrequest = 0
+        # reaction instance name -> L1 barrier (kcal/mol)
+        self.barriers = {}
+
+    def free_slots(self):
+        """
+        Number of jobs that can be submitted right now.
+        """
+        if self.limit <= 0:
+            return len(self.pending)
+        return self.limit - self.queue_status.njobs()
+
+    def set_barrier(self, instance_name, barrier):
+        """
+        Register the L1 barrier of a reaction, used for the jobs whose
+        name is the instance name of the reaction followed by a suffix.
+        """
+        self.barriers[instance_name] = barrier
+
+    def barrier(self, job):
+        """
+        The barrier of the reaction the job belongs to, infinite if unknown.
+        Only the known suffixes are removed from the job name, as the name
+        of another reaction can be the beginning of the instance name.
+        """
+        if job in self.barriers:
+            return self.barriers[job]
+        for suffix in reaction_suffixes:
+            if job.endswith(suffix):
+                return self.barriers.get(job[:-len(suffix)], float('inf'))
+        return float('inf')
+
+    def priority(self, job):
+        """
+        Sort key of a waiting job, the smallest is dispatched first.
+        """
+        stage, cost, order = self.pending[job][1]
+        return stage, self.barrier(job), cost, order
+
+    def submit(self, job, template_head_file, jobtype=None, natom=None):
+        """
+        Queue the job and submit what the limit allows.
+        jobtype: the method of the job, if not the default one
+        natom: the number of atoms, for the cost estimate
+        Returns True if the job was submitted, False if it was deferred.
+        """
+        cost = method_cost.get(jobtype, 1.)
+        if job.endswith('_high'):
+            cost *= method_cost['high']
+        if natom is not None:
+            cost *= natom ** 3
+        self.pending[job] = (template_head_file, (job_stage(job), cost, self.nrequest))
+        self.nrequest += 1
+        self.drain()
+        if job in self.pending:
+            logger.debug(f'DEFERRED {job}, the queue is full')
+            return False
+        return True
+
+    def drain(self):
+        """
+        Submit the waiting jobs for which there are free slots.
+        """
+        if len(self.pending) == 0:
+            return
+        nfree = self.free_slots()
+        if nfree <= 0:
+            return
+        order = sorted(self.pending, key=self.priority)
+        for job in order[:nfree]:
+            template_head_file, _ = self.pending.pop(job)
+            self.submit_job(job, template_head_file)
+
+    def cancel(self, job):
+        """
+        Drop the job if it is waiting here.
+        Returns True if it was waiting.
+        """
+        return self.pending.pop(job, None) is not None
+
+    def is_deferred(self, job):
+        """
+        Whether the job is waiting here for a free slot.
+        """
+        return job in self.pending
@@ -0,0 +1,96 @@
+"""
+Finite difference Hessian with the displaced calculations run in parallel.
+
+The forces of the displaced geometries are independent single points, so
+instead of running them one after the other, they are distributed over a
+pool of processes, each calculation with its own label. One atom is not
+displaced at all: its columns of the Hessian follow from the others, as
+the forces do not change when the whole molecule is translated.
+"""
+import re
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger('KinBot')
+
+# calculator arguments setting the number of threads of a calculation
+thread_kwargs = ['nprocshared', 'nt']
+# calculator arguments setting the memory of a calculation
+memory_kwargs = ['mem']
+
+
+def displacements(natom):
+    """
+    The (atom, coordinate, sign) of the displaced geometries.
+    The last atom is not displaced.
+    """
+    return [(at, xyz, sign) for at in range(natom - 1) for xyz in range(3) for sign in [1, -1]]
+
+
+def split_memory(mem, nworker):
+    """
+    The memory of one of nworker calculations sharing mem,
+    given either as a number or as a string with a unit, e.g., '700MW'.
+    """
+    if isinstance(mem, (int, float)):
+        return max(1, int(mem) // nworker)
+    match = re.fullmatch(r'(\d+)\s*([A-Za-z]*)', str(mem).strip())
+    if match is None:
+        logger.warning(f'Cannot split the memory {mem} between the calculations.')
+        return mem
+    return f'{max(1, int(match.group(1)) // nworker)}{match.group(2)}'
+
+
+def calc_forces(calc_class, parameters, atoms, label):
+    """
+    Forces of one displaced geometry, run in the worker processes.
+    """
+    atoms.calc = calc_class(**parameters)
+    atoms.calc.label = label
+    return atoms.get_forces()
+
+
+def calc_hessian(atoms, label, nproc=1, delta=0.01):
+    """
+    Hessian in eV/Angstrom^2 by central differences of the forces.
+    atoms: the molecule with its calculator attached
+    label: the displaced calculations are labeled {label}_{i}
+    nproc: number of cores, the calculations share them and the memory
+    delta: displacement in Angstrom
+    """
+    natom = len(atoms)
+    disps = displacements(natom)
+    nworker = max(1, min(nproc, len(disps)))
+    parameters = dict(atoms.calc.parameters)
+    for key in thread_kwargs:
+        if key in parameters:
+            parameters[key] = max(1, nproc // nworker)
+    for key in memory_kwargs:
+        if key in parameters:
+            parameters[key] = split_memory(parameters[key], nworker)
+
+    tasks = []
+    for i, (at, xyz, sign) in enumerate(disps):
+        disp = atoms.copy()
+        disp.positions[at, xyz] += sign * delta
+        tasks.append((type(atoms.calc), parameters, disp, f'{label}_{i}'))
+
+    if nworker == 1:
+        forces = [calc_forces(*task) for task in tasks]
+    else:
+        # the job scripts are not importable, so the workers are forked
+        with ProcessPoolExecutor(max_workers=nworker,
+                                 mp_context=multiprocessing.get_context('fork')) as pool:
+            forces = list(pool.map(calc_forces, *zip(*tasks)))
+    forces = np.reshape(forces, (natom - 1, 3, 2, 3 * natom))
+
+    hessian = np.zeros((3 * natom, 3 * natom))
+    hessian[:, :-3] = np.reshape(-(forces[:, :, 0] - forces[:, :, 1]) / (2. * delta),
+                                 (3 * (natom - 1), 3 * natom)).T
+    # translational invariance: the columns of each coordinate sum to zero
+    for xyz in range(3):
+        hessian[:, 3 * (natom - 1) + xyz] = -np.sum(hessian[:, xyz:-3:3], axis=1)
+    return 0.5 * (hessian + hessian.T)
@@ -1,7 +1,278 @@
+import numpy as np
+
+
 def start_motif(motif, natom, bond, atom, allover, eqv):
+    """
+    Find all instances of the motif, a chain of covalently bonded atoms
+    of the given types, 'X' standing for any atom.
+    If allover is >= 0, only chains starting at that atom are searched.
+    eqv: lists of equivalent atoms. A chain is not returned if an earlier
+    chain already had an equivalent (but not the same) atom at the same
+    position, unless the chain itself already passed through an atom
+    equivalent to it.
+    Returns the chains in the order of a depth-first search going over
+    the atoms in increasing index, the same as start_motif_recursive.
+    """
+    nmotif = len(motif)
+    if nmotif == 0 or nmotif > natom:
+        return []
+    # the atoms allowed at each position of the motif
+    allowed = [[mot == 'X' or at == mot for at in atom[:natom]] for mot in motif]
+    if not all(any(allow) for allow in allowed):
+        return []
+    indptr, indices = neighbor_list(bond, natom)
+    eqv_other = equivalent_atoms(eqv, natom)
+    # the atoms at each position of the unmasked chains found so far
+    seen = [set() for _ in motif]
+    motifset = []
+
+    chain = []
+    masks = []
+    on_chain = [False] * natom
+
+    def accept(pos, current, mask_current):
+        """
+        The mask of the chain extended by current at pos, None if it cannot be extended.
+        """
+        if on_chain[current] or not allowed[pos][current]:
+            return None
+        others = eqv_other[current]
+        if any(at in seen[pos] for at in others):
+            if any(on_chain[at] for at in others):
+                return False
+            return None
+        return mask_current
+
+    def add(new_chain, mask_current):
+        motifset.append(new_chain)
+        if mask_current:
+            for pos, at in enumerate(new_chain):
+                seen[pos].add(at)
+
+    if allover < 0:
+        starts = range(natom)
+    else:
+        starts = [allover]
+    for start in starts:
+        mask_current = accept(0, start, True)
+        if mask_current is None:
+            continue
+        if nmotif == 1:
+            add([start], mask_current)
+            continue
+        chain.append(start)
+        masks.append(mask_current)
+        on_chain[start] = True
+        # position in the neighbor list of each atom of the chain
+        cursor = [indptr[start]]
+        while cursor:
+            last = chain[-1]
+            if cursor[-1] == indptr[last + 1]:
+                # all neighbors tried, step back
+                cursor.pop()
+                on_chain[chain.pop()] = False
+                masks.pop()
+                continue
+            current = indices[cursor[-1]]
+            cursor[-1] += 1
+            pos = len(chain)
+            mask_current = accept(pos, current, masks[-1])
+            if mask_current is None:
+                continue
+            if pos == nmotif - 1:
+                add(chain + [current], mask_current)
+                continue
+            chain.append(current)
+            masks.append(mask_current)
+            on_chain[current] = True
+            cursor.append(indptr[current])
+    return motifset
+
+
+def neighbor_list(bond, natom):
+    """
+    The bonded neighbors of the atoms in compressed sparse row form:
+    the neighbors of atom i are indices[indptr[i]:indptr[i + 1]],
+    in increasing order.
+    """
+    bond = np.asarray(bond)[:natom, :natom]
+    # neighbors j of i are the atoms with bond[j][i] != 0
+    rows, cols = np.nonzero(bond.T)
+    indptr = np.zeros(natom + 1, dtype=int)
+    np.cumsum(np.bincount(rows, minlength=natom), out=indptr[1:])
+    return indptr.tolist(), cols.tolist()
+
+
+def equivalent_atoms(eqv, natom):
+    """
+    The other atoms equivalent to each atom, if an atom is in more than
+    one list, the last one is used.
+    """
+    eqv_other = [()] * natom
+    for mylist in eqv:
+        for at in mylist:
+            eqv_other[at] = tuple(a for a in mylist if a != at)
+    return eqv_other
+
+
+class MotifNode:
+    """
+    Node of the motif trie: the motifs starting with the same atom types
+    share the nodes of their common beginning.
+    """
+    def __init__(self):
+        # atom type ('X' for any) -> MotifNode
+        self.children = {}
+        # the patterns passing through this node
+        self.patterns = []
+        # the patterns ending at this node
+        self.ending = set()
+
+
+class MotifMatcher:
+    """
+    Searches many motifs in one pass over the chains of a molecule.
+    The motifs, each with its starting atom (-1 for any), are added first,
+    and then run walks the chains once, following all motifs whose
+    beginning the chain matches. Each motif gets the same instances in
+    the same order as from its own start_motif call.
+    """
+    def __init__(self, natom, bond, atom, eqv):
+        self.natom = natom
+        self.bond = bond
+        self.atom = atom
+        self.eqv = eqv
+        # (motif, start) -> index of the pattern
+        self.patterns = {}
+        # index of the pattern -> instances, filled by run
+        self.results = None
+
+    @staticmethod
+    def key(motif, allover):
+        return tuple(motif), max(-1, int(allover))
+
+    def add(self, motif, allover=-1):
+        key = self.key(motif, allover)
+        if key not in self.patterns:
+            self.patterns[key] = len(self.patterns)
+
+    def get(self, motif, allover=-1):
+        """
+        The instances of the motif. Motifs not added before run are
+        searched on their own.
+        """
+        key = self.key(motif, allover)
+        if self.results is None or key not in self.patterns:
+            return start_motif(motif, self.natom, self.bond, self.atom, allover, self.eqv)
+        # the callers may modify the instances
+        return [inst[:] for inst in self.results[self.patterns[key]]]
+
+    def run(self):
+        natom = self.natom
+        atom = self.atom
+        npattern = len(self.patterns)
+        self.results = [[] for _ in range(npattern)]
+        if npattern == 0:
+            return
+        motifs = [None] * npattern
+        starts = [None] * npattern
+        for (motif, allover), index in self.patterns.items():
+            motifs[index] = motif
+            starts[index] = allover
+
+        root = MotifNode()
+        for index, motif in enumerate(motifs):
+            if len(motif) == 0 or len(motif) > natom:
+                continue
+            node = root
+            for mot in motif:
+                node = node.children.setdefault(mot, MotifNode())
+                node.patterns.append(index)
+            node.ending.add(index)
+
+        indptr, indices = neighbor_list(self.bond, natom)
+        eqv_other = equivalent_atoms(self.eqv, natom)
+        # for each pattern, the atoms at each position of its unmasked chains
+        seen = [[set() for _ in motif] for motif in motifs]
+        chain = []
+        on_chain = [False] * natom
+
+        def extend(state, current):
+            """
+            Follow the patterns of the chain to its next atom, current.
+            state: list of (node, {pattern: mask}) the chain matches
+            Returns the state of the extended chain.
+            """
+            pos = len(chain)
+            others = eqv_other[current]
+            equivalent_on_chain = any(on_chain[at] for at in others)
+            new_state = []
+            for node, active in state:
+                for mot in (atom[current], 'X'):
+                    child = node.children.get(mot)
+                    if child is None:
+                        continue
+                    survivors = {}
+                    for index in child.patterns:
+                        mask_current = active.get(index)
+                        if mask_current is None:
+                            continue
+                        if others and any(at in seen[index][pos] for at in others):
+                            if not equivalent_on_chain:
+                                continue
+                            mask_current = False
+                        if index in child.ending:
+                            inst = chain + [current]
+                            self.results[index].append(inst)
+                            if mask_current:
+                                for p, at in enumerate(inst):
+                                    seen[index][p].add(at)
+                        else:
+                            survivors[index] = mask_current
+                    if len(survivors) > 0:
+                        new_state.append((child, survivors))
+            return new_state
+
+        if any(start < 0 for start in starts):
+            start_atoms = range(natom)
+        else:
+            start_atoms = sorted(set(starts))
+        for start in start_atoms:
+            active = {index: True for index in range(npattern)
+                      if starts[index] < 0 or starts[index] == start}
+            state = extend([(root, active)], start)
+            if len(state) == 0:
+                continue
+            chain.append(start)
+            on_chain[start] = True
+            # the state and the position in the neighbor list of each atom of the chain
+            states = [state]
+            cursor = [indptr[start]]
+            while cursor:
+                last = chain[-1]
+                if cursor[-1] == indptr[last + 1]:
+                    cursor.pop()
+                    states.pop()
+                    on_chain[chain.pop()] = False
+                    continue
+                current = indices[cursor[-1]]
+                cursor[-1] += 1
+                if on_chain[current]:
+                    continue
+                state = extend(states[-1], current)
+                if len(state) == 0:
+                    continue
+                chain.append(current)
+                on_chain[current] = True
+                states.append(state)
+                cursor.append(indptr[current])
+
+
+def start_motif_recursive(motif, natom, bond, atom, allover, eqv):
     """
     Initialize the motif search.
     If allover is >0, that atom is used as a starting point.
+    Reference implementation of start_motif.
     """
     visit = [0] * natom
     chain = [-999] * natom
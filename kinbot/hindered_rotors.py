@@ -1,4 +1,3 @@
-import time
 import logging
 import numpy as np
 import matplotlib.pyplot as plt
@@ -55,39 +54,40 @@ class HIR:
             self.hir_energies.append([-1 for i in range(self.nrotation)])
             self.hir_geoms.append([[] for i in range(self.nrotation)])
 
-        for rotor in range(len(self.species.dihed)):
-            if skip_rotor(self.species.name, self.species.dihed[rotor]) == 1:
-                self.hir_status[rotor] = [2 for i in range(self.nrotation)]
-                logger.info('\tFor {} rotor {} was skipped in HIR.'.format(self.species.name, rotor))
-                continue
+        with self.qc.job_array():
+            for rotor in range(len(self.species.dihed)):
+                if skip_rotor(self.species.name, self.species.dihed[rotor]) == 1:
+                    self.hir_status[rotor] = [2 for i in range(self.nrotation)]
+                    logger.info('\tFor {} rotor {} was skipped in HIR.'.format(self.species.name, rotor))
+                    continue
 
-            cart = np.asarray(cart)
-            zmat_atom, zmat_ref, zmat, zmatorder = zmatrix.make_zmat_from_cart(self.species, rotor, cart, 0)
+                cart = np.asarray(cart)
+                zmat_atom, zmat_ref, zmat, zmatorder = zmatrix.make_zmat_from_cart(self.species, rotor, cart, 0)
 
-            # first element has same geometry
-            cart_new = zmatrix.make_cart_from_zmat(zmat,
-                                                   zmat_atom,
-                                                   zmat_ref,
-                                                   self.species.natom,
-                                                   self.species.atom,
-                                                   zmatorder)
-            fi = [(zi + 1) for zi in zmatorder[:4]]
-            self.qc.qc_hir(self.species, cart_new, rotor, 0, [fi], rigid)
-            for ai in range(1, self.nrotation):
-                ang = 360. / float(self.nrotation)
-                zmat[3][2] += ang
-                for i in range(4, self.species.natom):
-                    if zmat_ref[i][2] == 4:
-                        zmat[i][2] += ang
-                    if zmat_ref[i][2] == 1:
-                        zmat[i][2] += ang
+                # first element has same geometry
                 cart_new = zmatrix.make_cart_from_zmat(zmat,
                                                        zmat_atom,
                                                        zmat_ref,
                                                        self.species.natom,
                                                        self.species.atom,
                                                        zmatorder)
-                self.qc.qc_hir(self.species, cart_new, rotor, ai, [fi], rigid)
+                fi = [(zi + 1) for zi in zmatorder[:4]]
+                self.qc.qc_hir(self.species, cart_new, rotor, 0, [fi], rigid)
+                for ai in range(1, self.nrotation):
+                    ang = 360. / float(self.nrotation)
+                    zmat[3][2] += ang
+                    for i in range(4, self.species.natom):
+                        if zmat_ref[i][2] == 4:
+                            zmat[i][2] += ang
+                        if zmat_ref[i][2] == 1:
+                            zmat[i][2] += ang
+                    cart_new = zmatrix.make_cart_from_zmat(zmat,
+                                                           zmat_atom,
+                                                           zmat_ref,
+                                                           self.species.natom,
+                                                           self.species.atom,
+                                                           zmatorder)
+                    self.qc.qc_hir(self.species, cart_new, rotor, ai, [fi], rigid)
         return 0
 
     def test_hir(self):
@@ -95,10 +95,7 @@ class HIR:
             for ai in range(self.nrotation):
                 success = None
                 if self.hir_status[rotor][ai] == -1:
-                    if self.species.wellorts:
-                        job = 'hir/' + self.species.name + '_hir_' + str(rotor) + '_' + str(ai).zfill(2)
-                    else:
-                        job = 'hir/' + str(self.species.chemid) + '_hir_' + str(rotor) + '_' + str(ai).zfill(2)
+                    job = self.get_job_name(rotor, ai)
                     err, geom = self.qc.get_qc_geom(job, self.species.natom)
                     if err == 1:  # still running
                         continue
@@ -193,10 +190,22 @@ class HIR:
                 return 1
             else:
                 if wait:
-                    time.sleep(1)
+                    running = [self.get_job_name(rotor, ai)
+                               for rotor in range(len(self.species.dihed))
+                               for ai in range(self.nrotation)
+                               if self.hir_status[rotor][ai] == -1]
+                    self.qc.wait_for_jobs(running)
                 else:
                     return 0
 
+    def get_job_name(self, rotor, ai):
+        """
+        Name of the job of the ai-th point along the scan of the rotor
+        """
+        if self.species.wellorts:
+            return 'hir/' + self.species.name + '_hir_' + str(rotor) + '_' + str(ai).zfill(2)
+        return 'hir/' + str(self.species.chemid) + '_hir_' + str(rotor) + '_' + str(ai).zfill(2)
+
     def write_profile(self, rotor, job):
         """
         Write a molden-readable file with the
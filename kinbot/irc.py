@@ -190,6 +190,6 @@ class IRC:
             with open('{}.py'.format(irc_name), 'w') as f:
                 f.write(template)
 
-            self.rxn.qc.submit_qc(irc_name, singlejob=0)
+            self.rxn.qc.submit_qc(irc_name, singlejob=0, natom=self.rxn.species.natom)
 
         return 0
@@ -0,0 +1,266 @@
+import os
+import sys
+import time
+import asyncio
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+from kinbot.utils import tail
+
+logger = logging.getLogger('KinBot')
+
+# inotify event masks, see inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def has_done_stamp(log_file):
+    """
+    Whether the last line of the log file is the done stamp
+    the job templates append at the very end.
+    """
+    try:
+        return 'done' in tail(log_file, 1)
+    except (OSError, UnicodeDecodeError):
+        return False
+
+
+class JobWatcher:
+    """
+    Blocks until the log files of the awaited jobs receive their done stamp.
+    On Linux the directories of the logs are watched with inotify, so
+    local writes wake up the waiter immediately. Writes coming from other
+    nodes of a network filesystem are not always seen by inotify, hence the
+    (size, mtime) of the awaited logs are also polled with an increasing
+    interval, which is the only mechanism on other platforms.
+    """
+    def __init__(self, par):
+        """
+        job_watch_max_interval: the longest time between two stat polls (s)
+        job_watch_timeout: waiters return after this time (s) even if
+            no done stamp appeared, so that jobs killed by the queuing
+            system are also noticed
+        """
+        self.max_interval = par['job_watch_max_interval']
+        self.timeout = par['job_watch_timeout']
+        # directory -> inotify watch descriptor, and the reverse
+        self.wds = {}
+        self.dirs = {}
+        self.fd = self.init_inotify()
+        # log file -> (size, mtime) at the last poll
+        self.stats = {}
+        # log file -> ((size, mtime), whether it has the done stamp)
+        self.done = {}
+        # log file -> (size, mtime) when its job was submitted, the stamp of
+        # a log that did not change since is left by an earlier job of the same name
+        self.submitted = {}
+        # log file -> futures of the coroutines waiting for it
+        self.waiters = {}
+        # event loop in which the inotify descriptor is watched
+        self.reader_loop = None
+
+    def init_inotify(self):
+        """
+        Returns the inotify file descriptor or None if not available.
+        """
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            logger.debug('inotify is not available, falling back to polling.')
+            return None
+        return fd
+
+    def watch(self, directory):
+        """
+        Add an inotify watch on the directory if there is none yet.
+        """
+        if self.fd is None or directory in self.wds:
+            return
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        wd = self.libc.inotify_add_watch(self.fd, directory.encode(), mask)
+        if wd >= 0:
+            self.wds[directory] = wd
+            self.dirs[wd] = directory
+
+    def read_events(self, timeout):
+        """
+        Wait at most timeout seconds for inotify events and return
+        the set of files that changed.
+        """
+        changed = set()
+        ready, _, _ = select.select([self.fd], [], [], max(timeout, 0.))
+        if not ready:
+            return changed
+        try:
+            buf = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return changed
+        pos = 0
+        while pos + EVENT_HEADER.size <= len(buf):
+            wd, _, _, length = EVENT_HEADER.unpack_from(buf, pos)
+            pos += EVENT_HEADER.size
+            name = buf[pos:pos + length].rstrip(b'\0').decode()
+            pos += length
+            if wd in self.dirs and name:
+                changed.add(os.path.join(self.dirs[wd], name))
+        return changed
+
+    def poll(self, logs):
+        """
+        Stat the logs and return the ones whose size or mtime changed.
+        """
+        changed = set()
+        for log in logs:
+            try:
+                st = os.stat(log)
+                stat = (st.st_size, st.st_mtime)
+            except OSError:
+                stat = None
+            if self.stats.get(log) != stat:
+                self.stats[log] = stat
+                changed.add(log)
+        return changed
+
+    @staticmethod
+    def signature(log_file):
+        """
+        The (size, mtime) of the log, None if it does not exist.
+        """
+        try:
+            st = os.stat(log_file)
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def mark_submitted(self, log_file):
+        """
+        Called when the job of the log is submitted, the log has to change
+        before its done stamp counts.
+        """
+        self.submitted[os.path.abspath(log_file)] = self.signature(log_file)
+
+    def is_finished(self, log_file):
+        """
+        Whether the log has a done stamp written by the last submitted job.
+        """
+        if log_file in self.submitted:
+            if self.signature(log_file) == self.submitted[log_file]:
+                return False
+        return self.is_done(log_file)
+
+    def is_done(self, log_file):
+        """
+        Whether the log has the done stamp. Only the end of the file is read,
+        and the answer is kept together with the (size, mtime) of the log,
+        so an unchanged log is never opened again.
+        """
+        stat = self.signature(log_file)
+        if stat is None:
+            return False
+        cached = self.done.get(log_file)
+        if cached is not None and cached[0] == stat:
+            return cached[1]
+        done = has_done_stamp(log_file)
+        self.done[log_file] = (stat, done)
+        return done
+
+    def wait(self, logs, timeout=None):
+        """
+        Block until one of the logs gets a done stamp, or until timeout.
+        If a log already has the stamp of its last submitted job, the job is
+        about to leave the queue and only a short nap is taken. The stamp
+        of an earlier job of the same name, e.g. the previous step of a
+        saddle point search, is not counted, see mark_submitted.
+        Returns the list of logs that have the done stamp.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        logs = [os.path.abspath(log) for log in logs]
+        self.poll(logs)
+        done = [log for log in logs if self.is_finished(log)]
+        if len(done) > 0:
+            time.sleep(1)
+            return done
+        for log in logs:
+            self.watch(os.path.dirname(log))
+
+        deadline = time.time() + timeout
+        interval = 1.
+        while time.time() < deadline:
+            nap = min(interval, deadline - time.time())
+            if self.fd is not None:
+                changed = self.read_events(nap) & set(logs)
+            else:
+                time.sleep(max(nap, 0.))
+                changed = set()
+            changed |= self.poll(logs)
+            done = [log for log in changed if self.is_finished(log)]
+            if len(done) > 0:
+                return done
+            interval = min(2. * interval, self.max_interval)
+        return []
+
+    def wake_waiters(self):
+        """
+        Called by the event loop when inotify has events: resolve the
+        futures of the logs that received their done stamp.
+        """
+        for log in self.read_events(0.):
+            if log in self.waiters and self.is_finished(log):
+                for future in self.waiters[log]:
+                    if not future.done():
+                        future.set_result([log])
+
+    async def wait_async(self, logs, timeout=None):
+        """
+        Coroutine version of wait, other coroutines run while waiting.
+        The inotify descriptor is watched by the event loop, and the logs
+        are also polled with an increasing interval.
+        Returns the list of logs that have the done stamp.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        logs = [os.path.abspath(log) for log in logs]
+        done = [log for log in logs if self.is_finished(log)]
+        if len(done) > 0:
+            await asyncio.sleep(1)
+            return done
+        loop = asyncio.get_running_loop()
+        if self.fd is not None and self.reader_loop is not loop:
+            loop.add_reader(self.fd, self.wake_waiters)
+            self.reader_loop = loop
+        future = loop.create_future()
+        for log in logs:
+            self.watch(os.path.dirname(log))
+            self.waiters.setdefault(log, set()).add(future)
+
+        deadline = loop.time() + timeout
+        interval = 1.
+        try:
+            while loop.time() < deadline:
+                nap = min(interval, deadline - loop.time())
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), nap)
+                except asyncio.TimeoutError:
+                    pass
+                done = [log for log in logs if self.is_finished(log)]
+                if len(done) > 0:
+                    return done
+                interval = min(2. * interval, self.max_interval)
+            return []
+        finally:
+            for log in logs:
+                self.waiters[log].discard(future)
+                if len(self.waiters[log]) == 0:
+                    del self.waiters[log]
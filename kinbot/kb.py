@@ -17,6 +17,7 @@ from kinbot.vrc_tst_scan import VTS
 from kinbot.qc import QuantumChemistry
 from kinbot.utils import make_dirs, clean_files
 from kinbot.config_log import config_log
+from kinbot.profiling import profiler
 
 
 def main():
@@ -52,6 +53,8 @@ def main():
     logger.info('Starting KinBot')
 
     make_dirs(par)
+    if par['profile']:
+        profiler.enable()
 
     if par['bimol'] == 0:
         # initialize the reactant
@@ -291,7 +294,7 @@ def main():
             rg.generate()
 
     if par['me'] > 0:  # it will be 2 for kinbots when the mess file is needed but not run
-        mess = MESS(par, well0)
+        mess = MESS(par, well0, queue_status=qc.queue_status)
         mess.write_input(qc)
         # vdW_wells = []
         # for reac in well0.reac_obj:
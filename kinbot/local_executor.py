@@ -0,0 +1,121 @@
+import os
+import sys
+import logging
+import subprocess
+from collections import deque
+
+from kinbot.profiling import profiler
+
+logger = logging.getLogger('KinBot')
+
+
+class LocalExecutor:
+    """
+    Runs the python scripts of the jobs on the local machine, in place of
+    a queuing system. Each job gets ppn cores, and jobs are only started
+    while there are enough free cores and the number of running jobs is
+    below queue_job_limit (if positive). The rest wait in a FIFO.
+    """
+    def __init__(self, par):
+        """
+        local_cores: number of cores KinBot can use, 0 means all the cores
+        this process is allowed to run on
+        """
+        self.ppn = par['ppn']
+        if par['local_cores'] > 0:
+            self.ncores = par['local_cores']
+        elif hasattr(os, 'sched_getaffinity'):
+            self.ncores = len(os.sched_getaffinity(0))
+        else:
+            self.ncores = os.cpu_count()
+        self.limit = par['queue_job_limit']
+        # jobs waiting for cores
+        self.pending = deque()
+        # job -> running process
+        self.procs = {}
+        logger.debug(f'Local execution of jobs on {self.ncores} cores, '
+                     f'{self.ppn} cores per job.')
+
+    def submit(self, job):
+        """
+        Queue the {job}.py script and start it if resources allow.
+        Returns the pid if the job was started right away, otherwise None.
+        """
+        if job not in self.procs and job not in self.pending:
+            self.pending.append(job)
+        self.dispatch()
+        return self.pid(job)
+
+    def pid(self, job):
+        """
+        The process id of the job if it is running.
+        """
+        if job in self.procs:
+            return self.procs[job].pid
+        return None
+
+    def reap(self):
+        """
+        Remove the finished processes.
+        """
+        for job, proc in list(self.procs.items()):
+            if proc.poll() is not None:
+                if proc.returncode != 0:
+                    logger.debug(f'Local job {job} exited with code {proc.returncode}.')
+                del self.procs[job]
+
+    def free(self):
+        """
+        Whether another job can be started now.
+        A job needing more cores than available still runs, but alone.
+        """
+        if self.limit > 0 and len(self.procs) >= self.limit:
+            return False
+        if len(self.procs) == 0:
+            return True
+        return (len(self.procs) + 1) * self.ppn <= self.ncores
+
+    def dispatch(self):
+        """
+        Start the waiting jobs for which there are free cores.
+        """
+        self.reap()
+        while len(self.pending) > 0 and self.free():
+            job = self.pending.popleft()
+            self.start(job)
+
+    def start(self, job):
+        errdir = os.path.dirname(f'perm/{job}')
+        os.makedirs(errdir, exist_ok=True)
+        env = dict(os.environ, OMP_NUM_THREADS=str(self.ppn))
+        with open(f'perm/{job}.stdout', 'w') as out, \
+                open(f'perm/{job}.err', 'w') as err:
+            self.procs[job] = subprocess.Popen([sys.executable, f'{job}.py'],
+                                               stdout=out,
+                                               stderr=err,
+                                               stdin=subprocess.DEVNULL,
+                                               env=env)
+        logger.debug(f'Started {job} locally with pid {self.procs[job].pid}.')
+        profiler.job('submitted', job, pid=self.procs[job].pid)
+        profiler.job('started', job)
+
+    def cancel(self, job):
+        """
+        Drop the job if it is waiting, or kill it if it is running.
+        Returns True if the job was waiting or running.
+        """
+        if job in self.pending:
+            self.pending.remove(job)
+            return True
+        if job in self.procs:
+            self.procs.pop(job).kill()
+            self.dispatch()
+            return True
+        return False
+
+    def is_running(self, job):
+        """
+        Whether the job is waiting for cores or is running.
+        """
+        self.dispatch()
+        return job in self.procs or job in self.pending
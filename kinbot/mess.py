@@ -8,6 +8,7 @@ from collections import Counter
 from kinbot import kb_path
 from kinbot import constants
 from kinbot import frequencies
+from kinbot.queue_status import QueueStatus
 from kinbot.uncertaintyAnalysis import UQ
 
 
@@ -18,9 +19,13 @@ class MESS:
     """
 
 
-    def __init__(self, par, species):
+    def __init__(self, par, species, queue_status=None):
         self.par = par
         self.species = species
+        # share the snapshot of the queue with the qc jobs if possible
+        if queue_status is None:
+            queue_status = QueueStatus(par)
+        self.queue_status = queue_status
         self.well_names = {}
         self.bimolec_names = {}
         self.fragment_names = {}
@@ -780,18 +785,10 @@ class MESS:
             pid = out.split('\n')[0].split('.')[0]
         elif self.par['queuing'] == 'slurm':
             pid = out.split('\n')[0].split()[-1]
+        # not in the snapshot yet, but it should not count as finished
+        self.queue_status.add(pid)
         return pid
 
-    def check_running(self, pid):
-        devnull = open(os.devnull, 'w')
-        if self.par['queuing'] == 'pbs':
-            command = 'qstat -f | grep ' + '"Job Id: ' + pid + '"' + ' > /dev/null'
-        elif self.par['queuing'] == 'slurm':
-            command = 'scontrol show job ' + pid + ' | grep "JobId=' + pid + '"' + ' > /dev/null'
- 
-        stat = int(subprocess.call(command, shell=True, stdout=devnull, stderr=devnull))
-        return stat
-
     def make_geom(self, g, a):
         geom = ''
         for i, at in enumerate(a):
@@ -891,11 +888,9 @@ class MESS:
         return (energy + zpe) * constants.AUtoKCAL
 
     def check_running(self, pid):
-        devnull = open(os.devnull, 'w')
-        if self.par['queuing'] == 'pbs':
-            command = 'qstat -f | grep ' + '"Job Id: ' + pid + '"' + ' > /dev/null'
-        elif self.par['queuing'] == 'slurm':
-            command = 'scontrol show job ' + pid + ' | grep "JobId=' + pid + '"' + ' > /dev/null'
-
-        stat = int(subprocess.call(command, shell=True, stdout=devnull, stderr=devnull))
-        return stat
+        '''
+        Returns 0 if the job is in the queue, 1 otherwise.
+        '''
+        if self.queue_status.is_queued(pid):
+            return 0
+        return 1
@@ -23,6 +23,7 @@ from kinbot import constants
 from kinbot import find_motif
 from kinbot import geometry
 from kinbot import zmatrix
+from kinbot.profiling import profiler
 
 logger = logging.getLogger('KinBot')
 
@@ -106,6 +107,7 @@ def append_geom(natom, step, new_e, atom, x_new, grad, atoms_list, f_out=None):
     return step
 
 
+@profiler.timed('modify_coordinates')
 def modify_coordinates(species, name, geom, changes, bond, write_files=0):
     """
     Geom is the geometry (n x 3 matrix with n the number of atoms)
@@ -0,0 +1,259 @@
+"""
+Inference server of the nn_pes surrogate.
+
+Loading the ensemble of models takes much longer than evaluating them for
+a small molecule, so instead of every nn_pes job loading the models, a
+long-lived server started by KinBot loads them once, and the jobs send it
+their geometries through a Unix socket. Requests arriving at the same
+time for the same atoms are evaluated together in one batch.
+The server only serves the jobs running on the node it was started on,
+other jobs load the models themselves.
+"""
+import os
+import sys
+import json
+import time
+import fcntl
+import queue
+import socket
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+import socketserver
+
+from ase import Atoms
+
+logger = logging.getLogger('KinBot')
+
+
+def socket_path(fname):
+    """
+    The socket of the server of the given models, shared by all KinBot
+    runs using the same models.
+    """
+    if not isinstance(fname, list):
+        fname = [fname]
+    models = json.dumps([os.path.abspath(fn) for fn in fname])
+    digest = hashlib.sha1(models.encode()).hexdigest()[:16]
+    return f'{tempfile.gettempdir()}/kinbot_nn_{os.getuid()}_{digest}.sock'
+
+
+def is_serving(path):
+    """
+    Whether a server is listening on the socket.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        return False
+    finally:
+        sock.close()
+    return True
+
+
+def start_server(fname, idle_time=3600.):
+    """
+    Start a server for the models in the background, unless one is
+    already listening. Returns the path of its socket.
+    Called when a KinBot run starts, and again by the run when the server
+    exited after being idle. If several runs start a server at the same
+    time, all but one of them exit right away, see serve.
+    """
+    path = socket_path(fname)
+    if is_serving(path):
+        return path
+    if not isinstance(fname, list):
+        fname = [fname]
+    with open('nn_server.log', 'a') as log:
+        subprocess.Popen([sys.executable, '-m', 'kinbot.nn_server', path,
+                          '--idle', str(idle_time)] + fname,
+                         stdout=log,
+                         stderr=log,
+                         stdin=subprocess.DEVNULL,
+                         start_new_session=True)
+    logger.info(f'Started nn_pes server on {path}.')
+    return path
+
+
+def request(path, symbols, positions, forces=True, timeout=300.):
+    """
+    Evaluate the geometries on the server.
+    symbols: the atoms, the same for all geometries
+    positions: list of geometries
+    timeout: seconds to wait for the server, socket.timeout (an OSError) is raised after
+    Returns the dictionary of Nn_surr.calculate_many, with lists for arrays.
+    """
+    message = {'symbols': list(symbols),
+               'positions': [[list(map(float, xyz)) for xyz in geom] for geom in positions],
+               'forces': forces,
+               }
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        with sock.makefile('rw') as stream:
+            stream.write(json.dumps(message) + '\n')
+            stream.flush()
+            answer = stream.readline()
+    if not answer:
+        raise ConnectionError(f'No answer from the nn_pes server on {path}.')
+    answer = json.loads(answer)
+    if 'error' in answer:
+        raise RuntimeError(f'nn_pes server: {answer["error"]}')
+    return answer
+
+
+class Batcher:
+    """
+    Collects the requests of the connections, and evaluates the requests
+    waiting at the same time with the same atoms and properties in one call.
+    """
+    def __init__(self, calc):
+        self.calc = calc
+        self.requests = queue.Queue()
+        self.last_request = time.time()
+
+    def evaluate(self, message):
+        """
+        Called from the connection threads, blocks until the result is ready.
+        """
+        self.last_request = time.time()
+        done = threading.Event()
+        item = {'message': message, 'done': done}
+        self.requests.put(item)
+        done.wait()
+        return item['answer']
+
+    def run(self):
+        while True:
+            batch = [self.requests.get()]
+            while True:
+                try:
+                    batch.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+            groups = {}
+            for item in batch:
+                try:
+                    msg = item['message']
+                    key = (tuple(msg['symbols']), bool(msg['forces']))
+                except Exception as err:
+                    self.answer(item, {'error': repr(err)})
+                    continue
+                groups.setdefault(key, []).append(item)
+            for (symbols, forces), items in groups.items():
+                try:
+                    self.evaluate_group(symbols, forces, items)
+                except Exception as err:
+                    for item in items:
+                        if not item['done'].is_set():
+                            self.answer(item, {'error': repr(err)})
+
+    @staticmethod
+    def answer(item, answer):
+        item['answer'] = answer
+        item['done'].set()
+
+    def evaluate_group(self, symbols, forces, items):
+        """
+        Evaluate the requests together. A malformed request is answered
+        with its error, and does not affect the others.
+        """
+        valid = []
+        atoms_list = []
+        for item in items:
+            try:
+                atoms = [Atoms(symbols, positions=geom) for geom in item['message']['positions']]
+            except Exception as err:
+                self.answer(item, {'error': repr(err)})
+                continue
+            if len(atoms) == 0:
+                self.answer(item, {'error': 'No geometries in the request.'})
+                continue
+            valid.append((item, len(atoms)))
+            atoms_list.extend(atoms)
+        if len(valid) == 0:
+            return
+        try:
+            results = self.calc.calculate_many(atoms_list, forces=forces)
+        except Exception as err:
+            for item, _ in valid:
+                self.answer(item, {'error': repr(err)})
+            return
+        start = 0
+        for item, ngeom in valid:
+            end = start + ngeom
+            self.answer(item, {key: val[start:end].tolist() for key, val in results.items()})
+            start = end
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            message = json.loads(line)
+        except ValueError as err:
+            answer = {'error': repr(err)}
+        else:
+            answer = self.server.batcher.evaluate(message)
+        self.wfile.write((json.dumps(answer) + '\n').encode())
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(path, fname, idle_time):
+    """
+    Load the models and answer requests until there were none for idle_time seconds.
+    """
+    # The servers starting for the same socket take turns, so that only
+    # the first one binds it and a listening socket is never removed.
+    with open(f'{path}.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if is_serving(path):
+            return
+        if os.path.exists(path):
+            # left behind by a server that was killed
+            os.remove(path)
+        # Bind before loading the models, so that the jobs wait for this
+        # server instead of starting to load the models themselves.
+        server = Server(path, Handler)
+        inode = os.stat(path).st_ino
+    try:
+        from kinbot.ase_modules.calculators.nn_pes import Nn_surr
+        if len(fname) == 1:
+            fname = fname[0]
+        server.batcher = Batcher(Nn_surr(fname))
+        threading.Thread(target=server.batcher.run, daemon=True).start()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        while time.time() - server.batcher.last_request < idle_time:
+            time.sleep(1)
+        server.shutdown()
+    finally:
+        server.server_close()
+        # only remove the socket if it is still the one bound here
+        try:
+            if os.stat(path).st_ino == inode:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the nn_pes models to the KinBot jobs.')
+    parser.add_argument('socket', help='path of the Unix socket')
+    parser.add_argument('models', nargs='+', help='files of the models')
+    parser.add_argument('--idle', type=float, default=3600.,
+                        help='exit after this many seconds without requests')
+    args = parser.parse_args()
+    serve(args.socket, args.models, args.idle)
+
+
+if __name__ == '__main__':
+    main()
@@ -111,10 +111,11 @@ class Optimize:
                     if self.ssemi_empconf == -1:
                         # semi empirical part has not started yet
                         self.species.semi_emp_confs = Conformers(self.species, self.par, self.qc, semi_emp=1)
-                        for geom in self.species.confs.cyc_conf_geoms:
-                            # take all the geometries from the cyclic part
-                            # generate the conformers for the current geometry
-                            self.species.semi_emp_confs.generate_conformers(0, geom)
+                        with self.qc.job_array():
+                            for geom in self.species.confs.cyc_conf_geoms:
+                                # take all the geometries from the cyclic part
+                                # generate the conformers for the current geometry
+                                self.species.semi_emp_confs.generate_conformers(0, geom)
                         # set conf status to running
                         self.ssemi_empconf = 0
                         if self.ssemi_empconf == 0:
@@ -137,18 +138,20 @@ class Optimize:
                         # else start from cyclic conformers
                         if self.par['semi_emp_conformer_search'] == 1:
                             self.species.confs.nconfs = 1
-                            for i, geom in enumerate(self.semi_emp_conformers):
-                                if (self.semi_emp_energies[i] - self.semi_emp_low_energy) * constants.AUtoKCAL < self.par['semi_emp_confomer_threshold']:
-                                    self.species.confs.generate_conformers(-999, geom)
+                            with self.qc.job_array():
+                                for i, geom in enumerate(self.semi_emp_conformers):
+                                    if (self.semi_emp_energies[i] - self.semi_emp_low_energy) * constants.AUtoKCAL < self.par['semi_emp_confomer_threshold']:
+                                        self.species.confs.generate_conformers(-999, geom)
                             logger.info("\tThere are {} structures below the {} kcal/mol threshold for species {} in the semiempirical search.". \
                                          format(i, self.par['semi_emp_confomer_threshold'], self.name))
                         else:
                             print_warning = True
-                            for geom in self.species.confs.cyc_conf_geoms:
-                                # take all the geometries from the cyclic part
-                                # generate the conformers for the current geometry
-                                self.skip_conf_check = self.species.confs.generate_conformers(0, geom, print_warning=print_warning)
-                                print_warning = False
+                            with self.qc.job_array():
+                                for geom in self.species.confs.cyc_conf_geoms:
+                                    # take all the geometries from the cyclic part
+                                    # generate the conformers for the current geometry
+                                    self.skip_conf_check = self.species.confs.generate_conformers(0, geom, print_warning=print_warning)
+                                    print_warning = False
                         # set conf status to running
                         self.sconf = 0
                     if self.sconf == 0:
@@ -72,6 +72,9 @@ class Parameters:
             'keep_chemids': ['none'],
             # Skip specific reactions, usually makes sense once the search is done
             'skip_reactions': ['none'],
+            # Keep the progress of the reactions in a snapshot file, and resume from it
+            # on restart instead of walking through the finished steps again
+            'restart_snapshot': False,
             # perform variational calculations for the homolytic scissions
             'variational': 0,
             # break specific bonds in the homolytic search
@@ -106,6 +109,9 @@ class Parameters:
             'pes': 0,
             # Maximum number of simultaneous kinbot runs in a pes search
             'simultaneous_kinbot': 5,
+            # Share the results of the well and product optimizations between
+            # the wells of a pes search, identical calculations are only done once
+            'result_cache': False,
             # Perform high level optimization and freq calculation (L2)
             'high_level': 0,
             # Calculate AIE for each conformer - requires conformer search
@@ -184,6 +190,9 @@ class Parameters:
             'one_reaction_fam': 0,
             # For cyclic transition states, look at this ring size range
             'ringrange': [3, 9],
+            # Number of processes searching the reaction families, with one task
+            # for each family and resonance structure, 1 to search serially
+            'family_search_nproc': 1,
 
             # CALCULATION PARAMETERS
             # Which quantum chemistry code to use
@@ -264,6 +273,9 @@ class Parameters:
             'imagfreq_threshold': 50.,
             # List of files containing the parameters for the NN model. 
             'nn_model': None,
+            # Serve the nn_model from a server process started by KinBot, which
+            # loads the models once for all the jobs running on the same node
+            'nn_server': False,
 
             # VRC-TST PARAMETERS
             # Amount (Mb) of memory to use in rotdPy for each job during the sampling.
@@ -337,9 +349,46 @@ class Parameters:
             'username': '',
             # Max. number of job from user in queue, if negative, ignored
             'queue_job_limit': -1,
+            # Cancel the queued and running jobs of the reactions which
+            # are deleted, unless other reactions need them as well
+            'cancel_jobs': False,
+            # Record the lifecycle of the jobs and the time spent in the stages of the
+            # reactions in kinbot_profile.jsonl, summarized by the kinbot-profile command
+            'profile': False,
+            # Lifetime of the snapshot of the user's jobs in the queue (s),
+            # the queuing system is only asked once within this time
+            'queue_status_ttl': 1.,
+            # Let the jobs write their results into separate files, which
+            # KinBot merges into kinbot.db, instead of all jobs locking kinbot.db
+            'sharded_writes': False,
+            # Number of pilot jobs, long allocations which run the short jobs
+            # listed in pilot_job_prefixes one after the other,
+            # 0 submits every job separately
+            'pilot_jobs': 0,
+            # Jobs whose name starts with these are run by the pilots
+            'pilot_job_prefixes': ['conf/', 'hir/', 'vrctst/'],
+            # Pilots exit after being idle for this long (s)
+            'pilot_idle_time': 300.,
+            # Submit the conformer and hindered rotor jobs of a species
+            # as SLURM job arrays, throttled by queue_job_limit
+            'array_submission': False,
+            # Maximum number of tasks in one job array
+            'array_max_size': 1000,
+            # Longest time between two checks of the log files of the
+            # jobs KinBot is waiting for (s)
+            'job_watch_max_interval': 10.,
+            # Time after which the status of the awaited jobs is checked
+            # again even if their log files did not change (s)
+            'job_watch_timeout': 60.,
             # Whether to raise an error when 'queuing' is set to 'local' and the 
             # files and db entries are missing, otherwise just show a warning.
             'error_missing_local': True,
+            # Whether to run the missing calculations on this machine when
+            # 'queuing' is set to 'local', otherwise only existing results are read.
+            'local_run': False,
+            # Number of cores available for the jobs run locally,
+            # 0 means all the cores of the machine
+            'local_cores': 0,
             # Whether to perform the initial cleanup of files.
             'do_clean': True,
 
@@ -0,0 +1,159 @@
+"""
+Pilot jobs: long-lived allocations that run many short KinBot jobs.
+
+KinBot puts the {job}.py scripts into a SQLite task queue in the working
+directory, and the pilots, submitted through the usual queue templates
+as `python -m kinbot.pilot <queue file>`, keep pulling tasks from it
+until the queue has been empty for a while.
+"""
+import os
+import sys
+import time
+import socket
+import sqlite3
+import logging
+import argparse
+import subprocess
+
+from kinbot.profiling import record_started
+
+logger = logging.getLogger('KinBot')
+
+
+class PilotQueue:
+    """
+    SQLite-backed queue of the tasks to be run by the pilots.
+    Each task is a job name, and the pilot runs the {job}.py script.
+    The status of a task is pending, running or done.
+    """
+    def __init__(self, path):
+        """
+        path: the SQLite file, shared between KinBot and the pilots
+        """
+        self.path = os.path.abspath(path)
+        self.conn = sqlite3.connect(self.path, timeout=60., isolation_level=None)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS tasks ('
+                          'job TEXT PRIMARY KEY, '
+                          'status TEXT NOT NULL, '
+                          'pilot TEXT, '
+                          'returncode INTEGER, '
+                          'submitted REAL, '
+                          'started REAL, '
+                          'finished REAL)')
+
+    def enqueue(self, job):
+        """
+        Add the task, or put it back to pending if it was run before.
+        """
+        self.conn.execute('INSERT OR REPLACE INTO tasks (job, status, submitted) '
+                          'VALUES (?, ?, ?)', (job, 'pending', time.time()))
+
+    def claim(self, pilot):
+        """
+        Atomically take the oldest pending task.
+        pilot: the id of the pilot job in the queuing system
+        Returns the job name, or None if there is nothing to do.
+        """
+        cur = self.conn.cursor()
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            row = cur.execute('SELECT job FROM tasks WHERE status = ? '
+                              'ORDER BY submitted LIMIT 1', ('pending',)).fetchone()
+            if row is not None:
+                cur.execute('UPDATE tasks SET status = ?, pilot = ?, started = ? '
+                            'WHERE job = ?', ('running', pilot, time.time(), row[0]))
+            cur.execute('COMMIT')
+        except sqlite3.Error:
+            cur.execute('ROLLBACK')
+            raise
+        if row is None:
+            return None
+        return row[0]
+
+    def finish(self, job, returncode):
+        """
+        Mark the task as done.
+        """
+        self.conn.execute('UPDATE tasks SET status = ?, returncode = ?, finished = ? '
+                          'WHERE job = ?', ('done', returncode, time.time(), job))
+
+    def cancel(self, job):
+        """
+        Remove the task if no pilot has taken it yet.
+        Returns True if it was removed.
+        """
+        cur = self.conn.execute('DELETE FROM tasks WHERE job = ? AND status = ?',
+                                (job, 'pending'))
+        return cur.rowcount > 0
+
+    def task(self, job):
+        """
+        Returns the (status, pilot) of the task, or (None, None) if it is not in the queue.
+        """
+        row = self.conn.execute('SELECT status, pilot FROM tasks WHERE job = ?',
+                                (job,)).fetchone()
+        if row is None:
+            return None, None
+        return row
+
+    def npending(self):
+        """
+        Number of tasks waiting for a pilot.
+        """
+        return self.conn.execute('SELECT COUNT(*) FROM tasks WHERE status = ?',
+                                 ('pending',)).fetchone()[0]
+
+
+def pilot_id():
+    """
+    The id of the allocation the pilot runs in, as listed by the queuing system.
+    """
+    if 'SLURM_JOB_ID' in os.environ:
+        return os.environ['SLURM_JOB_ID']
+    if 'PBS_JOBID' in os.environ:
+        return os.environ['PBS_JOBID'].split('.')[0]
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def run_task(job):
+    """
+    Run the script of one job, the same way the queue templates do.
+    """
+    os.makedirs(os.path.dirname(f'perm/{job}'), exist_ok=True)
+    record_started(job)
+    with open(f'perm/{job}.stdout', 'w') as out, \
+            open(f'perm/{job}.err', 'w') as err:
+        return subprocess.call([sys.executable, f'{job}.py'],
+                               stdout=out,
+                               stderr=err,
+                               stdin=subprocess.DEVNULL)
+
+
+def work(path, idle_time):
+    """
+    Keep running tasks until no new task arrived for idle_time seconds.
+    """
+    queue = PilotQueue(path)
+    pilot = pilot_id()
+    idle_since = time.time()
+    while time.time() - idle_since < idle_time:
+        job = queue.claim(pilot)
+        if job is None:
+            time.sleep(1)
+            continue
+        queue.finish(job, run_task(job))
+        idle_since = time.time()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run KinBot jobs from a pilot task queue.')
+    parser.add_argument('queue', help='SQLite file of the task queue')
+    parser.add_argument('--idle', type=float, default=300.,
+                        help='exit after this many seconds without new tasks')
+    args = parser.parse_args()
+    os.chdir(os.path.dirname(os.path.abspath(args.queue)))
+    work(args.queue, args.idle)
+
+
+if __name__ == '__main__':
+    main()
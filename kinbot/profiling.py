@@ -0,0 +1,217 @@
+"""
+Lightweight instrumentation of a KinBot run.
+
+When the profile parameter is set, KinBot appends one JSON object per
+line to kinbot_profile.jsonl, next to kinbot.log:
+
+    created     the input of a job was written and it is to be submitted
+    deferred    the job waits in KinBot for a free slot in the queue
+    submitted   the job was handed over to the queuing system, a pilot or
+                the local executor
+    started     the job started running, written by the job itself
+    done        KinBot found the job finished, with its status
+    stage       the wall-clock time a reaction spent in a reac_ts_done stage
+    timers      the number of calls and the total time of the timed
+                functions, written when KinBot exits
+
+Each record has the event name and the time. The kinbot-profile command
+summarizes the file.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import argparse
+import functools
+
+from kinbot.dispatch import job_stage
+
+profile_file = 'kinbot_profile.jsonl'
+
+
+class Profiler:
+    """
+    Writes the events of the run, as long as it is enabled.
+    """
+    def __init__(self):
+        self.path = None
+        # name -> [number of calls, total time]
+        self.timers = {}
+        # jobs created in this run, and the ones found done
+        self.created = set()
+        self.done = set()
+
+    def enable(self, path=profile_file):
+        """
+        Start recording into the file. The jobs record their start only
+        if the file exists.
+        """
+        self.path = os.path.abspath(path)
+        open(self.path, 'a').close()
+        atexit.register(self.write_timers)
+
+    def event(self, event, **fields):
+        if self.path is None:
+            return
+        record = {'event': event, 'time': time.time()}
+        record.update(fields)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+
+    def job(self, event, job, **fields):
+        if event == 'created':
+            self.created.add(job)
+        self.event(event, job=job, **fields)
+
+    def job_done(self, job, status):
+        """
+        Record the end of a job created in this run, only once.
+        """
+        if job not in self.created or job in self.done:
+            return
+        self.done.add(job)
+        self.event('done', job=job, status=status)
+
+    def timed(self, name):
+        """
+        Decorator adding up the time spent in the function.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if self.path is None:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    timer = self.timers.setdefault(name, [0, 0.])
+                    timer[0] += 1
+                    timer[1] += time.perf_counter() - start
+            return wrapper
+        return decorator
+
+    def write_timers(self):
+        if len(self.timers) > 0:
+            self.event('timers', timers=self.timers)
+
+
+profiler = Profiler()
+
+
+def record_started(job):
+    """
+    Called by the processes running the jobs.
+    """
+    if os.path.exists(profile_file):
+        with open(profile_file, 'a') as f:
+            f.write(json.dumps({'event': 'started', 'time': time.time(), 'job': job}) + '\n')
+
+
+stage_names = {0: 'IRC and products', 1: 'high level', 2: 'conformers and rotors',
+               3: 'other', 4: 'TS search'}
+
+
+def read_events(path):
+    events = []
+    with open(path) as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                pass  # a line being written
+    return events
+
+
+def summarize(events, top=10):
+    """
+    Text summary of the queue wait and compute time of the jobs, the
+    time spent in the reaction stages and in the timed functions.
+    """
+    jobs = {}
+    stages = {}
+    reactions = {}
+    timers = {}
+    for ev in events:
+        if 'job' in ev:
+            times = jobs.setdefault(ev['job'], {})
+            # a job may be run again, the last attempt is kept
+            if ev['event'] == 'created':
+                times.clear()
+            times[ev['event']] = ev['time']
+        elif ev['event'] == 'stage':
+            stages.setdefault(ev['stage'], []).append(ev['duration'])
+            reactions[ev['reaction']] = reactions.get(ev['reaction'], 0.) + ev['duration']
+        elif ev['event'] == 'timers':
+            for name, (ncall, total) in ev['timers'].items():
+                timer = timers.setdefault(name, [0, 0.])
+                timer[0] += ncall
+                timer[1] += total
+
+    # the ids of the pilots also show up as started jobs
+    jobs = {job: times for job, times in jobs.items()
+            if 'created' in times or 'submitted' in times}
+    waits = {}
+    computes = {}
+    for job, times in jobs.items():
+        submitted = times.get('submitted', times.get('created'))
+        if 'started' in times and submitted is not None:
+            waits[job] = times['started'] - submitted
+        if 'done' in times:
+            start = times.get('started', submitted)
+            if start is not None:
+                computes[job] = times['done'] - start
+
+    lines = [f'{len(jobs)} jobs, {len(computes)} finished, {len(waits)} with a recorded start.']
+    lines.append('')
+    lines.append(f'{"job kind":<24}{"jobs":>8}{"queue wait (h)":>18}{"run time (h)":>16}')
+    kinds = {}
+    for job in jobs:
+        kind = kinds.setdefault(stage_names[job_stage(job)], [0, 0., 0.])
+        kind[0] += 1
+        kind[1] += waits.get(job, 0.)
+        kind[2] += computes.get(job, 0.)
+    for name, (njob, wait, compute) in sorted(kinds.items(), key=lambda kv: -kv[1][2]):
+        lines.append(f'{name:<24}{njob:>8}{wait / 3600.:>18.2f}{compute / 3600.:>16.2f}')
+
+    lines.append('')
+    lines.append('Longest jobs (queue wait + run time, s):')
+    total = {job: waits.get(job, 0.) + computes.get(job, 0.) for job in jobs}
+    for job in sorted(total, key=total.get, reverse=True)[:top]:
+        lines.append(f'  {job:<50}{waits.get(job, 0.):>12.1f}{computes.get(job, 0.):>12.1f}')
+
+    if len(stages) > 0:
+        lines.append('')
+        lines.append(f'{"reaction stage":<24}{"count":>8}{"total (h)":>18}{"mean (s)":>16}')
+        for stage in sorted(stages):
+            durations = stages[stage]
+            lines.append(f'{str(stage):<24}{len(durations):>8}{sum(durations) / 3600.:>18.2f}'
+                         f'{sum(durations) / len(durations):>16.1f}')
+        lines.append('')
+        lines.append('Slowest reactions (s):')
+        for reac in sorted(reactions, key=reactions.get, reverse=True)[:top]:
+            lines.append(f'  {reac:<50}{reactions[reac]:>12.1f}')
+
+    if len(timers) > 0:
+        lines.append('')
+        lines.append(f'{"function":<24}{"calls":>8}{"total (s)":>18}{"mean (ms)":>16}')
+        for name, (ncall, total) in sorted(timers.items(), key=lambda kv: -kv[1][1]):
+            lines.append(f'{name:<24}{ncall:>8}{total:>18.2f}{1000. * total / ncall:>16.3f}')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize the profile of a KinBot run.')
+    parser.add_argument('file', nargs='?', default=profile_file,
+                        help=f'the profile written by KinBot, {profile_file} by default')
+    parser.add_argument('--top', type=int, default=10, help='number of the slowest items listed')
+    args = parser.parse_args()
+    if not os.path.exists(args.file):
+        print(f'No profile at {args.file}, run KinBot with "profile": true.')
+        sys.exit(-1)
+    print(summarize(read_events(args.file), top=args.top))
+
+
+if __name__ == '__main__':
+    main()
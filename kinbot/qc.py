@@ -6,6 +6,7 @@ import re
 import time
 from datetime import datetime
 import copy
+from contextlib import contextmanager
 
 import numpy as np
 from ase.db import connect
@@ -14,6 +15,15 @@ from kinbot import kb_path
 from kinbot import constants
 from kinbot import geometry
 from kinbot import exceptions
+from kinbot.queue_status import QueueStatus
+from kinbot.job_watcher import JobWatcher
+from kinbot.local_executor import LocalExecutor
+from kinbot.pilot import PilotQueue
+from kinbot.db_cache import DatabaseCache
+from kinbot.dispatch import Dispatcher
+from kinbot.result_cache import ResultCache
+from kinbot import nn_server
+from kinbot.profiling import profiler
 
 logger = logging.getLogger('KinBot')
 
@@ -50,6 +60,18 @@ class QuantumChemistry:
         self.slurm_feature = par['slurm_feature']
         self.zf = par['zf']
         self.db = connect('kinbot.db')
+        if par['sharded_writes']:
+            # the jobs write their results here instead of into kinbot.db
+            os.makedirs('shards', exist_ok=True)
+            self.db_cache = DatabaseCache(self.db, shard_dir='shards')
+        else:
+            self.db_cache = DatabaseCache(self.db)
+        # when it is a set, the jobs found running by check_qc are collected in it
+        self.running_jobs = None
+        # the reaction the jobs are submitted and checked for, if any
+        self.owner = None
+        # job -> set of the owners needing the job
+        self.job_owners = {}
         self.job_ids = {}
         self.irc_maxpoints = par['irc_maxpoints']
         self.irc_stepsize = par['irc_stepsize']
@@ -60,6 +82,45 @@ class QuantumChemistry:
             self.slurm_feature = '#SBATCH -C ' + par['slurm_feature']
         self.queue_job_limit = par['queue_job_limit']
         self.username = par['username']
+        self.queue_status = QueueStatus(par)
+        # the job limit is only enforced for the queuing systems that can be queried
+        if self.queuing in ['pbs', 'slurm']:
+            self.dispatcher = Dispatcher(self.submit_job, self.queue_status, self.queue_job_limit)
+        else:
+            self.dispatcher = Dispatcher(self.submit_job, self.queue_status, -1)
+        self.job_watcher = JobWatcher(par)
+        # with local queuing, either run the jobs here or only read results
+        self.read_only = self.queuing == 'local' and not par['local_run']
+        if self.queuing == 'local' and par['local_run']:
+            self.local_executor = LocalExecutor(par)
+        else:
+            self.local_executor = None
+        # short jobs are run by pilot jobs pulling them from a task queue
+        if par['pilot_jobs'] > 0 and self.queuing in ['pbs', 'slurm']:
+            self.pilot = PilotQueue('pilot.db')
+        else:
+            self.pilot = None
+        # queue ids of the pilots started by this run
+        self.pilot_ids = []
+        self.npilot = 0
+        # jobs collected for array submission, per queue template
+        self.array_jobs = {}
+        self.array_depth = 0
+        self.narray = 0
+        # results shared between the wells of a PES run
+        if par['pes'] and par['result_cache']:
+            self.result_cache = ResultCache(os.path.dirname(os.getcwd()))
+        else:
+            self.result_cache = None
+        # job -> key of the job in the result cache
+        self.cache_keys = {}
+        # socket of the server of the nn_pes models, started again
+        # when it exited after being idle, see nn_server_socket
+        if self.qc == 'nn_pes' and par['nn_model'] and par['nn_server']:
+            self.nn_server = nn_server.start_server(par['nn_model'])
+            self.nn_server_start = time.time()
+        else:
+            self.nn_server = None
         self.use_sella = par['use_sella']
         if not self.use_sella and self.qc.lower() == 'nn_pes':
             logger.warning('NNPES needs Sella optimizer. Turning "use_sella" on.')
@@ -313,11 +374,26 @@ class QuantumChemistry:
         elif self.qc == 'nn_pes':
             if self.par['nn_model']:
                 kwargs = {'fname': self.par['nn_model']}
+                if self.nn_server is not None:
+                    kwargs['server'] = self.nn_server_socket()
             else:
                 kwargs = {}
 
         return kwargs
 
+    def nn_server_socket(self):
+        '''
+        The socket of the nn_pes server, for a job about to be submitted.
+        The server exits after being idle, in which case it is started again,
+        at most once a minute, so that the server has time to bind the socket.
+        '''
+        if (not nn_server.is_serving(self.nn_server)
+                and time.time() - self.nn_server_start > 60.):
+            logger.info('The nn_pes server is not running, starting it again.')
+            nn_server.start_server(self.par['nn_model'])
+            self.nn_server_start = time.time()
+        return self.nn_server
+
     def qc_hir(self, species, geom, rot_index, ang_index, fix, rigid):
         '''Creates a constrained geometry optimization input and runs it.
         wellorts: 0 for wells and 1 for saddle points
@@ -384,7 +460,7 @@ class QuantumChemistry:
         with open(f'{job}.py', 'w') as f:
             f.write(template)
 
-        self.submit_qc(job)
+        self.submit_qc(job, natom=species.natom)
 
         return 0
 
@@ -456,7 +532,7 @@ class QuantumChemistry:
         with open(f'{job}.py', 'w') as f:
             f.write(template)
 
-        self.submit_qc(job)
+        self.submit_qc(job, natom=species.natom)
         return 0
 
     def qc_conf(self, species, geom, index, semi_emp=0):
@@ -532,7 +608,7 @@ class QuantumChemistry:
         with open(f'{job}.py', 'w') as f:
             f.write(template)
 
-        self.submit_qc(job)
+        self.submit_qc(job, natom=species.natom)
 
         return 0
 
@@ -571,8 +647,8 @@ class QuantumChemistry:
             f.write(t0)
         with open(f'{job1}.py', 'w') as f:
             f.write(t1)
-        self.submit_qc(job0)
-        self.submit_qc(job1)
+        self.submit_qc(job0, natom=species.natom)
+        self.submit_qc(job1, natom=species.natom)
 
         return 0
 
@@ -643,7 +719,13 @@ class QuantumChemistry:
             template_file = f'{kb_path}/tpl/ase_sella_opt_well.tpl.py'
         else:
             template_file = f'{kb_path}/tpl/ase_{self.qc}_opt_well.tpl.py'
-        
+
+        if self.result_cache is not None:
+            kind = [os.path.basename(template_file), job.replace(str(species.chemid), '')]
+            self.cache_keys[job] = self.result_cache.key(species, kind, kwargs)
+            if self.check_qc(job) == 0 and self.result_cache.fetch(self.cache_keys[job], job, self.db):
+                return 0
+
         template = open(template_file, 'r').read()
         template = template.format(label=job,
                                    kwargs=kwargs,
@@ -661,7 +743,7 @@ class QuantumChemistry:
         with open(f'{job}.py', 'w') as f:
             f.write(template)
 
-        self.submit_qc(job)
+        self.submit_qc(job, natom=species.natom)
         return 0
 
     def qc_opt_ts(self, species, geom, high_level=0, ext=None, fdir=None):
@@ -720,7 +802,7 @@ class QuantumChemistry:
         with open(f'{job}.py', 'w') as f:
             f.write(template)
 
-        self.submit_qc(job)
+        self.submit_qc(job, natom=species.natom)
 
         return 0
 
@@ -756,7 +838,7 @@ class QuantumChemistry:
         with open(f'{job}.py', 'w') as f:
             f.write(template)
 
-        self.submit_qc(job)
+        self.submit_qc(job, natom=frag.natom)
         
         return job 
 
@@ -836,10 +918,10 @@ class QuantumChemistry:
         with open(f'{job}.py', 'w') as f:
             f.write(template)
 
-        self.submit_qc(job)
+        self.submit_qc(job, natom=reac.species.natom)
         return job 
 
-    def submit_qc(self, job, singlejob=1, jobtype=None):
+    def submit_qc(self, job, singlejob=1, jobtype=None, natom=None):
         '''Submit a job to the queue, unless the job:
             * has finished with Normal termination
             * has finished with Error termination
@@ -848,7 +930,8 @@ class QuantumChemistry:
         the job is run only if it has finished earlier with normal termination.
         This is for continuations, when the continuing jobs overwrite each other.
         If the number of jobs in the queue is larger than the user-set limit,
-        KinBot will park here until resources are freed up.
+        the job is deferred: it is submitted later, when check_qc finds free
+        slots, and it is reported as running until then.
         '''
         # if the logfile already exists, copy it with another name
 
@@ -860,8 +943,16 @@ class QuantumChemistry:
             if check == 'running':
                 return 0
 
-        if self.queue_job_limit > 0:
-            self.limit_jobs()
+        self.own(job)
+        self.job_watcher.mark_submitted(self.log_file(job))
+        profiler.job('created', job)
+        if self.uses_pilot(job):
+            self.pilot.enqueue(job)
+            self.start_pilots()
+            profiler.job('submitted', job, pilot=True)
+            now = datetime.now()
+            logger.debug(f'SUBMITTED {job} to the pilots on {now.ctime()}')
+            return 1
 
         try:
             if jobtype == 'am1' and self.par['q_temp_am1']:
@@ -880,11 +971,30 @@ class QuantumChemistry:
             logger.error('Exiting')
             sys.exit()
 
-        if self.queuing == 'local':
+        if self.array_depth > 0:
+            jobs = self.array_jobs.setdefault(template_head_file, [])
+            if job not in jobs:
+                jobs.append(job)
+            logger.debug(f'Job {job} is added to the job array')
+            return 1
+
+        if self.queuing == 'local' and not self.read_only:
+            pid = self.local_executor.submit(job)
+            self.job_ids[job] = pid
+            if pid is None:
+                # the executor records the submission when it starts the job
+                profiler.job('deferred', job)
+                logger.debug(f'DEFERRED {job}, no free cores')
+            else:
+                now = datetime.now()
+                logger.debug(f'SUBMITTED {job} locally on {now.ctime()}')
+            return 1
+        elif self.queuing == 'local':
             err_msg = f'Job {job} is missing in the database or the output ' \
                       'file is not present. Unable to run calculations when ' \
                       'queuing is \'local\'. To ignore calculations that have ' \
-                      'not finished set "error_missing_local" to False.'
+                      'not finished set "error_missing_local" to False, ' \
+                      'to run them on this machine set "local_run" to True.'
             if self.par['error_missing_local']:
                 logger.error(err_msg)
                 raise FileNotFoundError(err_msg)
@@ -892,33 +1002,68 @@ class QuantumChemistry:
                 logger.warning(err_msg)
                 return -1
 
-        template_file = f'{kb_path}/tpl/{self.queuing}_python.tpl'
-        python_file = f'{job}.py'
+        if not self.dispatcher.submit(job, template_head_file, jobtype=jobtype, natom=natom):
+            profiler.job('deferred', job)
+        return 1  # important to keep it 1, this is the natural counter of jobs submitted
+
+    def submit_job(self, job, template_head_file):
+        '''
+        Hand the job over to the queuing system.
+        '''
+        pid = self.submit_script(job, template_head_file, f'{job}.py')
+        self.job_ids[job] = pid
+        self.queue_status.add(pid)
+        profiler.job('submitted', job, pid=pid)
+
+        now = datetime.now()
+        logger.debug(f'SUBMITTED {job} on {now.ctime()}')
+
+    def submit_script(self, name, template_head_file, python_file, arguments='', array=None):
+        '''
+        Write the queue script that runs python_file with the arguments,
+        submit it and return the id of the job in the queuing system.
+        If array is a list of jobs, a SLURM job array is submitted instead,
+        in which the i-th task runs the script of the i-th job.
+        '''
+        if array is None:
+            template_file = f'{kb_path}/tpl/{self.queuing}_python.tpl'
+        else:
+            template_file = f'{kb_path}/tpl/{self.queuing}_array_python.tpl'
         job_template = open(template_head_file, 'r').read() + open(template_file, 'r').read()
 
         if self.queuing == 'pbs':
-            job_template = job_template.format(name=job, ppn=self.ppn, queue_name=self.queue_name,
-                                               errdir='perm', python_file=python_file, arguments='')
+            job_template = job_template.format(name=name, ppn=self.ppn, queue_name=self.queue_name,
+                                               errdir='perm', python_file=python_file, arguments=arguments)
+        elif self.queuing == 'slurm' and array is not None:
+            job_template = job_template.format(name=f'{name}_%a', ppn=self.ppn, queue_name=self.queue_name,
+                                               errdir='perm', slurm_feature=self.slurm_feature,
+                                               jobs=' '.join(array))
         elif self.queuing == 'slurm':
-            job_template = job_template.format(name=job, ppn=self.ppn, queue_name=self.queue_name, errdir='perm',
-                                               slurm_feature=self.slurm_feature, python_file=python_file, arguments='')
+            job_template = job_template.format(name=name, ppn=self.ppn, queue_name=self.queue_name, errdir='perm',
+                                               slurm_feature=self.slurm_feature, python_file=python_file, arguments=arguments)
         elif self.queuing == 'puget':
-            job_template = job_template.format(name=job, ppn=self.ppn, queue_name=self.queue_name,
-                                               errdir='perm', python_file=python_file, arguments='')
+            job_template = job_template.format(name=name, ppn=self.ppn, queue_name=self.queue_name,
+                                               errdir='perm', python_file=python_file, arguments=arguments)
         else:
             logger.error('KinBot does not recognize queuing system {}.'.format(self.queuing))
             logger.error('Exiting')
             sys.exit()
 
-        qu_file = '{}{}'.format(job, constants.qext[self.queuing])
+        qu_file = '{}{}'.format(name, constants.qext[self.queuing])
         with open(qu_file, 'w') as f_out_qu:
             f_out_qu.write(job_template)
-        command = [constants.qsubmit[self.queuing], job + constants.qext[self.queuing]]
+        command = [constants.qsubmit[self.queuing], qu_file]
+        if array is not None:
+            # the throttle keeps the running tasks within the job limit
+            throttle = ''
+            if self.queue_job_limit > 0:
+                throttle = f'%{self.queue_job_limit}'
+            command.insert(1, f'--array=0-{len(array) - 1}{throttle}')
         if self.queuing == 'puget':
-            puget_command = f'chmod 777 {job + constants.qext[self.queuing]}'
+            puget_command = f'chmod 777 {qu_file}'
             os.system(puget_command)
             #overwrite the 'command' variable if using Puget
-            command = ["./" + job + constants.qext[self.queuing]]
+            command = ["./" + qu_file]
         process = subprocess.Popen(command, shell=False, stdout=subprocess.PIPE, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
         out, err = process.communicate()
         out = out.decode()
@@ -937,11 +1082,81 @@ class QuantumChemistry:
             msg += '\nThis is the standard error:\n' + err
             logger.error(msg)
             sys.exit()
-        self.job_ids[job] = pid
+        return pid
 
-        now = datetime.now()
-        logger.debug(f'SUBMITTED {job} on {now.ctime()}')
-        return 1  # important to keep it 1, this is the natural counter of jobs submitted
+    def uses_pilot(self, job):
+        '''
+        Whether the job is run by the pilots instead of being submitted on its own.
+        '''
+        if self.pilot is None:
+            return False
+        return any(job.startswith(prefix) for prefix in self.par['pilot_job_prefixes'])
+
+    def start_pilots(self):
+        '''
+        Keep up to pilot_jobs pilots in the queue, but not more than what
+        the pending tasks need. Pilots exit by themselves when there is
+        no work left for them for pilot_idle_time seconds.
+        '''
+        self.pilot_ids = [pid for pid in self.pilot_ids if self.queue_status.is_queued(pid)]
+        target = min(self.par['pilot_jobs'], len(self.pilot_ids) + self.pilot.npending())
+        if self.par['queue_template'] == '':
+            template_head_file = f'{kb_path}/tpl/{self.queuing}.tpl'
+        else:
+            template_head_file = self.par['queue_template']
+        while len(self.pilot_ids) < target:
+            name = f'pilot_{self.npilot}'
+            arguments = f'{self.pilot.path} --idle {self.par["pilot_idle_time"]}'
+            pid = self.submit_script(name, template_head_file, '-m kinbot.pilot', arguments)
+            self.queue_status.add(pid)
+            self.pilot_ids.append(pid)
+            self.npilot += 1
+            logger.debug(f'Started pilot job {name} with id {pid}')
+
+    @contextmanager
+    def job_array(self):
+        '''
+        Jobs submitted within this block are collected and submitted
+        together as SLURM job arrays when the outermost block is left.
+        Does nothing unless array_submission is on and queuing is slurm.
+        '''
+        if not self.par['array_submission'] or self.queuing != 'slurm':
+            yield
+            return
+        self.array_depth += 1
+        try:
+            yield
+        finally:
+            self.array_depth -= 1
+        if self.array_depth == 0:
+            self.submit_arrays()
+
+    def in_array(self, job):
+        '''
+        Whether the job is waiting for the submission of its job array.
+        '''
+        return any(job in jobs for jobs in self.array_jobs.values())
+
+    def submit_arrays(self):
+        '''
+        Submit the collected jobs, one array per queue template and
+        at most array_max_size tasks per array. The i-th task of the
+        array gets the {array id}_{i} id in the queue.
+        '''
+        for template_head_file, jobs in self.array_jobs.items():
+            size = self.par['array_max_size']
+            for start in range(0, len(jobs), size):
+                chunk = jobs[start:start + size]
+                name = f'array_{self.narray}'
+                self.narray += 1
+                pid = self.submit_script(name, template_head_file, None, array=chunk)
+                for i, job in enumerate(chunk):
+                    self.job_ids[job] = f'{pid}_{i}'
+                    self.queue_status.add(self.job_ids[job])
+                    profiler.job('submitted', job, pid=self.job_ids[job])
+                now = datetime.now()
+                logger.debug(f'SUBMITTED {len(chunk)} jobs in array {pid} on {now.ctime()}')
+        self.array_jobs = {}
 
     def get_qc_geom(self,
                     job,
@@ -977,7 +1192,7 @@ class QuantumChemistry:
             check = self.check_qc(job)
             if check == 'running':
                 if wait == 1:
-                    time.sleep(1)
+                    self.wait_for_jobs([job])
                 elif wait == 2:
                     status = 2
                     break
@@ -996,18 +1211,13 @@ class QuantumChemistry:
                     else:
                         return -1, geom
 
-        # open the database
-        rows = self.db.select(name=job)
-
-        found_entry = 0
         # take the last entry
-        for row in rows:
-            if found_entry:
-                prev_geom = geom  # saves the previous 
-            mol = row.toatoms()
-            geom = mol.positions
-            atoms = np.array(list(mol.symbols.get_chemical_formula('all')))
-            found_entry = 1
+        entry = self.db_cache.get(job)
+        found_entry = entry is not None
+        if found_entry:
+            geom = entry['positions'].copy()
+            atoms = entry['symbols'].copy()
+            prev_geom = entry['prev_positions']
 
         if found_entry and previous == 0:
             if reorder:
@@ -1035,7 +1245,7 @@ class QuantumChemistry:
             check = self.check_qc(job)
             if check == 'running':
                 if wait == 1:
-                    time.sleep(1)
+                    self.wait_for_jobs([job])
                 else:
                     return 1, []
             else:
@@ -1046,14 +1256,10 @@ class QuantumChemistry:
 
         freq = []
 
-        # open the database
-        rows = self.db.select(name=job)
-
-        # take the last entry
-        for row in rows:
-            if hasattr(row, 'data'):
-                if not row.data.get('frequencies') is None:
-                    freq = list(row.data.get('frequencies'))
+        # take the last entry with frequencies
+        entry = self.db_cache.get(job)
+        if entry is not None and entry['frequencies'] is not None:
+            freq = list(entry['frequencies'])
 
         if len(freq) == 0 and natom > 1:
             return -1, freq
@@ -1081,16 +1287,16 @@ class QuantumChemistry:
             check = self.check_qc(job)
             if check == 'running':
                 if wait == 1:
-                    time.sleep(1)
+                    self.wait_for_jobs([job])
                 else:
                     return 1, 0.
             else:
                 break
 
         # Get last entry
-        *_, last_row = self.db.select(name=job)
-        if hasattr(last_row, 'data'):
-            energy = last_row.data.get('energy')
+        entry = self.db_cache.get(job)
+        if entry is not None and entry['energy'] is not None:
+            energy = entry['energy']
         else:
             logger.warning(f'No energy found in the database for {job}. '
                            'This will lead to erroneous energies.')
@@ -1104,7 +1310,8 @@ class QuantumChemistry:
     def get_qc_zpe(self, job, wait=1):
         '''
         Read the zero point energy.
-        If wait is set to 1 (default), it will wait for the job to finish.
+        If wait is set to 1 (default), it will wait for the job to finish,
+        otherwise the error code is 1 while the job is running.
         '''
 
         check = self.check_qc(job)
@@ -1114,18 +1321,16 @@ class QuantumChemistry:
             check = self.check_qc(job)
             if check == 'running':
                 if wait == 1:
-                    time.sleep(1)
+                    self.wait_for_jobs([job])
                 else:
-                    return 0, 0.
+                    return 1, 0.
             else:
                 break
         zpe = 0.0  # set as default
-        # open the database
-        *_, last_row = self.db.select(name=job)
         # take the last entry
-        
-        if hasattr(last_row, 'data'):
-            zpe = last_row.data.get('zpe')
+        entry = self.db_cache.get(job)
+        if entry is not None:
+            zpe = entry['zpe']
         else:
             zpe = 0.0
             logger.warning('{} has no zpe in database. ZPE SET TO 0.0'.format(job))
@@ -1145,10 +1350,7 @@ class QuantumChemistry:
             return []
 
         if self.use_sella:
-            db = connect('kinbot.db')
-            for row in db.select(name=job):
-                last_row = row
-            hess = last_row.data['hess']
+            hess = self.db_cache.get_data(job, 'hess')
         elif self.qc == 'gauss':
             hess = np.zeros((3 * natom, 3 * natom))
             fchk = str(job) + '.fchk'
@@ -1176,11 +1378,9 @@ class QuantumChemistry:
                     break
             else:
                 # Try to see if the Hessian is the database.
-                db = connect('kinbot.db')
-                for row in db.select(name=job):
-                    last_row = row
-                if 'hess' in last_row.data:
-                    hess = last_row.data['hess']
+                db_hess = self.db_cache.get_data(job, 'hess')
+                if db_hess is not None:
+                    hess = db_hess
                     logger.warning(f'Hessian matrix not found on {fchk}. '
                                    'Reading from kinbot.db database.')
                 else:
@@ -1212,20 +1412,102 @@ class QuantumChemistry:
             raise NotImplementedError()
         return hess
 
-    def is_in_database(self, job):
+    def log_file(self, job):
         '''
-        Checks if the current job is in the database:
+        Name of the file which receives the done stamp at the end of the job.
         '''
-        # open the database
-        rows = self.db.select(name=job)
+        if self.qc in ['nwchem', 'qchem']:
+            return job + '.out'
+        return job + '.log'
 
-        mol = None
+    def wait_for_jobs(self, jobs):
+        '''
+        Block until at least one of the jobs finishes, instead of polling.
+        Returns after job_watch_timeout seconds in any case, so that the
+        callers can check again the status of the jobs.
+        '''
+        return self.job_watcher.wait([self.log_file(job) for job in jobs])
 
-        # take the last entry
-        for row in rows:
-            mol = row.toatoms()
+    async def wait_for_jobs_async(self, jobs):
+        '''
+        Awaitable version of wait_for_jobs, which lets the other
+        coroutines run while waiting.
+        '''
+        return await self.job_watcher.wait_async([self.log_file(job) for job in jobs])
+
+    def share_result(self, job):
+        '''
+        Put the result of the finished job into the result cache, once.
+        '''
+        key = self.cache_keys.pop(job)
+        row = self.db.get(id=self.db_cache.get(job)['id'])
+        self.result_cache.store(key, job, row)
+
+    def report_running(self, job):
+        '''
+        Note that the job is running for whoever collects the running jobs.
+        '''
+        if self.running_jobs is not None:
+            self.running_jobs.add(job)
+        self.own(job)
+        return 'running'
+
+    def own(self, job):
+        '''
+        Register that the current owner needs the job.
+        '''
+        if self.owner is not None:
+            self.job_owners.setdefault(job, set()).add(self.owner)
+
+    def release(self, owner):
+        '''
+        The owner, e.g., a deleted reaction, does not need its jobs anymore.
+        The jobs no other owner needs are cancelled if cancel_jobs is set.
+        '''
+        for job, owners in list(self.job_owners.items()):
+            if owner not in owners:
+                continue
+            owners.discard(owner)
+            if len(owners) == 0:
+                del self.job_owners[job]
+                if self.par['cancel_jobs']:
+                    self.cancel_job(job)
+
+    def cancel_job(self, job):
+        '''
+        Take the job out of the queue it is waiting in, or stop it if it is running.
+        Jobs already started by a pilot are left to finish.
+        '''
+        if self.in_array(job):
+            for jobs in self.array_jobs.values():
+                if job in jobs:
+                    jobs.remove(job)
+        elif self.uses_pilot(job):
+            if not self.pilot.cancel(job):
+                return
+        elif self.queuing in ['pbs', 'slurm']:
+            pid = self.job_ids.get(job)
+            if self.dispatcher.cancel(job):
+                pass
+            elif self.queue_status.is_queued(pid):
+                subprocess.run([constants.qcancel[self.queuing], str(pid)],
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+                self.queue_status.remove(pid)
+            else:
+                return
+        elif self.local_executor is not None:
+            if not self.local_executor.cancel(job):
+                return
+        else:
+            return
+        logger.debug(f'CANCELLED {job}')
 
-        if mol is None:
+    def is_in_database(self, job):
+        '''
+        Checks if the current job is in the database:
+        '''
+        if self.db_cache.get(job) is None:
             return 0
 
         return 1
@@ -1241,30 +1523,22 @@ class QuantumChemistry:
             ==> this one resets the step number to 0
         '''
         # logger.debug('Checking job {}'.format(job))
-        devnull = open(os.devnull, 'w')
-        if self.queuing == 'pbs':
-            command = 'qstat -f | grep ' + '"Job Id: ' + self.job_ids.get(job, '-1') + '"' + ' > /dev/null'
-            if int(subprocess.call(command, shell=True, stdout=devnull, stderr=devnull)) == 0:
-                # logger.debug('Job is running')
-                return 'running'
-        elif self.queuing == 'slurm':
-            # command = 'scontrol show job ' + self.job_ids.get(job,'-1') + ' | grep "JobId=' + self.job_ids.get(job,'-1') + '"' + ' > /dev/null'
-            command = 'squeue'
-            process = subprocess.Popen(command,
-                                       shell=True,
-                                       stdout=subprocess.PIPE,
-                                       stdin=subprocess.PIPE,
-                                       stderr=subprocess.PIPE)
-            out, err = process.communicate()
-            out = out.decode().split('\n')[1:]
-            for line in out:
-                if len(line) > 0:
-                    pid = line.split()[0]
-                    if pid == self.job_ids.get(job, '-1'):
-                        logger.debug('Job is running')
-                        return 'running'
+        if self.uses_pilot(job):
+            status, pilot = self.pilot.task(job)
+            if status == 'pending':
+                self.start_pilots()
+                return self.report_running(job)
+            elif status == 'running' and self.queue_status.is_queued(pilot):
+                return self.report_running(job)
+        elif self.queuing in ['pbs', 'slurm']:
+            self.dispatcher.drain()
+            if self.in_array(job) or self.dispatcher.is_deferred(job) \
+                    or self.queue_status.is_queued(self.job_ids.get(job)):
+                logger.debug('Job is running')
+                return self.report_running(job)
         elif self.queuing == 'local':
-            pass
+            if self.local_executor is not None and self.local_executor.is_running(job):
+                return self.report_running(job)
         elif self.queuing == 'puget':
             command = 'jobs'
             process = subprocess.Popen(command,
@@ -1298,25 +1572,17 @@ class QuantumChemistry:
                 if self.qc != 'nn_pes':
                     log_file_exists = os.path.exists(log_file)
                 if log_file_exists:
-                    with open(log_file, 'r') as f:
-                        try:
-                            last_line = f.readlines()[-1]
-                            if 'done' not in last_line:
-                                if self.queuing == 'local' and not self.par['error_missing_local']:
-                                    return 'error'
-                                logger.debug(f'Log file {log_file} is present, '
-                                             'but has no "done" stamp.')
-                                return 0
-                        except IndexError:
-                            logger.debug(f'Log file {log_file} is present, but it is empty.')
-                            if self.queuing == 'local' and not self.par['error_missing_local']:
-                                return 'error'
-                            return 0
+                    if not self.job_watcher.is_done(log_file):
+                        if self.read_only and not self.par['error_missing_local']:
+                            return 'error'
+                        logger.debug(f'Log file {log_file} is present, '
+                                     'but has no "done" stamp.')
+                        return 0
                     logger.debug('Log file is present after {} iterations'.format(i))
                 elif self.qc == 'nn_pes':
                     pass
                 else:
-                    if self.queuing == 'local' and not self.par['error_missing_local']:
+                    if self.read_only and not self.par['error_missing_local']:
                         return 'error'
                     logger.debug('Checking againg for log file')
                     time.sleep(1)
@@ -1326,49 +1592,26 @@ class QuantumChemistry:
                         return 0
             
                 # by deleting a log file, you allow restarting a job
-                # open the database
-                rows = self.db.select(name=job)
-                data = None
                 # take the last entry
-                for row in rows:
-                    if hasattr(row, 'data'):
-                        data = row.data
-                if data is None:
+                status = self.db_cache.get(job)['status']
+                if status is None:
                     logger.debug('Data is not in database...')
                     return 0
                 else:
-                    logger.debug('Returning status {}'.format(data['status']))
-                    return data['status']
+                    if status == 'normal' and job in self.cache_keys:
+                        self.share_result(job)
+                    profiler.job_done(job, status)
+                    logger.debug('Returning status {}'.format(status))
+                    return status
 
             logger.debug('log file {} does not exist'.format(log_file))
             return 0
         else:
-            if self.queuing == 'local' and not self.par['error_missing_local']:
+            if self.read_only and not self.par['error_missing_local']:
                 return 'error'
             logger.debug('job {} is not in database'.format(job))
             return 0
 
-    def limit_jobs(self):
-        '''
-        Check how many jobs are in the queue from the user, and if larger than the limit,
-        then wait for resources to free up.
-        '''
-
-        while 1:
-            if self.queuing == 'slurm':
-                command = ['squeue', '-h', '-u', '{}'.format(self.username)]
-                print(f"what is the command {command}")
-            elif self.queuing == 'pbs':
-                command = ['qselect', '-u', '{}'.format(self.username)]
-            elif self.queuing == 'local':
-                command = command = ['echo', '']
-            elif self.queuing == 'puget':
-                return 0 
-            jobs = subprocess.check_output(command)
-            if len(jobs.split(b'\n')) < self.queue_job_limit:
-                return 0
-            time.sleep(1)
-
     def add_dummy(self, spatom, geom, spbond):
         '''
         Add a dummy atom for each close to linear angle.
@@ -0,0 +1,122 @@
+import os
+import time
+import getpass
+import logging
+import subprocess
+
+logger = logging.getLogger('KinBot')
+
+
+class QueueStatus:
+    """
+    Snapshot of the jobs the user has in the queue.
+    The queuing system is asked only once per polling tick, and the
+    list of job ids is reused for all status checks until it expires.
+    """
+    def __init__(self, par):
+        """
+        par: the parameters dictionary
+        The lifetime of the snapshot is set by queue_status_ttl (in s).
+        """
+        self.queuing = par['queuing']
+        self.ttl = par['queue_status_ttl']
+        if par['username']:
+            self.username = par['username']
+        else:
+            self.username = os.environ.get('USER', getpass.getuser())
+        # job ids in the last snapshot
+        self.ids = set()
+        # time of the last snapshot, 0 forces a refresh
+        self.stamp = 0.
+
+    def command(self):
+        """
+        The command listing only the job ids of the user, one per line.
+        """
+        if self.queuing == 'slurm':
+            return ['squeue', '-h', '-u', self.username, '-o', '%i']
+        elif self.queuing == 'pbs':
+            return ['qselect', '-u', self.username]
+        return None
+
+    def parse(self, out):
+        """
+        Turn the output of the queue command into a set of job ids.
+        PBS ids come as 12345.server, only the number is kept.
+        SLURM array tasks are listed as arrayid_taskid.
+        """
+        ids = set()
+        for line in out.split('\n'):
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            if self.queuing == 'pbs':
+                line = line.split('.')[0]
+            if self.queuing == 'slurm' and line.endswith(']'):
+                ids |= self.expand_array(line)
+                continue
+            ids.add(line)
+        return ids
+
+    def expand_array(self, line):
+        """
+        Pending tasks of a job array are listed together, e.g.,
+        123_[0-5,7%10], turn them into 123_0, ..., 123_5, 123_7.
+        """
+        base, tasks = line[:-1].split('_[')
+        ids = set()
+        for part in tasks.split('%')[0].split(','):
+            if '-' in part:
+                first, last = part.split('-')
+                ids.update(f'{base}_{i}' for i in range(int(first), int(last) + 1))
+            elif part:
+                ids.add(f'{base}_{part}')
+        return ids
+
+    def refresh(self, force=False):
+        """
+        Query the queuing system if the snapshot is older than the ttl.
+        If the query fails, the previous snapshot is kept.
+        """
+        if not force and time.time() - self.stamp < self.ttl:
+            return self.ids
+        command = self.command()
+        if command is None:
+            self.stamp = time.time()
+            return self.ids
+        try:
+            out = subprocess.check_output(command, stderr=subprocess.DEVNULL)
+        except (OSError, subprocess.CalledProcessError):
+            logger.debug(f'Queue query {" ".join(command)} failed, '
+                         'keeping the previous snapshot.')
+            return self.ids
+        self.ids = self.parse(out.decode())
+        self.stamp = time.time()
+        return self.ids
+
+    def is_queued(self, pid):
+        """
+        Whether the job with this id is pending or running.
+        """
+        if pid is None:
+            return False
+        return str(pid) in self.refresh()
+
+    def njobs(self, force=False):
+        """
+        Number of jobs the user currently has in the queue.
+        """
+        return len(self.refresh(force=force))
+
+    def add(self, pid):
+        """
+        Register a freshly submitted job, which might not be visible yet
+        in the snapshot, so that it is not reported as finished.
+        """
+        self.ids.add(str(pid))
+
+    def remove(self, pid):
+        """
+        Forget a cancelled job, which might still be listed in the snapshot.
+        """
+        self.ids.discard(str(pid))
@@ -194,6 +194,7 @@ def carry_out_reaction(rxn, step, command, bimol=0):
         f_out.write(template)
 
     step += rxn.qc.submit_qc(rxn.instance_name, singlejob=0, 
-                             jobtype=kwargs.pop('method', None))
+                             jobtype=kwargs.pop('method', None),
+                             natom=rxn.species.natom)
 
     return step
@@ -2,6 +2,9 @@ import numpy as np
 import sys
 import copy
 import logging
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 from kinbot import bond_combinations
 from kinbot import find_motif
@@ -53,6 +56,34 @@ from kinbot.reactions.reac_combinatorial import Combinatorial
 
 logger = logging.getLogger('KinBot')
 
+# the reaction finder and its searches during a parallel search,
+# inherited by the forked worker processes
+_search = None
+
+
+def search_tasks(tasks):
+    '''
+    Search families on resonance structures in a worker process.
+    tasks: list of (family, index of the resonance structure), grouped
+        by the resonance structure
+    Returns for each task the names of the families initialized and the
+    new_reaction calls made, in order, which are then repeated in the main
+    process.
+    '''
+    finder, reaction_names = _search
+    species = finder.species
+    results = []
+    for i, group in itertools.groupby(tasks, key=lambda task: task[1]):
+        searches = {rn: reaction_names[rn] for rn, _ in group}
+        finder.match_motifs(searches, i)
+        for search in searches.values():
+            finder.reactions = {}
+            finder.pending = []
+            search(species.natom, species.atom, species.bonds[i], species.rads[i])
+            results.append((list(finder.reactions), finder.pending))
+        finder.matcher = None
+    return results
+
 
 class ReactionFinder:
     '''
@@ -88,6 +119,12 @@ class ReactionFinder:
         # this dict is used to keep track of the unique reactions found,
         # and to verify whether a new reaction is indeed unique 
         self.reactions = {}
+        # keys of the instances in self.reactions, to find the new ones quickly
+        self.reaction_indices = {}
+        # searches the motifs of all families at once, set for each resonance structure
+        self.matcher = None
+        # the new_reaction calls, collected instead of made in the worker processes
+        self.pending = None
 
     def find_reactions(self):
         '''
@@ -139,31 +176,30 @@ class ReactionFinder:
         if 'combinatorial' in self.families:
             reaction_names['combinatorial'] = self.search_combinatorial        
  
-        atom = self.species.atom
-        natom = self.species.natom
-        
-        for i, bond in enumerate(self.species.bonds):  # for all resonance structures
-            rad = self.species.rads[i]
-            
-            if self.one_reaction_comb:
-                # search for just one reaction, given by the list of bonds to be 
-                # broken or formed
+        families = [rn for rn in reaction_names
+                    if ('all' in self.families or rn in self.families)
+                    and rn not in self.skip_families]
+
+        if self.par['family_search_nproc'] > 1 and not self.one_reaction_comb:
+            self.search_parallel(reaction_names, families)
+        else:
+            for i, bond in enumerate(self.species.bonds):  # for all resonance structures
+                if self.one_reaction_comb:
+                    # search for just one reaction, given by the list of bonds to be 
+                    # broken or formed
                 
-                # based on the combinatorial reaction family, because they are also
-                # defined by the list of bonds to be broken or formed
-                name = 'combinatorial'
-                self.reactions[name] = []
+                    # based on the combinatorial reaction family, because they are also
+                    # defined by the list of bonds to be broken or formed
+                    name = 'combinatorial'
+                    self.reactions[name] = []
                 
-                self.reac_bonds = self.par['break_bonds']
-                self.prod_bonds = self.par['form_bonds']
-                ts = bond_combinations.generate_ts(self.reac_bonds, self.prod_bonds, self.species.bond)
-                self.reactions[name].append([self.reac_bonds, self.prod_bonds, ts, 1])
+                    self.reac_bonds = self.par['break_bonds']
+                    self.prod_bonds = self.par['form_bonds']
+                    ts = bond_combinations.generate_ts(self.reac_bonds, self.prod_bonds, self.species.bond)
+                    self.reactions[name].append([self.reac_bonds, self.prod_bonds, ts, 1])
                 
-            else:
-                for rn in reaction_names:
-                    if 'all' in self.families or rn in self.families:
-                        if not rn in self.skip_families:
-                            reaction_names[rn](natom, atom, bond, rad)
+                else:
+                    self.search_families({rn: reaction_names[rn] for rn in families}, i)
 
         for name in self.reactions:
             self.reaction_matrix(self.reactions[name], name) 
@@ -181,6 +217,99 @@ class ReactionFinder:
         return 0  
    
 
+    def search_families(self, searches, i):
+        '''
+        Run the searches of the families on resonance structure i.
+        searches: dictionary of the family names and their search methods
+        '''
+        self.match_motifs(searches, i)
+        for search in searches.values():
+            search(self.species.natom, self.species.atom, self.species.bonds[i], self.species.rads[i])
+        self.matcher = None
+        return 0
+
+
+    def match_motifs(self, searches, i):
+        '''
+        Set up the matcher with the motifs of the families on resonance
+        structure i. A first pass over the families only collects their
+        motifs, which are then searched together, in one pass over the molecule.
+        The combinatorial family does not use motifs.
+        '''
+        atom = self.species.atom
+        natom = self.species.natom
+        bond = self.species.bonds[i]
+        rad = self.species.rads[i]
+        self.matcher = find_motif.MotifMatcher(natom, bond, atom, self.species.atom_eqv)
+        reactions = self.reactions
+        pending = self.pending
+        self.reactions = {}
+        self.pending = None
+        for rn, search in searches.items():
+            if rn != 'combinatorial':
+                search(natom, atom, bond, rad)
+        self.reactions = reactions
+        self.pending = pending
+        self.matcher.run()
+        return 0
+
+
+    def search_parallel(self, reaction_names, families):
+        '''
+        Search the families on the resonance structures in a pool of
+        processes, with one task per family and resonance structure.
+        The tasks are sent to the workers in chunks, and the families of
+        a chunk on the same resonance structure share the motif search.
+        The instances found by the tasks are then added in the same order
+        as in the serial search, so the same reactions are found.
+        The combinatorial family does not depend on the resonance structure,
+        and is searched in this process.
+        '''
+        global _search
+        nres = len(self.species.bonds)
+        tasks = [(rn, i) for i in range(nres) for rn in families if rn != 'combinatorial']
+        nproc = min(self.par['family_search_nproc'], max(1, len(tasks)))
+        logger.info(f'\tSearching {len(tasks)} family and resonance structure pairs on {nproc} processes.')
+        _search = (self, reaction_names)
+        try:
+            # the reaction finder is not picklable, so the workers are forked
+            nchunk = min(len(tasks), 2 * nproc)
+            chunks = [tasks[k * len(tasks) // nchunk:(k + 1) * len(tasks) // nchunk] for k in range(nchunk)]
+            with ProcessPoolExecutor(max_workers=nproc,
+                                     mp_context=multiprocessing.get_context('fork')) as pool:
+                results = dict(zip(tasks, itertools.chain(*pool.map(search_tasks, chunks))))
+        finally:
+            _search = None
+
+        for i in range(nres):
+            for rn in families:
+                if rn == 'combinatorial':
+                    reaction_names[rn](self.species.natom, self.species.atom,
+                                       self.species.bonds[i], self.species.rads[i])
+                    continue
+                names, calls = results[(rn, i)]
+                for name in names:
+                    if name not in self.reactions:
+                        self.reactions[name] = []
+                for rxns, name, kwargs in calls:
+                    self.new_reaction(rxns, name, **kwargs)
+        return 0
+
+
+    def start_motif(self, motif, natom, bond, atom, allover, eqv):
+        '''
+        The instances of the motif, see find_motif.start_motif.
+        When the matcher is collecting the motifs, the motif is added to
+        it and no instances are returned yet.
+        '''
+        if self.matcher is None or bond is not self.matcher.bond or eqv is not self.matcher.eqv:
+            return find_motif.start_motif(motif, natom, bond, atom, allover, eqv)
+        if self.matcher.results is None:
+            self.matcher.add(motif, allover)
+            return []
+        return self.matcher.get(motif, allover)
+
+
     def search_combinatorial(self, natom, atom, bond, rad):
         ''' 
         This is a method to create all possible combinations of maximum 3 bond breakings 
@@ -193,9 +322,8 @@ class ReactionFinder:
         if not name in self.reactions:
             self.reactions[name] = []
 
-        instances = bond_combinations.generate_all_product_bond_matrices(self.species, self.par)
-        for inst in instances:
-            self.reactions[name].append(inst)
+        # the reactions are generated one by one, straight into the list
+        self.reactions[name].extend(bond_combinations.generate_all_product_bond_matrices(self.species, self.par))
         #~ self.reactions[name] = []
         #~ reac = [[0, 5], [1, 2], [3, 4]]
         #~ prod = [[0, 1], [2, 3], [4, 5]]
@@ -230,7 +358,7 @@ class ReactionFinder:
         for ringsize in self.ringrange:
             motif = ['X' for i in range(ringsize)]
             motif[-1] = 'H'
-            instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+            instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
 
             # double bonds
             for instance in instances:
@@ -261,7 +389,7 @@ class ReactionFinder:
                 motif = ['X' for i in range(ringsize)]
                 motif[-1] = 'H'
                 for rad_site in np.nonzero(rad)[0]:
-                    instances += find_motif.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
+                    instances += self.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
             for instance in instances:
                 rxns.append(instance)
         rxns = self.clean_rigid(name, rxns, 0, -1)
@@ -290,7 +418,7 @@ class ReactionFinder:
         
         # search for keto-enol type reactions
         motif = ['X', 'X', 'X', 'H']
-        instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+        instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
         
         # filter for the double bond
         for instance in instances:
@@ -333,7 +461,7 @@ class ReactionFinder:
         for ringsize in self.ringrange:
             motif = ['X' for i in range(ringsize)]
             for rad_site in np.nonzero(rad)[0]:
-                instances += find_motif.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
+                instances += self.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
 
         for instance in instances: 
             if not atom[instance[-1]] == 'H':
@@ -436,7 +564,7 @@ class ReactionFinder:
                 motif[-1] = 'H'
                 motif[-2] = 'O'
                 motif[-3] = 'O'
-                instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+                instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
            
                 for instance in instances:
                     if any([bi > 1 for bi in bond[instance[0]]]):
@@ -451,7 +579,7 @@ class ReactionFinder:
                 motif[-2] = 'O'
                 motif[-3] = 'O'
                 for rad_site in np.nonzero(rad)[0]:
-                    instances += find_motif.start_motif(motif, natom, bond, atom, 
+                    instances += self.start_motif(motif, natom, bond, atom, 
                                                         rad_site, self.species.atom_eqv)
                 # reverse direction
                 motif = ['X' for i in range(ringsize+1)]
@@ -459,7 +587,7 @@ class ReactionFinder:
                 motif[-2] = 'O'
                 motif[0] = 'O'
                 for rad_site in np.nonzero(rad)[0]:
-                    instances += find_motif.start_motif(motif, natom, bond, atom, 
+                    instances += self.start_motif(motif, natom, bond, atom, 
                                                         rad_site, self.species.atom_eqv)
                 for ins in instances:
                     rxns.append(ins)
@@ -510,7 +638,7 @@ class ReactionFinder:
                 motif[-1] = 'H'
                 motif[-2] = 'O'
                 motif[-3] = 'O'
-                instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+                instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
            
                 for instance in instances:
                     if bond[instance[0]][instance[1]] == 2:
@@ -553,7 +681,7 @@ class ReactionFinder:
         for ringsize in range(5, 9):
             motif = ['X' for i in range(ringsize + 1)]
             motif[-1] = 'H'
-            instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+            instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
 
             bondpattern = ['X' for i in range(ringsize)]
             bondpattern[0] = 2
@@ -596,7 +724,7 @@ class ReactionFinder:
             motif = ['X' for i in range(len(ci) + 1)]
             motif[-1] = 'H'
             
-            instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+            instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
             
             # check if there is a bond between the first and second to last atom
             for instance in instances:
@@ -641,7 +769,7 @@ class ReactionFinder:
             motif[-3] = 'O'
             motif[0] = 'C'
             for rad_site in np.nonzero(rad)[0]:
-                rxns += find_motif.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
+                rxns += self.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
 
         for instance in range(len(rxns)):
             rxns[instance] = rxns[instance][:-2] #cut off OR
@@ -677,7 +805,7 @@ class ReactionFinder:
             motif = ['X' for i in range(ringsize)]
             instances = []
             for rad_site in np.nonzero(rad)[0]:
-                instances += find_motif.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
+                instances += self.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
             bondpattern = ['X' for i in range(ringsize-1)]
             bondpattern[-1] = 2
             for instance in instances:
@@ -719,7 +847,7 @@ class ReactionFinder:
         for ringsize in self.ringrange:
             motif = ['X' for i in range(ringsize + 1)]
             for rad_site in np.nonzero(rad)[0]:
-                rxns += find_motif.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
+                rxns += self.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
 
         self.new_reaction(rxns, name, a=0, b=-1)
 #            # filter for specific reaction after this
@@ -752,7 +880,7 @@ class ReactionFinder:
             motif = ['X' for i in range(ringsize + 1)]
             instances = []
             for rad_site in np.nonzero(rad)[0]:
-                instances += find_motif.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
+                instances += self.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
             bondpattern = ['X' for i in range(ringsize)]
             bondpattern[-1] = 2
             for instance in instances:
@@ -819,7 +947,7 @@ class ReactionFinder:
             motif = ['X' for i in range(ringsize+2)]
             motif[-1] = 'H'
 
-            instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+            instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
             bondpattern = ['X' for i in range(ringsize+1)]
             bondpattern[0] = 2
             for instance in instances:
@@ -861,7 +989,7 @@ class ReactionFinder:
         for ci in self.species.cycle_chain:
             motif = ['X' for i in range(len(ci) + 2)]
             motif[-1] = 'H'
-            instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+            instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
 
             # check if there is a bond between the first and second to last atom
             for instance in instances:
@@ -897,7 +1025,7 @@ class ReactionFinder:
         
         motif = ['X' for i in range(6)]
         motif[-1] = 'H'
-        instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+        instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
 
         bondpattern = ['X' for i in range(5)]
         bondpattern[0] = 2
@@ -944,7 +1072,7 @@ class ReactionFinder:
             motif = ['X' for i in range(ringsize)]
             motif[-1] = 'O'
             motif[0] = 'O'
-            korcek_chain = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+            korcek_chain = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
             # filter clockwise and anti clockwise hits
             korcek_chain_filt = []
             for kch in korcek_chain:
@@ -1009,7 +1137,7 @@ class ReactionFinder:
             motif = ['X' for i in range(ringsize)]
             motif[-1] = 'O'
             motif[0] = 'O'
-            korcek_chain =  find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+            korcek_chain =  self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
             # filter clockwise and anti clockwise hits
             korcek_chain_filt = []
             for kch in korcek_chain:
@@ -1077,7 +1205,7 @@ class ReactionFinder:
         for ringsize in range(5, 6):
             motif = ['X' for i in range(ringsize + 1)]
             #motif[-1] = 'H'  #  deleted because atom types are no longer checked
-            korcek_chain =  find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+            korcek_chain =  self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
             for ins in korcek_chain:
                 if bond[ins[0]][ins[-2]] == 1:
                     rxns += [ins]
@@ -1206,7 +1334,7 @@ class ReactionFinder:
         rxns = [] #reactions found with the current resonance isomer
 
         motif = ['X','X','X']
-        instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+        instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
         
         for instance in instances:
             #if all([atom[atomi] != 'H' for atomi in instance]):
@@ -1242,7 +1370,7 @@ class ReactionFinder:
         rxns = [] #reactions found with the current resonance isomer
 
         motif = ['X','C','O','X']
-        instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+        instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
         for instance in instances:
             for atomi in range(natom):
                 if not atomi in instance:
@@ -1277,7 +1405,7 @@ class ReactionFinder:
         rxns = [] #reactions found with the current resonance isomer
         
         motif = ['X','X','X','O']
-        rxns = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+        rxns = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
         
         self.new_reaction(rxns, name, a=0, b=-1)
 #            # filter for specific reaction after this
@@ -1370,7 +1498,7 @@ class ReactionFinder:
         
         for ringsize in self.ringrange:  # TODO what is the meaning of these larger rings?
             motif = ['X' for i in range(ringsize)]
-            instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+            instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
 
             bondpattern = ['X' for i in range(ringsize - 1)]
             bondpattern[0] = 2
@@ -1408,11 +1536,11 @@ class ReactionFinder:
 
         # enol to keto
         motif = ['C', 'C', 'O', 'X']
-        instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+        instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
 
         # keto to enol
         motif = ['O', 'C', 'C', 'X']
-        instances += find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+        instances += self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
         bondpattern = [2, 'X', 'X', 'X']
         for instance in instances:
             if find_motif.bondfilter(instance, bond, bondpattern) == 0:
@@ -1448,7 +1576,7 @@ class ReactionFinder:
         rxns = [] #reactions found with the current resonance isomer
         
         motif = ['H', 'X', 'X', 'O', 'O']
-        rxns += find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+        rxns += self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
             
         self.new_reaction(rxns, name, a=0, b=-1)
 #            # filter for specific reaction after this
@@ -1480,7 +1608,7 @@ class ReactionFinder:
         
         motif = ['X', 'C', 'O']
 
-        instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+        instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
 
         for instance in instances:
             bondpattern = [1, 2]
@@ -1522,11 +1650,11 @@ class ReactionFinder:
         # simple beta scission for radicals
         motif = ['X', 'X', 'X']
         for rad_site in np.nonzero(rad)[0]:
-            rxns += find_motif.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
+            rxns += self.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
 
         # anticipated resonance stabilized radical
         motif = ['X', 'X', 'X', 'X']
-        instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+        instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
         bondpattern = [2, 'X', 'X', 'X']
         for instance in instances:
             if find_motif.bondfilter(instance, bond, bondpattern) == 0:
@@ -1560,20 +1688,15 @@ class ReactionFinder:
         motif = ['X','S','X']
         rxns = []
         for rad_site in np.nonzero(rad)[0]:
-            rxns += find_motif.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
+            rxns += self.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
 
-        #filter for identical reactions
-        for inst in rxns:
-            new = 1
-            for instance in self.reactions[name]:
-                if inst[0] == instance[0] and inst[1] == instance[1] and inst[2] == instance[2]:
-                    new = 0
-            # filter for specific reaction after this
-            if self.one_reaction_fam and new:
-                if self.reac_bonds != {frozenset({inst[1], inst[2]})} or self.prod_bonds != {frozenset()}:
-                    new = 0
-            if new:
-                self.reactions[name].append(inst)
+        # filter for specific reaction
+        if self.one_reaction_fam:
+            rxns = [inst for inst in rxns
+                    if self.reac_bonds == {frozenset({inst[1], inst[2]})} and self.prod_bonds == {frozenset()}]
+
+        # these families were never restricted to the solute in cluster mode
+        self.new_reaction(rxns, name, a=0, b=1, c=2, solute_only=False)
         return 0
 
 
@@ -1597,20 +1720,15 @@ class ReactionFinder:
         motif = ['S','X','X']
         rxns = []
         for rad_site in np.nonzero(rad)[0]:
-            rxns += find_motif.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
+            rxns += self.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
         
-        for inst in rxns:
-            new = 1
-            # filter for identical reactions
-            for instance in self.reactions[name]:
-                if inst[0] == instance[0] and inst[1] == instance[1] and inst[2] == instance[2]:
-                    new = 0
-            # filter for specific reaction after this
-            if self.one_reaction_fam and new:
-                if self.reac_bonds != {frozenset({inst[0], inst[1]})} or self.prod_bonds != {frozenset({inst[0], inst[2]})}:
-                    new = 0
-            if new:
-                self.reactions[name].append(inst)
+        # filter for specific reaction
+        if self.one_reaction_fam:
+            rxns = [inst for inst in rxns
+                    if self.reac_bonds == {frozenset({inst[0], inst[1]})} and self.prod_bonds == {frozenset({inst[0], inst[2]})}]
+
+        # these families were never restricted to the solute in cluster mode
+        self.new_reaction(rxns, name, a=0, b=1, c=2, solute_only=False)
         return 0
 
 
@@ -1632,7 +1750,7 @@ class ReactionFinder:
         rxns = [] #reactions found with the current resonance isomer
         
         motif = ['X','X','X','S']
-        rxns = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+        rxns = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
         
 
         self.new_reaction(rxns, name, a=0, b=-1)
@@ -1665,7 +1783,7 @@ class ReactionFinder:
         
         motif = ['X', 'C', 'S']
 
-        instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+        instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
 
         for instance in instances:
             bondpattern = [1, 2]
@@ -1706,7 +1824,7 @@ class ReactionFinder:
 
         
         motif = ['X','X','X','X']
-        instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+        instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
         for instance in instances: 
             if rad[instance[0]] == 1 and rad[instance[-1]] == 1:
                 rxns += [instance]
@@ -1743,7 +1861,7 @@ class ReactionFinder:
 
         for ringsize in range(5, 9):
             motif = ['X' for i in range(ringsize)]
-            instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+            instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
             
             bondpattern = ['X' for i in range(ringsize - 1)]
             bondpattern[0] = 2
@@ -1782,7 +1900,7 @@ class ReactionFinder:
 
         for ringsize in self.ringrange:
             motif = ['X' for i in range(ringsize)]
-            instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+            instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
            
             for instance in instances: 
                 if rad[instance[0]] == 1 and rad[instance[-1]] == 1:
@@ -1817,7 +1935,7 @@ class ReactionFinder:
         rxns = [] #reactions found with the current resonance isomer
         
         motif = ['X','X']
-        instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+        instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
         for instance in instances: 
             if instance[0] in self.cycle and instance[1] in self.cycle :
                 rxns += [instance]
@@ -1851,7 +1969,7 @@ class ReactionFinder:
         for ringsize in range(5, 9):
             motif = ['X' for i in range(ringsize)]
             motif[-1] = 'H'
-            instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+            instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
            
             for instance in instances: 
                 if rad[instance[0]] == 1 and rad[instance[-3]] == 1:
@@ -1887,7 +2005,7 @@ class ReactionFinder:
             motif = ['X' for i in range(ringsize)]
             motif[-1] = 'H'
             
-            instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+            instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
             
             bondpattern = ['X' for i in range(ringsize - 1)]
             bondpattern[0] = 2
@@ -1928,7 +2046,7 @@ class ReactionFinder:
             motif = ['X' for i in range(ringsize)]
             motif[-1] = 'H'
             
-            instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+            instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
             
             bondpattern = ['X' for i in range(ringsize - 1)]
             bondpattern[0] = 2
@@ -1967,7 +2085,7 @@ class ReactionFinder:
 
         motif = ['X', 'X', 'X', 'X', 'X']
         for rad_site in np.nonzero(rad)[0]:
-            rxns += find_motif.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
+            rxns += self.start_motif(motif, natom, bond, atom, rad_site, self.species.atom_eqv)
 
         self.new_reaction(rxns, name, a=0, b=1, c=2, d=3, e=4)
 #            # filter for specific reaction after this
@@ -1997,7 +2115,7 @@ class ReactionFinder:
         rxns = [] #reactions found with the current resonance isomer
 
 #        motif = ['H','X','X','H']
-#        instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+#        instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
 #        for instance in instances: 
 #            rxns += [instance]
 
@@ -2007,7 +2125,7 @@ class ReactionFinder:
             motif = ['X' for i in range(ringsize)]
             motif[0] = 'H'
             motif[-1] = 'H'
-            instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+            instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
             for instance in instances: 
                 rxns += [instance]
 
@@ -2040,7 +2158,7 @@ class ReactionFinder:
 
         if self.par['homolytic_bonds'] == {}:
             motif = ['X','X']
-            instances = find_motif.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
+            instances = self.start_motif(motif, natom, bond, atom, -1, self.species.atom_eqv)
             for instance in instances: 
                 if not self.species.cycle[instance[0]] or not self.species.cycle[instance[1]]:
                     rxns += [instance]
@@ -2327,73 +2445,86 @@ class ReactionFinder:
 
 
     def new_reaction(self, rxns, name, a=None, b=None, c=None, d=None, e=None, 
-                     length=None, full=False, cross=False, aid=False):
+                     length=None, full=False, cross=False, aid=False, solute_only=True):
         '''
         Checks a variable number of identical elements
         Also can check full equivalency (full=True), same lenght (length=True), and 
         equivalency between elements that are interchangeable (cross=True)
         if aid is True, then it will throw away reactions where there is already one
            with the same atom IDs involved - at least important for hom_sci
-        now also filters non-solute reactions in cluster mode
+        now also filters non-solute reactions in cluster mode, unless solute_only is False
         '''
 
+        if self.pending is not None:
+            # in a worker process of the parallel search
+            self.pending.append((rxns, name, {'a': a, 'b': b, 'c': c, 'd': d, 'e': e, 'length': length,
+                                              'full': full, 'cross': cross, 'aid': aid,
+                                              'solute_only': solute_only}))
+            return 0
+
+        labels = [ll for ll in [a, b, c, d, e] if ll is not None]
+        options = (a, b, labels, length, full, cross, aid)
+        index = self.reaction_index(name, options)
         for inst in rxns:
-            new = True
-            for instance in self.reactions[name]:
-                if aid == True:
-                    if (self.species.atomid[inst[a]] == self.species.atomid[instance[a]] and
-                            self.species.atomid[inst[b]] == self.species.atomid[instance[b]]):
-                        new = False
-                        break
-                    if (self.species.atomid[inst[b]] == self.species.atomid[instance[a]] and
-                            self.species.atomid[inst[a]] == self.species.atomid[instance[b]]):
-                        new = False
-                        break
-                if cross == True:
-                    if (inst[a] == instance[a] and inst[b] == instance[b]):
-                        new = False
-                        break 
-                    if (inst[a] == instance[b] and inst[b] == instance[a]):
-                        new = False
-                        break 
-                if a is not None:
-                    if inst[a] != instance[a]:
-                        continue
-                if b is not None:
-                    if inst[b] != instance[b]:
-                        continue
-                if c is not None:
-                    if inst[c] != instance[c]:
-                        continue
-                if d is not None:
-                    if inst[d] != instance[d]:
-                        continue
-                if e is not None:
-                    if inst[e] != instance[e]:
-                        continue
-                if length is not None:
-                    if len(inst) != len(instance):
-                        continue
-                if full == True:
-                    if len(inst) != len(instance):
-                        continue
-                    if any([inst[i] != instance[i] for i, _ in enumerate(inst)]):
-                        continue
-                new = False
+            keys = self.reaction_keys(inst, *options)
+            if any(key in index['keys'][kind] for kind, key in enumerate(keys) if key is not None):
                 continue
-            if new:
-                if self.par['cluster']:  # only append is solute is part of it
-                    labels = [a, b, c, d, e]
-                    testing = []
-                    for ll in labels:
-                        if ll != None:
-                            testing.append(inst[ll]) 
-                    if len([tt for tt in testing if tt in self.par['solute']]) > 0:
-                        self.reactions[name].append(inst)
-                else:
-                    self.reactions[name].append(inst)
+            if self.par['cluster'] and solute_only:  # only append is solute is part of it
+                testing = [inst[ll] for ll in labels]
+                if len([tt for tt in testing if tt in self.par['solute']]) == 0:
+                    continue
+            self.reactions[name].append(inst)
+            self.add_reaction_keys(index, keys)
         return 0
 
+    def reaction_keys(self, inst, a, b, labels, length, full, cross, aid):
+        '''
+        The keys of an instance for new_reaction, two instances are the same
+        if any of their keys are equal:
+        0: the atoms at the labels, the length and all atoms as requested
+        1: if cross, the two atoms at a and b, in any order
+        2: if aid, the atom IDs of the atoms at a and b, in any order
+        '''
+        same = tuple([inst[ll] for ll in labels])
+        if length is not None:
+            same += (len(inst),)
+        if full:
+            same += (len(inst), tuple(inst))
+        pair = None
+        if cross:
+            pair = frozenset([inst[a], inst[b]])
+        ids = None
+        if aid:
+            ids = frozenset([self.species.atomid[inst[a]], self.species.atomid[inst[b]]])
+        return same, pair, ids
+
+    @staticmethod
+    def add_reaction_keys(index, keys):
+        for kind, key in enumerate(keys):
+            if key is not None:
+                index['keys'][kind].add(key)
+        index['size'] += 1
+
+    def reaction_index(self, name, options):
+        '''
+        The keys of the instances of the family accepted so far. The index
+        is rebuilt if the list of instances was replaced, and extended with
+        the instances appended to the list since the last call.
+        '''
+        index = self.reaction_indices.get(name)
+        if (index is None or index['instances'] is not self.reactions[name]
+                or index['options'] != options or index['size'] > len(self.reactions[name])):
+            index = {'instances': self.reactions[name],
+                     'options': options,
+                     'size': 0,
+                     'keys': (set(), set(), set()),
+                     }
+            self.reaction_indices[name] = index
+        for inst in self.reactions[name][index['size']:]:
+            self.add_reaction_keys(index, self.reaction_keys(inst, *options))
+        return index
+
+
 def main():
     '''
     Find reaction patterns
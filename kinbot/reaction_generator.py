@@ -1,6 +1,8 @@
 import os, sys
+import json
 import shutil
 import time
+import asyncio
 import logging
 import copy
 import itertools
@@ -21,10 +23,16 @@ from kinbot.molpro import Molpro
 from ase.db import connect
 from ase import Atoms
 from kinbot.utils import reorder_coord
+from kinbot.profiling import profiler
 
 
 logger = logging.getLogger('KinBot')
 
+# parameters deciding the fate of the reactions, the snapshot is only
+# used if they did not change since it was written
+snapshot_par = ['barrier_threshold', 'barrier_threshold_L2', 'imagfreq_threshold',
+                'scan_step', 'qc', 'method', 'basis']
+
 class ReactionGenerator:
     '''
     This class generates the reactions using the qc codes
@@ -37,6 +45,14 @@ class ReactionGenerator:
         self.par = par
         self.inp = input_file
         self.qc = qc
+        self.snapshot_file = 'reaction_generator.json'
+        # chemid -> the StationaryPoint shared by the products of all reactions
+        self.frag_unique = {}
+        # chemid -> the Optimize object shared by the products of all reactions
+        self.prod_opt_unique = {}
+        # reaction index -> rows in the database for the TS search job
+        # when its current step was submitted
+        self.step_rows = {}
 
     def generate(self):
         '''
@@ -59,594 +75,21 @@ class ReactionGenerator:
 
         If at any times the calculation fails, reac_ts_done is set to -999.
         If all steps are successful, reac_ts_done is set to -1.
+
+        Each reaction is advanced by its own coroutine, which is only woken up
+        when one of the jobs it waits for has finished.
         '''
         deleted = []
-        if len(self.species.reac_inst) > 0:
-            alldone = 1
-        else:
-            alldone = 0
 
         for ro in self.species.reac_obj:
             ro.prod_done = 0
             ro.valid_prod = []
 
-        frag_unique = []
-
-        while alldone:
-            for index, instance in enumerate(self.species.reac_inst):
-                obj = self.species.reac_obj[index]
-                if obj.instance_name in self.par['skip_reactions'] \
-                        and self.species.reac_ts_done[index] != -999:
-                    logger.info(f'\tRemoving reaction {obj.instance_name}.')
-                    self.species.reac_ts_done[index] = -999
-                # START REACTION SEARCH
-                if self.species.reac_ts_done[index] == 0 and self.species.reac_step[index] == 0:
-                    # verify after restart if search has failed in previous kinbot run
-                    status = self.qc.check_qc(obj.instance_name)
-                    if status == 'error':
-                        logger.info('\tRxn search failed for {}'
-                                     .format(obj.instance_name))
-                        self.species.reac_ts_done[index] = -999
-                if self.species.reac_type[index] == 'hom_sci' and self.species.reac_ts_done[index] == 0:  # no matter what, set to 2
-                    # somewhat messy manipulation to force the new bond matrix for hom_sci
-                    obj.irc_prod = StationaryPoint(f'{instance}_prod', self.species.charge, self.species.mult,
-                                                   atom=self.species.atom, geom=self.species.geom, wellorts=0)
-                    obj.irc_prod.characterize()
-                    obj.irc_prod.bonds[0][obj.instance[0]][obj.instance[1]] = 0  # delete bond
-                    obj.irc_prod.bonds[0][obj.instance[1]][obj.instance[0]] = 0  # delete bond
-                    obj.irc_prod.bond[obj.instance[0]][obj.instance[1]] = 0  # delete bond
-                    obj.irc_prod.bond[obj.instance[1]][obj.instance[0]] = 0  # delete bond
-                    self.species.reac_ts_done[index] = 2
-
-                if self.species.reac_ts_done[index] == 0:  # ts search is ongoing
-                    if obj.scan == 0:  # don't do a scan of a bond
-                        if self.species.reac_step[index] == obj.max_step + 1:
-                            status, freq = self.qc.get_qc_freq(obj.instance_name, self.species.natom)
-                            if status == 0 and (np.count_nonzero(np.array(freq) < 0) >= 3  # Three or more imag frequencies
-                                                or np.count_nonzero(np.array(freq) < -1 * self.par['imagfreq_threshold']) >= 2  # More than one imaginary frequency beyond the threshold
-                                                or np.count_nonzero(np.array(freq) < 0) == 0):  # No imaginary frequencies
-                                logger.info(f'\tReaction search failed for {obj.instance_name}: '
-                                            'Wrong number of imaginary frequencies.')
-                                self.species.reac_ts_done[index] = -999
-                            elif status == 0:
-                                self.species.reac_ts_done[index] = 1
-                            elif status == -1: 
-                                logger.info(f'\tReaction search failed for {obj.instance_name}.')
-                                self.species.reac_ts_done[index] = -999
-                        else:
-                            self.species.reac_step[index] = reac_family.carry_out_reaction(
-                                                            obj, self.species.reac_step[index], self.par['qc_command'],
-                                                            bimol=self.par['bimol'])
-                            if self.species.reac_step[index] == -1:
-                                self.species.reac_ts_done[index] = -999
-                                logger.info(f'\tReaction search failed for {obj.instance_name}: '
-                                            'Invalid geometry.')
-
-                    elif obj.scan == 1:  # do a bond scan 
-
-                        if (self.species.reac_step[index] == self.par['scan_step'] + 1):
-                            status, freq = self.qc.get_qc_freq(obj.instance_name, self.species.natom)
-                            if status == 0 and (np.count_nonzero(np.array(freq) < 0) >= 3  # More than two imag frequencies
-                                                or np.count_nonzero(np.array(freq) < -1 * self.par['imagfreq_threshold']) >= 2  # More than one imaginary frequency beyond the threshold
-                                                or np.count_nonzero(np.array(freq) < 0) == 0):  # No imaginary frequencies
-                                logger.info(f'\tReaction search failed for {obj.instance_name}: '
-                                            'wrong number of imaginary frequencies.')
-                                self.species.reac_ts_done[index] = -999
-                            elif status == 0:
-                                self.species.reac_ts_done[index] = 1
-                            elif status == -1:
-                                logger.info(f'\tRxn search using scan failed for {obj.instance_name} '
-                                            'in TS optimization stage.')
-                                self.species.reac_ts_done[index] = -999
-                        else:  
-                            # First point of the scan
-                            if self.species.reac_step[index] == 0:
-                                command = self.par['qc_command']
-                                self.species.reac_step[index] = reac_family.carry_out_reaction(
-                                                                obj, self.species.reac_step[index], command,
-                                                                bimol=self.par['bimol'])
-                                if self.species.reac_step[index] == -1:
-                                    self.species.reac_ts_done[index] = -999
-                                    logger.info('\tRxn search failed for {} because of 0 0 0 geometry.'
-                                                 .format(obj.instance_name))
-                            # Middle points of the scan
-                            if (self.species.reac_step[index] < self.par['scan_step'] and obj.family_name):
-                                status = self.qc.check_qc(obj.instance_name)
-                                if status == 'error':
-                                    logger.info('\tRxn search using scan failed for {} in step {}'
-                                                 .format(obj.instance_name, self.species.reac_step[index]))
-                                    self.species.reac_ts_done[index] = -999
-                                else:
-                                    err, energy = self.qc.get_qc_energy(obj.instance_name)
-                                    if err == 0:
-                                        self.species.reac_scan_energy[index].append(energy)
-                                        logger.debug(f'Scan energy for {obj.instance_name} in step {self.species.reac_step[index]}:')
-                                        logger.debug(f'{self.species.reac_scan_energy[index][-1]} Hartree.')
-                                        # need at least 3 points for a maximum
-                                        if len(self.species.reac_scan_energy[index]) >= 3:
-                                            ediff = np.diff(self.species.reac_scan_energy[index])
-                                            if ediff[-1] < 0 and ediff[-2] > 0:  # max
-                                                logger.info(f'\tMaximum found for {obj.instance_name}.')
-                                                e_in_kcal = [constants.AUtoKCAL * (self.species.reac_scan_energy[index][ii] - 
-                                                               self.species.reac_scan_energy[index][0])
-                                                               for ii in range(len(self.species.reac_scan_energy[index]))]
-                                                e_in_kcal = np.round(e_in_kcal, 2)
-                                                logger.info(f'\tEnergies: {e_in_kcal}')
-                                                logger.debug(f'Derivatives: {ediff}')
-                                                self.species.reac_step[index] = self.par['scan_step']  # ending the scan
-                                            if len(ediff) >= 3:
-                                                if any([edf == 0 for edf in ediff[-2:]]):
-                                                    logger.warning(f'Calculation failed in the bond scan of {obj.instance_name}.')
-                                                    self.species.reac_ts_done[index] = -999
-                                                    continue
-                                                if 10. * (ediff[-3] / ediff[-2]) < (ediff[-2] / ediff[-1]):  # sudden change in slope
-                                                    logger.info(f'\tSudden change in slope for {obj.instance_name}.')
-                                                    logger.info(f'\tRelative energies (kcal/mol): {self.species.reac_scan_energy[index]}')
-                                                    logger.debug(f'Derivatives: {ediff}')
-                                                    self.species.reac_step[index] = self.par['scan_step']  # ending the scan
-                                     
-                                        # scan continues, and if reached scan_step, then goes for full optimization
-                                        self.species.reac_step[index] = reac_family.carry_out_reaction(
-                                                                        obj, self.species.reac_step[index], command,
-                                                                        bimol=self.par['bimol'])
-                                        if self.species.reac_step[index] == -1:
-                                            self.species.reac_ts_done[index] = -999
-                                            logger.info('\tRxn search failed for {} because of 0 0 0 geometry.'
-                                                         .format(obj.instance_name))
-                            else:  # the last step was reached, and no max or inflection was found
-                                status = self.qc.check_qc(obj.instance_name)
-                                if status == 'running':
-                                    continue
-                                logger.info('\tRxn search using scan failed for {}, no saddle guess found.'
-                                            .format(obj.instance_name))
-                                db = connect('{}/kinbot.db'.format(os.getcwd()))
-                                # error line, H atom is just placeholder
-                                db.write(Atoms('H'), name=obj.instance_name, data={'status': 'error'})
-                                # this is copied here so that a non-AM1 file is in place
-                                shutil.copy(f'{os.getcwd()}/{self.species.chemid}_well.log', f'{os.getcwd()}/{obj.instance_name}.log')
-                                self.species.reac_ts_done[index] = -999
-
-                elif self.species.reac_ts_done[index] == 1:
-                    status = self.qc.check_qc(obj.instance_name)
-                    if status == 'running':
-                        continue
-                    elif status == 'error':
-                        logger.info('\tRxn search failed (gaussian error) for {}'
-                                     .format(obj.instance_name))
-                        self.species.reac_ts_done[index] = -999
-                    else:
-                        # check the barrier height:
-                        ts_energy = self.qc.get_qc_energy(obj.instance_name)[1]
-                        ts_zpe = self.qc.get_qc_zpe(obj.instance_name)[1]
-                        if self.species.reac_type[index] == 'R_Addition_MultipleBond' \
-                                and self.qc.qc != 'nn_pes':
-                            ending = 'well_mp2'
-                            thresh = self.par['barrier_threshold']  # need to fix for mp2 specific
-                        elif self.species.reac_type[index] == 'barrierless_saddle' \
-                                and self.qc.qc != 'nn_pes':
-                            ending = 'well_bls'
-                            thresh = self.par['barrier_threshold']
-                        else:
-                            ending = 'well'
-                            thresh = self.par['barrier_threshold']
-                        sp_energy = self.qc.get_qc_energy('{}_{}'.format(str(self.species.chemid), ending))[1]
-                        sp_zpe = self.qc.get_qc_zpe('{}_{}'.format(str(self.species.chemid), ending))[1]
-                        try:
-                            barrier = (ts_energy + ts_zpe - sp_energy - sp_zpe) * constants.AUtoKCAL
-                        except TypeError:
-                            logger.error(f'Faulty calculations, check or delete files for {obj.instance_name}.')
-                            sys.exit(-1)
-                        if barrier > thresh:
-                            logger.info('\tRxn barrier too high ({0:.2f} kcal/mol) at L1 for {1}'
-                                         .format(barrier, obj.instance_name))
-                            self.species.reac_ts_done[index] = -999
-                        else:
-                            obj.irc = IRC(obj, self.par)  
-                            irc_status = obj.irc.check_irc()
-                            if 0 in irc_status:
-                                logger.info('\tRxn barrier is ({0:.2f} kcal/mol) at L1 for {1}'
-                                             .format(barrier, obj.instance_name))
-                                # No IRC started yet, start the IRC now
-                                logger.info('\tStarting IRC calculations for {}'
-                                             .format(obj.instance_name))
-                                obj.irc.do_irc_calculations()
-                            elif irc_status[0] == 'running' or irc_status[1] == 'running':
-                                continue
-                            else:
-                                # IRC's have successfully finished, have an error, in any case
-                                # read the geometries and try to make products out of them
-                                # verify which of the ircs leads back to the reactant, if any
-                                logger.info('\tRxn barrier is {0:.2f} kcal/mol for {1}'
-                                             .format(barrier, obj.instance_name))
-                                obj.irc_prod = obj.irc.irc2stationary_pt()
-                                if obj.irc_prod == 0:
-                                    logger.info('\tNo product found for {}'.format(obj.instance_name))
-                                    self.species.reac_ts_done[index] = -999
-                                else:
-                                    self.species.reac_ts_done[index] = 2
-
-                elif self.species.reac_ts_done[index] == 2:
-                    # obj.valid_prod: list marking fragments for deletion (if breaks apart or changes)
-                    # frag_unique: list of unique fragments across all reactions for this well
-                    # obj.products: list of products for given reaction, which includes changes and further dissociation 
-                    if obj.prod_done == 0:  # not started optimization yet
-                        # identify bimolecular products and wells from IRC - do it once
-                        obj.products, _ = obj.irc_prod.start_multi_molecular(vary_charge=True)
-                        if self.species.charge == 0:
-                            logger.info(f'\tBased on the end of IRC, reaction {obj.instance_name} leads to products '
-                                        f'{[fr.chemid for fr in obj.products]}')
-                        else:
-                            logger.info(f'\tBased on the end of IRC, reaction {obj.instance_name} leads to products '
-                                        f'{[fr.chemid for fr in obj.products]} (including all possible charge distributions)')
-
-                        self.equate_identical(obj.products)
-                        obj.valid_prod = len(obj.products) * [True]
-
-                        # make the geom of products in frag_unique the one from the multi_molecular (not optimized)
-                        self.equate_unique(obj.products, frag_unique)
-                        obj.prod_done = 1
-
-                    for frag in obj.products:
-                        self.qc.qc_opt(frag, frag.geom)
-                        e, _ = self.qc.get_qc_geom(str(frag.chemid) + '_well', frag.natom) # check if finished without updating geom
-                        if e == 1:  # it's running
-                            continue
-
-                    # initial fragment calculations finished, reading results...
-                    hom_sci_energy = 0
-                    products_orig = [copy.copy(opr) for opr in obj.products] 
-                    ndone = 0
-                    for fragii, frag in enumerate(products_orig):
-                        if frag.chemid == self.species.chemid:
-                            logger.info(f'Product in {obj.instance_name} is identical to the reactant. Reaction deleted.')
-                            self.species.reac_ts_done[index] = -999 
-                            break
-                        # do not look at already invalid fragments again
-                        elif not obj.valid_prod[fragii]:
-                            ndone += 1
-                            continue
-                        chemid_orig = frag.chemid
-                        e, frag.geom, frag.atom = self.qc.get_qc_geom(
-                            str(frag.chemid) + '_well',
-                            frag.natom,
-                            reorder=True)
-                        if e < 0:
-                            logger.info(f'\tProduct optimization failed for {obj.instance_name}, product {frag.chemid}')
-                            self.species.reac_ts_done[index] = -999
-                            ndone += 1
-                        elif e == 1:
-                            break
-                        else:
-                            ndone += 1
-                            _, frag.energy = self.qc.get_qc_energy(str(frag.chemid) + '_well')
-                            _, frag.zpe = self.qc.get_qc_zpe(str(frag.chemid) + '_well')
-                            if self.species.reac_type[index] == 'hom_sci': # TODO energy is the sum of all possible fragments  
-                                hom_sci_energy += frag.energy + frag.zpe
-                            # Reinitialize rads and bonds
-                            frag.reset_order()
-                            # connectivity changed
-                            if chemid_orig != frag.chemid:
-                                for fri, fr in enumerate(obj.products):
-                                    if fr.chemid == chemid_orig:
-                                        obj.valid_prod[fri] = False
-                                newfrags, _ = frag.start_multi_molecular(vary_charge=True)  
-                                self.equate_identical(newfrags)
-                                self.equate_unique(newfrags, frag_unique)
-                                logger.warning(f'Product {chemid_orig} optimized to {[nf.chemid for nf in newfrags]} '
-                                               f'in reaction {obj.instance_name}')
-                                for nf in newfrags:
-                                    obj.products.append(nf)
-                                    obj.valid_prod.append(True)
-                            else:
-                                for fri, fr in enumerate(obj.products):
-                                    if fr.chemid == chemid_orig:
-                                        obj.products[fri].energy = frag.energy
-                                        obj.products[fri].zpe = frag.zpe
-                                        # Reorder the coordinates of frag in case the atom order is different
-                                        if any(obj.products[fri].atom != frag.atom):
-                                            reorder_coord(mol_A=obj.products[fri],
-                                                          mol_B=frag)
-                                        obj.products[fri].geom = frag.geom
-
-                    if ndone == len(obj.products) and self.species.reac_ts_done[index] != -999:  # all currently recognized fragments are done
-                        # delete invalid ones
-                        obj.products = list(np.array(obj.products)[obj.valid_prod])
-                        if self.species.charge != 0:  # select the lower energy combination
-                            # brute force all combinations for ions
-                            combs = np.array([np.array(i) for i in itertools.product([0, 1], repeat = len(obj.products))])
-                            val = 1000.
-                            ens = np.array([i.energy for i in obj.products])
-                            zpes = np.array([i.zpe for i in obj.products])
-                            masses = np.array([i.mass for i in obj.products])
-                            charges = np.array([i.charge for i in obj.products])
-                            frag_symbols = [p.atom for p in obj.products]
-                            low_e_comb = combs[0]
-                            for comb in combs:
-                                comb_symbols = []
-                                for i, frag_symb in enumerate(frag_symbols):
-                                    if comb[i]:
-                                        comb_symbols.extend(frag_symb)
-                                if sum(comb * charges) != self.species.charge \
-                                        or sum(comb * masses) != self.species.mass \
-                                        or sorted(comb_symbols) != sorted(self.species.atom):
-                                    continue
-                                rel_energy = constants.AUtoKCAL * (sum(comb * (ens + zpes)) - \
-                                             (self.species.start_energy + self.species.start_zpe))
-                                relev_comb = [p.chemid for i, p in enumerate(obj.products) if comb[i]]
-                                if len(obj.products) > 2:
-                                    logger.info(f'\tPossible ion combination and energy for {obj.instance_name} products: '
-                                                f'{", ".join([str(c) for c in relev_comb])} '
-                                                f'at {rel_energy:.1f} kcal/mol.')
-                                if sum(comb * (ens + zpes)) < val:
-                                    val = sum(comb * (ens + zpes))
-                                    low_e_comb = comb
-                            obj.products = list(np.array(obj.products)[low_e_comb.astype(bool)])
-                        obj.irc_fragments = [copy.copy(this_frag) for this_frag in obj.products]
-                        prods_energy = sum([p.energy + p.zpe for p in obj.products])
-
-                        # Select reactions potentially leading to vdW wells
-                        if len(obj.products) == 2 and 'hom_sci' not in obj.instance_name:
-                            logger.info('\tChecking vdW well for {}.'.format(obj.instance_name))
-                            obj.irc_prod.characterize()
-                            e, obj.irc_prod.energy = self.qc.get_qc_energy(f'{obj.irc_prod.name}')  # e is the error code: should be 0 (success) at this point.
-                            e, obj.irc_prod.zpe = self.qc.get_qc_zpe(f'{obj.irc_prod.name}')
-                            e, obj.irc_prod.geom = self.qc.get_qc_geom(obj.irc_prod.name, obj.irc_prod.natom)
-                            e, obj.irc_prod.freq = self.qc.get_qc_freq(obj.irc_prod.name, obj.irc_prod.natom) 
-                            for this_frag in obj.irc_fragments:
-                                e, this_frag.freq = self.qc.get_qc_freq(f'{this_frag.name}_well', this_frag.natom) 
-                            fragments_energies = sum([(this_frag.energy + this_frag.zpe) for this_frag in obj.irc_fragments ])
-                            obj.vdW_depth = (fragments_energies - (obj.irc_prod.energy + obj.irc_prod.zpe)) * constants.AUtoKCAL
-                            if obj.vdW_depth > self.par['vdW_detection']:
-                                logger.info(f'\tvdW well detected for {obj.irc_prod.name}. Depth: {np.round(obj.vdW_depth, 2)} kcal/mol.')
-                                obj.do_vdW = True
-                            else:
-                                logger.info(f'\t{obj.irc_prod.name} was not succesfully identified as a vdW well. Well depth is {np.round(obj.vdW_depth, 2)} kcal/mol.')
-                            
-                        if self.species.reac_type[index] == 'hom_sci': # TODO energy is the sum of all possible fragments
-                            hom_sci_energy = (prods_energy - self.species.start_energy - self.species.start_zpe) * constants.AUtoKCAL
-                            if hom_sci_energy < self.par['barrier_threshold'] + self.par['hom_sci_threshold_add']:
-                                self.species.reac_ts_done[index] = 3
-                            else:
-                                logger.info(f'\thom_sci energy is too high at {np.round(hom_sci_energy, 2)} kcal/mol for {obj.instance_name}')
-                                self.species.reac_ts_done[index] = -999
-                        else:
-                            self.species.reac_ts_done[index] = 3
-
-                elif self.species.reac_ts_done[index] == 3:
-                    for frag in obj.products:
-                        # # Reordering in case different fragment
-                        e, frag.geom, frag.atom = self.qc.get_qc_geom(
-                            str(frag.chemid) + '_well',
-                            frag.natom,
-                            reorder=True)
-                        # Create a new stp instead of updating geom and atom
-                        # because rads and bonds need to be changed
-                        frag.reset_order()
-                        # e, frag.geom = self.qc.get_qc_geom(str(frag.chemid) + '_well', frag.natom)
-
-                    # Do the TS and product optimization
-                    # make a stationary point object of the ts
-                    bond_mx = np.zeros((self.species.natom, self.species.natom), dtype=int)
-                    for i in range(self.species.natom):
-                        for j in range(self.species.natom):
-                            bond_mx[i][j] = max(self.species.bond[i][j], obj.irc_prod.bonds[0][i][j])
-
-                    if self.species.reac_type[index] != 'hom_sci':
-                        err, geom = self.qc.get_qc_geom(obj.instance_name, self.species.natom)
-                        ts = StationaryPoint(obj.instance_name, self.species.charge, self.species.mult,
-                                             atom=self.species.atom, geom=geom, wellorts=1)
-                        err, ts.energy = self.qc.get_qc_energy(obj.instance_name)
-                        err, ts.zpe = self.qc.get_qc_zpe(obj.instance_name)
-                        err, ts.freq = self.qc.get_qc_freq(obj.instance_name, self.species.natom)
-                        ts.distance_mx()
-                        ts.bond_mx()
-                        ts.bond = np.maximum(ts.bond, bond_mx)
-                        # -1: broken, 0: no change, +1: formed
-                        ts.reac_bond = np.array(obj.irc_prod.bond01) - np.array(self.species.bond01) 
-                        ts.find_cycle()
-                        ts.find_conf_dihedral()
-                        obj.ts = ts
-                        # do the ts optimization
-                        obj.ts_opt = Optimize(obj.ts, self.par, self.qc)
-                        obj.ts_opt.do_optimization()
-                    else:
-                        obj.ts = copy.copy(obj.species)  # the TS will be for now the species itself
-                        obj.ts.wellorts = 1
+        if self.par['restart_snapshot']:
+            self.load_snapshot()
 
-                    # do the vdW optimizations
-                    if obj.do_vdW:
-                        # do the high level optimization if requested
-                        obj.irc_prod_opt = Optimize(obj.irc_prod, self.par, self.qc, just_high=True)
-                        obj.irc_prod_opt.do_optimization()
-                        if obj.irc_prod_opt.shigh == -999: 
-                            logger.info('\tVdW search failed for {}, prod_opt shigh fail for {}.'
-                                            .format(obj.irc_prod.name, obj.irc_prod.chemid))
-                            obj.do_vdW = False
-                        # non-conformationally optimized fragments high-level qc to be added here if we want to
-                                                  
-                    # do the products optimizations
-                    temp_prod_opt = []  # holding the optimization objects temporarily
-                    for st_pt in obj.products:
-                        new = 1
-                        # do the products optimizations
-                        # check for products of other reactions that are the same as this product
-                        # in the case such products are found, use the same Optimize object for both
-                        for i, inst_i in enumerate(self.species.reac_inst):
-                            if not new:
-                                break
-                            if i != index:
-                                obj_i = self.species.reac_obj[i]
-                                if self.species.reac_ts_done[i] > 2:
-                                    for j, st_pt_i in enumerate(obj_i.products):
-                                        if st_pt_i.chemid == st_pt.chemid:
-                                            if len(obj_i.prod_opt) > j:
-                                                prod_opt = obj_i.prod_opt[j]
-                                                new = 0
-                                                break
-                        if new:
-                            prod_opt = Optimize(st_pt, self.par, self.qc)
-                            prod_opt.do_optimization()
-                            if prod_opt.shigh == -999:
-                                logger.info('\tRxn search failed for {}, prod_opt shigh fail for {}.'
-                                             .format(obj.instance_name, prod_opt.species.chemid))
-                                self.species.reac_ts_done[index] = -999
-                                #break  # breaks so that other species is not looked at
-                        temp_prod_opt.append(prod_opt)
-                    if self.species.reac_ts_done[index] != -999:
-                        for tpo in temp_prod_opt:
-                            obj.prod_opt.append(tpo)
-
-                    if self.species.reac_ts_done[index] != -999:  # so we don't reset faulty calculation
-                        for st_pt in obj.products:
-                            # section where comparing products in same reaction occurs
-                            if len(obj.prod_opt) > 0:
-                                for j, st_pt_opt in enumerate(obj.prod_opt):
-                                    if st_pt.chemid == st_pt_opt.species.chemid:
-                                        if len(obj.prod_opt) > j:
-                                            prod_opt = obj.prod_opt[j]
-                                            break
-
-                        self.species.reac_ts_done[index] = 4
-
-                elif self.species.reac_ts_done[index] == 4:
-                    # check up on the TS and product optimizations
-                    opts_done = 1
-                    fails = 0
-                    # check if ts and vdW are done
-                    if self.species.reac_type[index] != 'hom_sci':
-                        if not obj.ts_opt.shir == 1:  # last stage in optimize
-                            opts_done = 0
-                            obj.ts_opt.do_optimization()
-                        if obj.ts_opt.shigh == -999:
-                            logger.warning('Reaction {} ts_opt_shigh failure'.format(obj.instance_name))
-                            fails = 1
-                        if obj.do_vdW:
-                            if obj.irc_prod_opt.shigh == -999:
-                                logger.warning('High level vdW well optimization of {} failed'.format(obj.irc_prod.name))
-                                obj.do_vdW = False
-                            if not obj.irc_prod_opt.shigh == 1:
-                                opts_done = 0
-                                obj.irc_prod_opt.do_optimization()
-                    for pr_opt in obj.prod_opt:
-                        if not pr_opt.shir == 1:
-                            opts_done = 0
-                            pr_opt.do_optimization()
-                        if pr_opt.shigh == -999:
-                            logger.warning('Reaction {} pr_opt_shigh failure'.format(obj.instance_name))
-                            fails = 1
-                        continue
-                            
-                    if fails:
-                        self.species.reac_ts_done[index] = -999
-                    elif opts_done:
-                        self.species.reac_ts_done[index] = 5
-
-                elif self.species.reac_ts_done[index] == 5:
-                    # Finilize the calculations
-                    st_pt = obj.prod_opt[0].species
-                    # kill reaction if higher than L2 threshold
-                    if self.par['barrier_threshold_L2'] and self.par['high_level'] and 'hom_sci' not in obj.instance_name:
-                        # check the barrier height again at L2 if requested
-                        ts_energy = self.qc.get_qc_energy(f'{obj.instance_name}_high')[1]
-                        ts_zpe = self.qc.get_qc_zpe(f'{obj.instance_name}_high')[1]
-                        valid = (ts_energy + ts_zpe - self.species.energy - self.species.zpe) * constants.AUtoKCAL - self.par['barrier_threshold_L2']
-                        if  valid > 0. :
-                            logger.info(f'\t{obj.instance_name} is higher than the L2 threshold by {np.round(valid, 2)} kcal/mol, reaction is deleted.')
-                            self.species.reac_ts_done[index] = -999
-                            continue
-                    # continue to PES search in case a new well was found
-                    if self.par['pes']:
-                        # verify if product is monomolecular, and if it is new
-                        if len(obj.products) == 1:
-                            st_pt = obj.prod_opt[0].species
-                            chemid = st_pt.chemid
-                            # if high level was requested, it is L2, otherwise L1
-                            rel_en = (st_pt.energy + st_pt.zpe - self.species.energy - self.species.zpe) * constants.AUtoKCAL 
-                            logger.info(f'\tProduct {obj.instance_name} energy is {np.round(rel_en, 2)} kcal/mol.')
-                            if self.par['barrier_threshold_L2'] and self.par['high_level']:
-                                new_barrier_threshold = None
-                                new_barrier_threshold_L2 = self.par['barrier_threshold_L2'] - rel_en 
-                            else:
-                                new_barrier_threshold = self.par['barrier_threshold'] - rel_en 
-                                new_barrier_threshold_L2 = None
-                            dirwell = os.path.dirname(os.getcwd())
-                            jobs = open(dirwell + '/chemids', 'r').read().split('\n')
-                            jobs = [ji for ji in jobs]
-                            if not str(chemid) in jobs:
-                                # this well is new, add it to the jobs
-                                while 1:
-                                    try:
-                                        # try to open the file and write to it
-                                        logger.info(f'\tLaunching new KinBot as {chemid}')
-                                        pes.write_input(self.inp, obj.products[0], new_barrier_threshold, new_barrier_threshold_L2, dirwell, self.par['me'])
-                                        with open(dirwell + '/chemids', 'a') as f:
-                                            f.write('{}\n'.format(chemid))
-                                        break
-                                    except IOError:
-                                        # wait a second and try again
-                                        time.sleep(1)
-                                        pass
-
-                    # check for wrong number of negative frequencies
-                    neg_freq = 0
-                    for st_pt in obj.products:
-                        if len(st_pt.reduced_freqs):
-                            if -1 * self.par['imagfreq_threshold'] <= st_pt.reduced_freqs[0] <= 0.:
-                                logger.warning(f'Found negative frequency {st_pt.reduced_freqs[0]} cm-1 for a product of {obj.instance_name}. Flipped.')
-                                st_pt.reduced_freqs[0] *= -1.
-                            elif st_pt.reduced_freqs[0] < -1 * self.par['imagfreq_threshold']:
-                                logger.warning(f'Found negative frequency {st_pt.reduced_freqs[0]} cm-1 for a product of {obj.instance_name}.')
-                                self.species.reac_ts_done[index] = -999
-                                neg_freq = 1
-                    if any([fi < 0. for fi in obj.ts.reduced_freqs[1:]]):
-                        logger.warning('Found more than one negative frequency for ' + obj.instance_name)
-                        logger.warning(obj.ts.reduced_freqs)
-                        self.species.reac_ts_done[index] = -999
-                        neg_freq = 1
-                        
-                    if not neg_freq:
-                        # the reaction search is finished
-                        self.species.reac_ts_done[index] = -1  # this is the success code
-
-                        # write a temporary pes input file
-                        # remove old xval and im_extent files
-                        if os.path.exists('{}_xval.txt'.format(self.species.chemid)):
-                            os.remove('{}_xval.txt'.format(self.species.chemid))
-                        if os.path.exists('{}_im_extent.txt'.format(self.species.chemid)):
-                            os.remove('{}_im_extent.txt'.format(self.species.chemid))
-                        postprocess.createPESViewerInput(self.species, self.qc, self.par)
-
-                elif self.species.reac_ts_done[index] == -999:
-                    if self.par['delete_intermediate_files'] == 1:
-                        if not self.species.reac_obj[index].instance_name in deleted:
-                            self.delete_files(self.species.reac_obj[index].instance_name)
-                            deleted.append(self.species.reac_obj[index].instance_name)
-
-            alldone = 1
-            for index, instance in enumerate(self.species.reac_inst):
-                if any(self.species.reac_ts_done[index] >= 0
-                       for i in range(len(self.species.reac_inst))):
-                    alldone = 1
-                    break
-                else:
-                    alldone = 0
-
-            # write a small summary while running
-            with open('kinbot_monitor.out', 'w') as f_out:
-                for index, instance in enumerate(self.species.reac_inst):
-                    if self.species.reac_ts_done[index] == -1:
-                        prodstring = []
-                        for pp in self.species.reac_obj[index].products:
-                            prodstring.append(str(pp.chemid))
-                        f_out.write('{}\t{}\t{}\t{}\n'.format(self.species.reac_ts_done[index], 
-                                                              self.species.reac_step[index], 
-                                                              self.species.reac_obj[index].instance_name,
-                                                              ' '.join(prodstring)))
-                    else:
-                        f_out.write('{}\t{}\t{}\n'.format(self.species.reac_ts_done[index], 
-                                                          self.species.reac_step[index], 
-                                                          self.species.reac_obj[index].instance_name))
-            time.sleep(1)
+        if len(self.species.reac_inst) > 0:
+            asyncio.run(self.run(deleted))
 
         # Create molpro file for the BLS products
         for index, instance in enumerate(self.species.reac_inst):
@@ -732,6 +175,717 @@ class ReactionGenerator:
 
         logger.info('Reaction generation done!')
 
+    async def run(self, deleted):
+        '''
+        Drive each reaction by its own coroutine, next to the one writing
+        the monitor file, until all reactions are finished or failed.
+        '''
+        reactions = [self.run_reaction(index, instance, deleted)
+                     for index, instance in enumerate(self.species.reac_inst)]
+        await asyncio.gather(self.monitor(), *reactions)
+
+    async def run_reaction(self, index, instance, deleted):
+        '''
+        Advance one reaction through its stages. Between two steps the
+        coroutine sleeps until one of the jobs the reaction found running
+        finishes, so idle reactions cost nothing. If no job was running,
+        but nothing happened either, it is checked again in a second.
+        '''
+        instance_name = self.species.reac_obj[index].instance_name
+        stage_start = time.time()
+        while 1:
+            before = (self.species.reac_ts_done[index], self.species.reac_step[index])
+            self.qc.running_jobs = set()
+            self.qc.owner = instance_name
+            self.advance(index, instance)
+            if self.species.reac_step[index] != before[1]:
+                self.step_rows[index] = self.qc.db_cache.count(instance_name)
+            running = self.qc.running_jobs
+            self.qc.running_jobs = None
+            self.qc.owner = None
+            if self.species.reac_ts_done[index] != before[0]:
+                profiler.event('stage', reaction=instance_name, stage=before[0],
+                               duration=time.time() - stage_start)
+                stage_start = time.time()
+            if self.species.reac_ts_done[index] < 0:
+                if self.species.reac_ts_done[index] == -999:
+                    # cancel the jobs only this reaction needed
+                    self.qc.release(instance_name)
+                    self.release_products(index)
+                    self.delete_reaction_files(index, deleted)
+                return
+            if len(running) > 0:
+                await self.qc.wait_for_jobs_async(running)
+            elif before == (self.species.reac_ts_done[index], self.species.reac_step[index]):
+                await asyncio.sleep(1)
+            else:
+                await asyncio.sleep(0)
+
+    async def monitor(self):
+        '''
+        Write a small summary every second while running, and submit
+        the deferred jobs for which there are free slots.
+        '''
+        while 1:
+            self.qc.dispatcher.drain()
+            self.write_monitor()
+            if self.par['restart_snapshot']:
+                self.write_snapshot()
+            if not any(done >= 0 for done in self.species.reac_ts_done):
+                return
+            await asyncio.sleep(1)
+
+    def write_monitor(self):
+        # write a small summary while running
+        with open('kinbot_monitor.out', 'w') as f_out:
+            for index, instance in enumerate(self.species.reac_inst):
+                if self.species.reac_ts_done[index] == -1:
+                    prodstring = []
+                    for pp in self.species.reac_obj[index].products:
+                        prodstring.append(str(pp.chemid))
+                    f_out.write('{}\t{}\t{}\t{}\n'.format(self.species.reac_ts_done[index], 
+                                                          self.species.reac_step[index], 
+                                                          self.species.reac_obj[index].instance_name,
+                                                          ' '.join(prodstring)))
+                else:
+                    f_out.write('{}\t{}\t{}\n'.format(self.species.reac_ts_done[index], 
+                                                      self.species.reac_step[index], 
+                                                      self.species.reac_obj[index].instance_name))
+
+    def log_signature(self, job):
+        '''
+        Size and modification time of the log file of the job, None if it does not exist.
+        '''
+        try:
+            stat = os.stat(self.qc.log_file(job))
+        except OSError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def write_snapshot(self):
+        '''
+        Save the progress of each reaction, keyed by the instance name.
+        The TS search is saved at its current step, with the queue id of its
+        job and the number of database rows of the job when the step was
+        submitted. Reactions beyond the TS
+        search are saved with the signature of the TS log file, and resume
+        from the barrier check, as their later stages are rebuilt quickly
+        from the finished jobs.
+        '''
+        reactions = {}
+        for index, obj in enumerate(self.species.reac_obj):
+            reactions[obj.instance_name] = {
+                'done': int(self.species.reac_ts_done[index]),
+                'step': int(self.species.reac_step[index]),
+                'scan_energy': [float(en) for en in self.species.reac_scan_energy[index]],
+                'log': self.log_signature(obj.instance_name),
+                'job_id': self.qc.job_ids.get(obj.instance_name),
+                'rows': self.step_rows.get(index),
+                }
+        snapshot = {'par': {key: self.par[key] for key in snapshot_par},
+                    'reactions': reactions}
+        with open(f'{self.snapshot_file}.tmp', 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(f'{self.snapshot_file}.tmp', self.snapshot_file)
+
+    def load_snapshot(self):
+        '''
+        Resume the reactions from the snapshot of an earlier run.
+        Reactions whose TS log file changed since the snapshot are started over.
+        A TS search step is only resumed if its job wrote a new row into
+        the database since it was submitted, or if it is still in the queue,
+        otherwise the search is started over.
+        '''
+        if not os.path.exists(self.snapshot_file):
+            return
+        with open(self.snapshot_file) as f:
+            snapshot = json.load(f)
+        par = json.loads(json.dumps({key: self.par[key] for key in snapshot_par}))
+        if snapshot['par'] != par:
+            logger.info('Parameters changed since the last snapshot, it is not used.')
+            return
+        nresume = 0
+        for index, obj in enumerate(self.species.reac_obj):
+            saved = snapshot['reactions'].get(obj.instance_name)
+            if saved is None or self.species.reac_type[index] == 'hom_sci':
+                continue
+            if saved['done'] == 0:
+                if saved['step'] == 0:
+                    continue
+                # the log file of the previous step looks finished,
+                # so it cannot tell if the job of this step ever ran
+                written = saved.get('rows') is not None \
+                    and self.qc.db_cache.count(obj.instance_name) > saved['rows']
+                queued = self.qc.queue_status.is_queued(saved.get('job_id'))
+                if not written and not queued:
+                    continue
+                if queued:
+                    self.qc.job_ids[obj.instance_name] = saved['job_id']
+                self.step_rows[index] = saved.get('rows')
+                self.species.reac_step[index] = saved['step']
+                self.species.reac_scan_energy[index] = saved['scan_energy']
+            elif saved['log'] is None or saved['log'] != self.log_signature(obj.instance_name):
+                continue
+            elif saved['done'] == -999:
+                self.species.reac_ts_done[index] = -999
+            else:
+                self.species.reac_ts_done[index] = 1
+                self.species.reac_step[index] = saved['step']
+            nresume += 1
+        logger.info(f'Resumed {nresume} reactions from {self.snapshot_file}.')
+
+    def advance(self, index, instance):
+        '''
+        Carry out the next step of the reaction, following the stage in reac_ts_done.
+        '''
+        obj = self.species.reac_obj[index]
+        if obj.instance_name in self.par['skip_reactions'] \
+                and self.species.reac_ts_done[index] != -999:
+            logger.info(f'\tRemoving reaction {obj.instance_name}.')
+            self.species.reac_ts_done[index] = -999
+        # START REACTION SEARCH
+        if self.species.reac_ts_done[index] == 0 and self.species.reac_step[index] == 0:
+            # verify after restart if search has failed in previous kinbot run
+            status = self.qc.check_qc(obj.instance_name)
+            if status == 'error':
+                logger.info('\tRxn search failed for {}'
+                             .format(obj.instance_name))
+                self.species.reac_ts_done[index] = -999
+        if self.species.reac_type[index] == 'hom_sci' and self.species.reac_ts_done[index] == 0:  # no matter what, set to 2
+            # somewhat messy manipulation to force the new bond matrix for hom_sci
+            obj.irc_prod = StationaryPoint(f'{instance}_prod', self.species.charge, self.species.mult,
+                                           atom=self.species.atom, geom=self.species.geom, wellorts=0)
+            obj.irc_prod.characterize()
+            obj.irc_prod.bonds[0][obj.instance[0]][obj.instance[1]] = 0  # delete bond
+            obj.irc_prod.bonds[0][obj.instance[1]][obj.instance[0]] = 0  # delete bond
+            obj.irc_prod.bond[obj.instance[0]][obj.instance[1]] = 0  # delete bond
+            obj.irc_prod.bond[obj.instance[1]][obj.instance[0]] = 0  # delete bond
+            self.species.reac_ts_done[index] = 2
+
+        if self.species.reac_ts_done[index] == 0:  # ts search is ongoing
+            if obj.scan == 0:  # don't do a scan of a bond
+                if self.species.reac_step[index] == obj.max_step + 1:
+                    status, freq = self.qc.get_qc_freq(obj.instance_name, self.species.natom)
+                    if status == 0 and (np.count_nonzero(np.array(freq) < 0) >= 3  # Three or more imag frequencies
+                                        or np.count_nonzero(np.array(freq) < -1 * self.par['imagfreq_threshold']) >= 2  # More than one imaginary frequency beyond the threshold
+                                        or np.count_nonzero(np.array(freq) < 0) == 0):  # No imaginary frequencies
+                        logger.info(f'\tReaction search failed for {obj.instance_name}: '
+                                    'Wrong number of imaginary frequencies.')
+                        self.species.reac_ts_done[index] = -999
+                    elif status == 0:
+                        self.species.reac_ts_done[index] = 1
+                    elif status == -1: 
+                        logger.info(f'\tReaction search failed for {obj.instance_name}.')
+                        self.species.reac_ts_done[index] = -999
+                else:
+                    self.species.reac_step[index] = reac_family.carry_out_reaction(
+                                                    obj, self.species.reac_step[index], self.par['qc_command'],
+                                                    bimol=self.par['bimol'])
+                    if self.species.reac_step[index] == -1:
+                        self.species.reac_ts_done[index] = -999
+                        logger.info(f'\tReaction search failed for {obj.instance_name}: '
+                                    'Invalid geometry.')
+
+            elif obj.scan == 1:  # do a bond scan 
+
+                if (self.species.reac_step[index] == self.par['scan_step'] + 1):
+                    status, freq = self.qc.get_qc_freq(obj.instance_name, self.species.natom)
+                    if status == 0 and (np.count_nonzero(np.array(freq) < 0) >= 3  # More than two imag frequencies
+                                        or np.count_nonzero(np.array(freq) < -1 * self.par['imagfreq_threshold']) >= 2  # More than one imaginary frequency beyond the threshold
+                                        or np.count_nonzero(np.array(freq) < 0) == 0):  # No imaginary frequencies
+                        logger.info(f'\tReaction search failed for {obj.instance_name}: '
+                                    'wrong number of imaginary frequencies.')
+                        self.species.reac_ts_done[index] = -999
+                    elif status == 0:
+                        self.species.reac_ts_done[index] = 1
+                    elif status == -1:
+                        logger.info(f'\tRxn search using scan failed for {obj.instance_name} '
+                                    'in TS optimization stage.')
+                        self.species.reac_ts_done[index] = -999
+                else:  
+                    command = self.par['qc_command']
+                    # First point of the scan
+                    if self.species.reac_step[index] == 0:
+                        self.species.reac_step[index] = reac_family.carry_out_reaction(
+                                                        obj, self.species.reac_step[index], command,
+                                                        bimol=self.par['bimol'])
+                        if self.species.reac_step[index] == -1:
+                            self.species.reac_ts_done[index] = -999
+                            logger.info('\tRxn search failed for {} because of 0 0 0 geometry.'
+                                         .format(obj.instance_name))
+                    # Middle points of the scan
+                    if (self.species.reac_step[index] < self.par['scan_step'] and obj.family_name):
+                        status = self.qc.check_qc(obj.instance_name)
+                        if status == 'error':
+                            logger.info('\tRxn search using scan failed for {} in step {}'
+                                         .format(obj.instance_name, self.species.reac_step[index]))
+                            self.species.reac_ts_done[index] = -999
+                        else:
+                            err, energy = self.qc.get_qc_energy(obj.instance_name)
+                            if err == 0:
+                                self.species.reac_scan_energy[index].append(energy)
+                                logger.debug(f'Scan energy for {obj.instance_name} in step {self.species.reac_step[index]}:')
+                                logger.debug(f'{self.species.reac_scan_energy[index][-1]} Hartree.')
+                                # need at least 3 points for a maximum
+                                if len(self.species.reac_scan_energy[index]) >= 3:
+                                    ediff = np.diff(self.species.reac_scan_energy[index])
+                                    if ediff[-1] < 0 and ediff[-2] > 0:  # max
+                                        logger.info(f'\tMaximum found for {obj.instance_name}.')
+                                        e_in_kcal = [constants.AUtoKCAL * (self.species.reac_scan_energy[index][ii] - 
+                                                       self.species.reac_scan_energy[index][0])
+                                                       for ii in range(len(self.species.reac_scan_energy[index]))]
+                                        e_in_kcal = np.round(e_in_kcal, 2)
+                                        logger.info(f'\tEnergies: {e_in_kcal}')
+                                        logger.debug(f'Derivatives: {ediff}')
+                                        self.species.reac_step[index] = self.par['scan_step']  # ending the scan
+                                    if len(ediff) >= 3:
+                                        if any([edf == 0 for edf in ediff[-2:]]):
+                                            logger.warning(f'Calculation failed in the bond scan of {obj.instance_name}.')
+                                            self.species.reac_ts_done[index] = -999
+                                            return
+                                        if 10. * (ediff[-3] / ediff[-2]) < (ediff[-2] / ediff[-1]):  # sudden change in slope
+                                            logger.info(f'\tSudden change in slope for {obj.instance_name}.')
+                                            logger.info(f'\tRelative energies (kcal/mol): {self.species.reac_scan_energy[index]}')
+                                            logger.debug(f'Derivatives: {ediff}')
+                                            self.species.reac_step[index] = self.par['scan_step']  # ending the scan
+                             
+                                # scan continues, and if reached scan_step, then goes for full optimization
+                                self.species.reac_step[index] = reac_family.carry_out_reaction(
+                                                                obj, self.species.reac_step[index], command,
+                                                                bimol=self.par['bimol'])
+                                if self.species.reac_step[index] == -1:
+                                    self.species.reac_ts_done[index] = -999
+                                    logger.info('\tRxn search failed for {} because of 0 0 0 geometry.'
+                                                 .format(obj.instance_name))
+                    else:  # the last step was reached, and no max or inflection was found
+                        status = self.qc.check_qc(obj.instance_name)
+                        if status == 'running':
+                            return
+                        logger.info('\tRxn search using scan failed for {}, no saddle guess found.'
+                                    .format(obj.instance_name))
+                        db = connect('{}/kinbot.db'.format(os.getcwd()))
+                        # error line, H atom is just placeholder
+                        db.write(Atoms('H'), name=obj.instance_name, data={'status': 'error'})
+                        # this is copied here so that a non-AM1 file is in place
+                        shutil.copy(f'{os.getcwd()}/{self.species.chemid}_well.log', f'{os.getcwd()}/{obj.instance_name}.log')
+                        self.species.reac_ts_done[index] = -999
+
+        elif self.species.reac_ts_done[index] == 1:
+            status = self.qc.check_qc(obj.instance_name)
+            if status == 'running':
+                return
+            elif status == 'error':
+                logger.info('\tRxn search failed (gaussian error) for {}'
+                             .format(obj.instance_name))
+                self.species.reac_ts_done[index] = -999
+            else:
+                # check the barrier height:
+                ts_energy = self.qc.get_qc_energy(obj.instance_name)[1]
+                ts_zpe = self.qc.get_qc_zpe(obj.instance_name, wait=0)[1]
+                if self.species.reac_type[index] == 'R_Addition_MultipleBond' \
+                        and self.qc.qc != 'nn_pes':
+                    ending = 'well_mp2'
+                    thresh = self.par['barrier_threshold']  # need to fix for mp2 specific
+                elif self.species.reac_type[index] == 'barrierless_saddle' \
+                        and self.qc.qc != 'nn_pes':
+                    ending = 'well_bls'
+                    thresh = self.par['barrier_threshold']
+                else:
+                    ending = 'well'
+                    thresh = self.par['barrier_threshold']
+                err, sp_energy = self.qc.get_qc_energy('{}_{}'.format(str(self.species.chemid), ending))
+                if err == 1:  # reactant is still running, check again later
+                    return
+                sp_zpe = self.qc.get_qc_zpe('{}_{}'.format(str(self.species.chemid), ending), wait=0)[1]
+                try:
+                    barrier = (ts_energy + ts_zpe - sp_energy - sp_zpe) * constants.AUtoKCAL
+                except TypeError:
+                    logger.error(f'Faulty calculations, check or delete files for {obj.instance_name}.')
+                    sys.exit(-1)
+                self.qc.dispatcher.set_barrier(obj.instance_name, barrier)
+                if barrier > thresh:
+                    logger.info('\tRxn barrier too high ({0:.2f} kcal/mol) at L1 for {1}'
+                                 .format(barrier, obj.instance_name))
+                    self.species.reac_ts_done[index] = -999
+                else:
+                    obj.irc = IRC(obj, self.par)  
+                    irc_status = obj.irc.check_irc()
+                    if 0 in irc_status:
+                        logger.info('\tRxn barrier is ({0:.2f} kcal/mol) at L1 for {1}'
+                                     .format(barrier, obj.instance_name))
+                        # No IRC started yet, start the IRC now
+                        logger.info('\tStarting IRC calculations for {}'
+                                     .format(obj.instance_name))
+                        obj.irc.do_irc_calculations()
+                    elif irc_status[0] == 'running' or irc_status[1] == 'running':
+                        return
+                    else:
+                        # IRC's have successfully finished, have an error, in any case
+                        # read the geometries and try to make products out of them
+                        # verify which of the ircs leads back to the reactant, if any
+                        logger.info('\tRxn barrier is {0:.2f} kcal/mol for {1}'
+                                     .format(barrier, obj.instance_name))
+                        obj.irc_prod = obj.irc.irc2stationary_pt()
+                        if obj.irc_prod == 0:
+                            logger.info('\tNo product found for {}'.format(obj.instance_name))
+                            self.species.reac_ts_done[index] = -999
+                        else:
+                            self.species.reac_ts_done[index] = 2
+
+        elif self.species.reac_ts_done[index] == 2:
+            # obj.valid_prod: list marking fragments for deletion (if breaks apart or changes)
+            # self.frag_unique: unique fragments across all reactions for this well, by chemid
+            # obj.products: list of products for given reaction, which includes changes and further dissociation 
+            if obj.prod_done == 0:  # not started optimization yet
+                # identify bimolecular products and wells from IRC - do it once
+                obj.products, _ = obj.irc_prod.start_multi_molecular(vary_charge=True)
+                if self.species.charge == 0:
+                    logger.info(f'\tBased on the end of IRC, reaction {obj.instance_name} leads to products '
+                                f'{[fr.chemid for fr in obj.products]}')
+                else:
+                    logger.info(f'\tBased on the end of IRC, reaction {obj.instance_name} leads to products '
+                                f'{[fr.chemid for fr in obj.products]} (including all possible charge distributions)')
+
+                self.equate_identical(obj.products)
+                obj.valid_prod = len(obj.products) * [True]
+
+                # make the geom of products in self.frag_unique the one from the multi_molecular (not optimized)
+                self.equate_unique(obj.products)
+                obj.prod_done = 1
+
+            for frag in obj.products:
+                self.qc.qc_opt(frag, frag.geom)
+                e, _ = self.qc.get_qc_geom(str(frag.chemid) + '_well', frag.natom) # check if finished without updating geom
+                if e == 1:  # it's running
+                    continue
+
+            # initial fragment calculations finished, reading results...
+            hom_sci_energy = 0
+            products_orig = [copy.copy(opr) for opr in obj.products] 
+            ndone = 0
+            for fragii, frag in enumerate(products_orig):
+                if frag.chemid == self.species.chemid:
+                    logger.info(f'Product in {obj.instance_name} is identical to the reactant. Reaction deleted.')
+                    self.species.reac_ts_done[index] = -999 
+                    break
+                # do not look at already invalid fragments again
+                elif not obj.valid_prod[fragii]:
+                    ndone += 1
+                    continue
+                chemid_orig = frag.chemid
+                e, frag.geom, frag.atom = self.qc.get_qc_geom(
+                    str(frag.chemid) + '_well',
+                    frag.natom,
+                    reorder=True)
+                if e < 0:
+                    logger.info(f'\tProduct optimization failed for {obj.instance_name}, product {frag.chemid}')
+                    self.species.reac_ts_done[index] = -999
+                    ndone += 1
+                elif e == 1:
+                    break
+                else:
+                    ndone += 1
+                    _, frag.energy = self.qc.get_qc_energy(str(frag.chemid) + '_well')
+                    _, frag.zpe = self.qc.get_qc_zpe(str(frag.chemid) + '_well', wait=0)
+                    if self.species.reac_type[index] == 'hom_sci': # TODO energy is the sum of all possible fragments  
+                        hom_sci_energy += frag.energy + frag.zpe
+                    # Reinitialize rads and bonds
+                    frag.reset_order()
+                    # connectivity changed
+                    if chemid_orig != frag.chemid:
+                        for fri, fr in enumerate(obj.products):
+                            if fr.chemid == chemid_orig:
+                                obj.valid_prod[fri] = False
+                        newfrags, _ = frag.start_multi_molecular(vary_charge=True)  
+                        self.equate_identical(newfrags)
+                        self.equate_unique(newfrags)
+                        logger.warning(f'Product {chemid_orig} optimized to {[nf.chemid for nf in newfrags]} '
+                                       f'in reaction {obj.instance_name}')
+                        for nf in newfrags:
+                            obj.products.append(nf)
+                            obj.valid_prod.append(True)
+                    else:
+                        for fri, fr in enumerate(obj.products):
+                            if fr.chemid == chemid_orig:
+                                obj.products[fri].energy = frag.energy
+                                obj.products[fri].zpe = frag.zpe
+                                # Reorder the coordinates of frag in case the atom order is different
+                                if any(obj.products[fri].atom != frag.atom):
+                                    reorder_coord(mol_A=obj.products[fri],
+                                                  mol_B=frag)
+                                obj.products[fri].geom = frag.geom
+
+            if ndone == len(obj.products) and self.species.reac_ts_done[index] != -999:  # all currently recognized fragments are done
+                # delete invalid ones
+                obj.products = list(np.array(obj.products)[obj.valid_prod])
+                if self.species.charge != 0:  # select the lower energy combination
+                    # brute force all combinations for ions
+                    combs = np.array([np.array(i) for i in itertools.product([0, 1], repeat = len(obj.products))])
+                    val = 1000.
+                    ens = np.array([i.energy for i in obj.products])
+                    zpes = np.array([i.zpe for i in obj.products])
+                    masses = np.array([i.mass for i in obj.products])
+                    charges = np.array([i.charge for i in obj.products])
+                    frag_symbols = [p.atom for p in obj.products]
+                    low_e_comb = combs[0]
+                    for comb in combs:
+                        comb_symbols = []
+                        for i, frag_symb in enumerate(frag_symbols):
+                            if comb[i]:
+                                comb_symbols.extend(frag_symb)
+                        if sum(comb * charges) != self.species.charge \
+                                or sum(comb * masses) != self.species.mass \
+                                or sorted(comb_symbols) != sorted(self.species.atom):
+                            continue
+                        rel_energy = constants.AUtoKCAL * (sum(comb * (ens + zpes)) - \
+                                     (self.species.start_energy + self.species.start_zpe))
+                        relev_comb = [p.chemid for i, p in enumerate(obj.products) if comb[i]]
+                        if len(obj.products) > 2:
+                            logger.info(f'\tPossible ion combination and energy for {obj.instance_name} products: '
+                                        f'{", ".join([str(c) for c in relev_comb])} '
+                                        f'at {rel_energy:.1f} kcal/mol.')
+                        if sum(comb * (ens + zpes)) < val:
+                            val = sum(comb * (ens + zpes))
+                            low_e_comb = comb
+                    obj.products = list(np.array(obj.products)[low_e_comb.astype(bool)])
+                obj.irc_fragments = [copy.copy(this_frag) for this_frag in obj.products]
+                prods_energy = sum([p.energy + p.zpe for p in obj.products])
+
+                # Select reactions potentially leading to vdW wells
+                if len(obj.products) == 2 and 'hom_sci' not in obj.instance_name:
+                    logger.info('\tChecking vdW well for {}.'.format(obj.instance_name))
+                    obj.irc_prod.characterize()
+                    e, obj.irc_prod.energy = self.qc.get_qc_energy(f'{obj.irc_prod.name}')  # e is the error code: should be 0 (success) at this point.
+                    e, obj.irc_prod.zpe = self.qc.get_qc_zpe(f'{obj.irc_prod.name}', wait=0)
+                    e, obj.irc_prod.geom = self.qc.get_qc_geom(obj.irc_prod.name, obj.irc_prod.natom)
+                    e, obj.irc_prod.freq = self.qc.get_qc_freq(obj.irc_prod.name, obj.irc_prod.natom) 
+                    for this_frag in obj.irc_fragments:
+                        e, this_frag.freq = self.qc.get_qc_freq(f'{this_frag.name}_well', this_frag.natom) 
+                    fragments_energies = sum([(this_frag.energy + this_frag.zpe) for this_frag in obj.irc_fragments ])
+                    obj.vdW_depth = (fragments_energies - (obj.irc_prod.energy + obj.irc_prod.zpe)) * constants.AUtoKCAL
+                    if obj.vdW_depth > self.par['vdW_detection']:
+                        logger.info(f'\tvdW well detected for {obj.irc_prod.name}. Depth: {np.round(obj.vdW_depth, 2)} kcal/mol.')
+                        obj.do_vdW = True
+                    else:
+                        logger.info(f'\t{obj.irc_prod.name} was not succesfully identified as a vdW well. Well depth is {np.round(obj.vdW_depth, 2)} kcal/mol.')
+                    
+                if self.species.reac_type[index] == 'hom_sci': # TODO energy is the sum of all possible fragments
+                    hom_sci_energy = (prods_energy - self.species.start_energy - self.species.start_zpe) * constants.AUtoKCAL
+                    if hom_sci_energy < self.par['barrier_threshold'] + self.par['hom_sci_threshold_add']:
+                        self.species.reac_ts_done[index] = 3
+                    else:
+                        logger.info(f'\thom_sci energy is too high at {np.round(hom_sci_energy, 2)} kcal/mol for {obj.instance_name}')
+                        self.species.reac_ts_done[index] = -999
+                else:
+                    self.species.reac_ts_done[index] = 3
+
+        elif self.species.reac_ts_done[index] == 3:
+            for frag in obj.products:
+                # # Reordering in case different fragment
+                e, frag.geom, frag.atom = self.qc.get_qc_geom(
+                    str(frag.chemid) + '_well',
+                    frag.natom,
+                    reorder=True)
+                # Create a new stp instead of updating geom and atom
+                # because rads and bonds need to be changed
+                frag.reset_order()
+                # e, frag.geom = self.qc.get_qc_geom(str(frag.chemid) + '_well', frag.natom)
+
+            # Do the TS and product optimization
+            # make a stationary point object of the ts
+            bond_mx = np.zeros((self.species.natom, self.species.natom), dtype=int)
+            for i in range(self.species.natom):
+                for j in range(self.species.natom):
+                    bond_mx[i][j] = max(self.species.bond[i][j], obj.irc_prod.bonds[0][i][j])
+
+            if self.species.reac_type[index] != 'hom_sci':
+                err, geom = self.qc.get_qc_geom(obj.instance_name, self.species.natom)
+                ts = StationaryPoint(obj.instance_name, self.species.charge, self.species.mult,
+                                     atom=self.species.atom, geom=geom, wellorts=1)
+                err, ts.energy = self.qc.get_qc_energy(obj.instance_name)
+                err, ts.zpe = self.qc.get_qc_zpe(obj.instance_name, wait=0)
+                err, ts.freq = self.qc.get_qc_freq(obj.instance_name, self.species.natom)
+                ts.distance_mx()
+                ts.bond_mx()
+                ts.bond = np.maximum(ts.bond, bond_mx)
+                # -1: broken, 0: no change, +1: formed
+                ts.reac_bond = np.array(obj.irc_prod.bond01) - np.array(self.species.bond01) 
+                ts.find_cycle()
+                ts.find_conf_dihedral()
+                obj.ts = ts
+                # do the ts optimization
+                obj.ts_opt = Optimize(obj.ts, self.par, self.qc)
+                obj.ts_opt.do_optimization()
+            else:
+                obj.ts = copy.copy(obj.species)  # the TS will be for now the species itself
+                obj.ts.wellorts = 1
+
+            # do the vdW optimizations
+            if obj.do_vdW:
+                # do the high level optimization if requested
+                obj.irc_prod_opt = Optimize(obj.irc_prod, self.par, self.qc, just_high=True)
+                obj.irc_prod_opt.do_optimization()
+                if obj.irc_prod_opt.shigh == -999: 
+                    logger.info('\tVdW search failed for {}, prod_opt shigh fail for {}.'
+                                    .format(obj.irc_prod.name, obj.irc_prod.chemid))
+                    obj.do_vdW = False
+                # non-conformationally optimized fragments high-level qc to be added here if we want to
+                                          
+            # do the products optimizations
+            temp_prod_opt = []  # holding the optimization objects temporarily
+            for st_pt in obj.products:
+                # do the products optimizations
+                # check for products of other reactions that are the same as this product
+                # in the case such products are found, use the same Optimize object for both
+                prod_opt = self.prod_opt_unique.get(st_pt.chemid)
+                if prod_opt is None:
+                    prod_opt = Optimize(st_pt, self.par, self.qc)
+                    self.optimize_product(prod_opt)
+                    if prod_opt.shigh == -999:
+                        logger.info('\tRxn search failed for {}, prod_opt shigh fail for {}.'
+                                     .format(obj.instance_name, prod_opt.species.chemid))
+                        self.species.reac_ts_done[index] = -999
+                        #break  # breaks so that other species is not looked at
+                temp_prod_opt.append(prod_opt)
+            if self.species.reac_ts_done[index] != -999:
+                for tpo in temp_prod_opt:
+                    obj.prod_opt.append(tpo)
+                    self.prod_opt_unique.setdefault(tpo.species.chemid, tpo)
+            else:
+                # the new optimizations are not shared with anyone yet
+                for tpo in temp_prod_opt:
+                    if self.prod_opt_unique.get(tpo.species.chemid) is not tpo:
+                        self.qc.release(self.product_owner(tpo))
+
+            if self.species.reac_ts_done[index] != -999:  # so we don't reset faulty calculation
+                for st_pt in obj.products:
+                    # section where comparing products in same reaction occurs
+                    if len(obj.prod_opt) > 0:
+                        for j, st_pt_opt in enumerate(obj.prod_opt):
+                            if st_pt.chemid == st_pt_opt.species.chemid:
+                                if len(obj.prod_opt) > j:
+                                    prod_opt = obj.prod_opt[j]
+                                    break
+
+                self.species.reac_ts_done[index] = 4
+
+        elif self.species.reac_ts_done[index] == 4:
+            # check up on the TS and product optimizations
+            opts_done = 1
+            fails = 0
+            # check if ts and vdW are done
+            if self.species.reac_type[index] != 'hom_sci':
+                if not obj.ts_opt.shir == 1:  # last stage in optimize
+                    opts_done = 0
+                    obj.ts_opt.do_optimization()
+                if obj.ts_opt.shigh == -999:
+                    logger.warning('Reaction {} ts_opt_shigh failure'.format(obj.instance_name))
+                    fails = 1
+                if obj.do_vdW:
+                    if obj.irc_prod_opt.shigh == -999:
+                        logger.warning('High level vdW well optimization of {} failed'.format(obj.irc_prod.name))
+                        obj.do_vdW = False
+                    if not obj.irc_prod_opt.shigh == 1:
+                        opts_done = 0
+                        obj.irc_prod_opt.do_optimization()
+            for pr_opt in obj.prod_opt:
+                if not pr_opt.shir == 1:
+                    opts_done = 0
+                    self.optimize_product(pr_opt)
+                if pr_opt.shigh == -999:
+                    logger.warning('Reaction {} pr_opt_shigh failure'.format(obj.instance_name))
+                    fails = 1
+                continue
+                    
+            if fails:
+                self.species.reac_ts_done[index] = -999
+            elif opts_done:
+                self.species.reac_ts_done[index] = 5
+
+        elif self.species.reac_ts_done[index] == 5:
+            # Finilize the calculations
+            st_pt = obj.prod_opt[0].species
+            # kill reaction if higher than L2 threshold
+            if self.par['barrier_threshold_L2'] and self.par['high_level'] and 'hom_sci' not in obj.instance_name:
+                # check the barrier height again at L2 if requested
+                err, ts_energy = self.qc.get_qc_energy(f'{obj.instance_name}_high')
+                if err == 1:
+                    return
+                ts_zpe = self.qc.get_qc_zpe(f'{obj.instance_name}_high', wait=0)[1]
+                valid = (ts_energy + ts_zpe - self.species.energy - self.species.zpe) * constants.AUtoKCAL - self.par['barrier_threshold_L2']
+                if  valid > 0. :
+                    logger.info(f'\t{obj.instance_name} is higher than the L2 threshold by {np.round(valid, 2)} kcal/mol, reaction is deleted.')
+                    self.species.reac_ts_done[index] = -999
+                    return
+            # continue to PES search in case a new well was found
+            if self.par['pes']:
+                # verify if product is monomolecular, and if it is new
+                if len(obj.products) == 1:
+                    st_pt = obj.prod_opt[0].species
+                    chemid = st_pt.chemid
+                    # if high level was requested, it is L2, otherwise L1
+                    rel_en = (st_pt.energy + st_pt.zpe - self.species.energy - self.species.zpe) * constants.AUtoKCAL 
+                    logger.info(f'\tProduct {obj.instance_name} energy is {np.round(rel_en, 2)} kcal/mol.')
+                    if self.par['barrier_threshold_L2'] and self.par['high_level']:
+                        new_barrier_threshold = None
+                        new_barrier_threshold_L2 = self.par['barrier_threshold_L2'] - rel_en 
+                    else:
+                        new_barrier_threshold = self.par['barrier_threshold'] - rel_en 
+                        new_barrier_threshold_L2 = None
+                    dirwell = os.path.dirname(os.getcwd())
+                    jobs = open(dirwell + '/chemids', 'r').read().split('\n')
+                    jobs = [ji for ji in jobs]
+                    if not str(chemid) in jobs:
+                        # this well is new, add it to the jobs
+                        while 1:
+                            try:
+                                # try to open the file and write to it
+                                logger.info(f'\tLaunching new KinBot as {chemid}')
+                                pes.write_input(self.inp, obj.products[0], new_barrier_threshold, new_barrier_threshold_L2, dirwell, self.par['me'])
+                                with open(dirwell + '/chemids', 'a') as f:
+                                    f.write('{}\n'.format(chemid))
+                                break
+                            except IOError:
+                                # wait a second and try again
+                                time.sleep(1)
+                                pass
+
+            # check for wrong number of negative frequencies
+            neg_freq = 0
+            for st_pt in obj.products:
+                if len(st_pt.reduced_freqs):
+                    if -1 * self.par['imagfreq_threshold'] <= st_pt.reduced_freqs[0] <= 0.:
+                        logger.warning(f'Found negative frequency {st_pt.reduced_freqs[0]} cm-1 for a product of {obj.instance_name}. Flipped.')
+                        st_pt.reduced_freqs[0] *= -1.
+                    elif st_pt.reduced_freqs[0] < -1 * self.par['imagfreq_threshold']:
+                        logger.warning(f'Found negative frequency {st_pt.reduced_freqs[0]} cm-1 for a product of {obj.instance_name}.')
+                        self.species.reac_ts_done[index] = -999
+                        neg_freq = 1
+            if any([fi < 0. for fi in obj.ts.reduced_freqs[1:]]):
+                logger.warning('Found more than one negative frequency for ' + obj.instance_name)
+                logger.warning(obj.ts.reduced_freqs)
+                self.species.reac_ts_done[index] = -999
+                neg_freq = 1
+                
+            if not neg_freq:
+                # the reaction search is finished
+                self.species.reac_ts_done[index] = -1  # this is the success code
+
+                # write a temporary pes input file
+                # remove old xval and im_extent files
+                if os.path.exists('{}_xval.txt'.format(self.species.chemid)):
+                    os.remove('{}_xval.txt'.format(self.species.chemid))
+                if os.path.exists('{}_im_extent.txt'.format(self.species.chemid)):
+                    os.remove('{}_im_extent.txt'.format(self.species.chemid))
+                postprocess.createPESViewerInput(self.species, self.qc, self.par)
+
+
+    def delete_reaction_files(self, index, deleted):
+        if self.par['delete_intermediate_files'] == 1:
+            if not self.species.reac_obj[index].instance_name in deleted:
+                self.delete_files(self.species.reac_obj[index].instance_name)
+                deleted.append(self.species.reac_obj[index].instance_name)
+
     def delete_files(self, name):
         # job names
         names = []
@@ -761,6 +915,41 @@ class ReactionGenerator:
             stereochem = ''
         return stereochem
 
+    def product_owner(self, prod_opt):
+        '''
+        The owner of the jobs of a product optimization.
+        '''
+        return ('product', prod_opt.species.chemid)
+
+    def optimize_product(self, prod_opt):
+        '''
+        Advance the optimization of a product. Its jobs are owned by the product
+        and not by the reaction, as all reactions leading to it share them.
+        '''
+        owner = self.qc.owner
+        self.qc.owner = self.product_owner(prod_opt)
+        try:
+            prod_opt.do_optimization()
+        finally:
+            self.qc.owner = owner
+
+    def release_products(self, index):
+        '''
+        Drop the product optimizations of a deleted reaction from prod_opt_unique,
+        unless another reaction in progress or finished still uses them.
+        Their jobs are released then.
+        '''
+        for prod_opt in self.species.reac_obj[index].prod_opt:
+            used = any(prod_opt in obj_i.prod_opt
+                       for i, obj_i in enumerate(self.species.reac_obj)
+                       if i != index and (self.species.reac_ts_done[i] > 2
+                                          or self.species.reac_ts_done[i] == -1))
+            if used:
+                continue
+            if self.prod_opt_unique.get(prod_opt.species.chemid) is prod_opt:
+                del self.prod_opt_unique[prod_opt.species.chemid]
+            self.qc.release(self.product_owner(prod_opt))
+
     def equate_identical(self, frag):
         ''' Make identical fragments for a given reaction be exactly the same
         '''
@@ -770,19 +959,9 @@ class ReactionGenerator:
                     frag[jj] = frag[ii]
         return
 
-    def equate_unique(self, fragments, frag_unique):
+    def equate_unique(self, fragments):
         '''Make identical fragments across reactions be exatly the same
         '''
         for fi, frag in enumerate(fragments):
-            if len(frag_unique) == 0:
-                frag_unique.append(frag)
-            elif len(frag_unique) > 0:
-                new = 1
-                for fragu in frag_unique:  
-                    if frag.chemid == fragu.chemid:
-                        fragments[fi] = fragu
-                        new = 0
-                        break
-                if new:
-                    frag_unique.append(frag)
+            fragments[fi] = self.frag_unique.setdefault(frag.chemid, frag)
         return
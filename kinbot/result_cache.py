@@ -0,0 +1,79 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+
+import numpy as np
+from ase.db import connect
+
+logger = logging.getLogger('KinBot')
+
+# these arguments only name the files or set the resources of a job
+job_specific_kwargs = ['chk', 'label', 'nprocshared', 'mem', 'server']
+# files of a job that are kept in the cache next to its database row
+extensions = ['log', 'out', 'fchk', 'chk']
+
+
+class ResultCache:
+    """
+    Cache of finished calculations, shared by the wells of a PES run.
+    A calculation is identified by the hash of everything that decides its
+    outcome: the atoms in order, their connectivity, the chemid, charge,
+    multiplicity, the kind of the job and all the arguments of the
+    calculator. The rows are kept in result_cache.db, and the output
+    files of the jobs in result_cache/, in the directory of the PES run.
+    """
+    def __init__(self, directory):
+        """
+        directory: the directory shared by all the wells
+        """
+        self.directory = directory
+        self.db = connect(f'{directory}/result_cache.db')
+        self.file_dir = f'{directory}/result_cache'
+        os.makedirs(self.file_dir, exist_ok=True)
+
+    def key(self, species, kind, kwargs):
+        """
+        The hash of the calculation.
+        kind: the type of the job, e.g., the template and the job name suffix
+        """
+        content = {'atom': list(species.atom),
+                   'bond': np.asarray(species.bond).tolist(),
+                   'chemid': str(species.chemid),
+                   'charge': species.charge,
+                   'mult': species.mult,
+                   'kind': kind,
+                   'kwargs': {k: v for k, v in kwargs.items() if k not in job_specific_kwargs},
+                   }
+        content = json.dumps(content, sort_keys=True, default=str)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def fetch(self, key, job, db):
+        """
+        Copy the cached result into the database of the well as the result
+        of the job, together with its output files.
+        Returns True if the calculation was in the cache.
+        """
+        rows = list(self.db.select(result_key=key))
+        if len(rows) == 0:
+            return False
+        row = rows[-1]
+        for ext in extensions:
+            if os.path.exists(f'{self.file_dir}/{key}.{ext}'):
+                shutil.copyfile(f'{self.file_dir}/{key}.{ext}', f'{job}.{ext}')
+        db.write(row.toatoms(), name=job, data=row.data)
+        logger.debug(f'Result of {job} is taken from the result cache.')
+        return True
+
+    def store(self, key, job, row):
+        """
+        Add the last row of a finished job and its output files to the cache.
+        """
+        if self.db.count(result_key=key) > 0:
+            return
+        for ext in extensions:
+            if os.path.exists(f'{job}.{ext}'):
+                shutil.copyfile(f'{job}.{ext}', f'{self.file_dir}/{key}.{ext}')
+        self.db.write(row.toatoms(), result_key=key, data=row.data)
+        logger.debug(f'Result of {job} is added to the result cache.')
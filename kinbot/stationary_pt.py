@@ -10,6 +10,7 @@ from kinbot import cheminfo
 from kinbot import constants
 from kinbot import find_motif
 from kinbot import geometry
+from kinbot.profiling import profiler
 
 logger = logging.getLogger('KinBot')
 
@@ -173,6 +174,7 @@ class StationaryPoint:
             self.atom = self.structure[:, 0]
             self.geom = self.structure[:, 1:4].astype(float)
 
+    @profiler.timed('characterize')
     def characterize(self, bond_mx=None):
         """
         With one call undertake a typical set of structural characterizations.
@@ -1,11 +1,11 @@
 from ase import Atoms
-from ase.db import connect
+from kinbot.db_shards import connect_db
 
 from kinbot.ase_modules.calculators.gaussian import Gaussian
 from kinbot import reader_gauss
 from kinbot.utils import iowait
 
-db = connect('{working_dir}/kinbot.db')
+db = connect_db('{working_dir}')
 label = '{label}'
 logfile = '{label}.log'
 
@@ -1,6 +1,6 @@
 import numpy as np
 from ase import Atoms
-from ase.db import connect
+from kinbot.db_shards import connect_db
 import time
 import os
 import copy
@@ -13,7 +13,7 @@ from kinbot import geometry
 from kinbot import zmatrix
 import rmsd
 
-db = connect('{working_dir}/kinbot.db')
+db = connect_db('{working_dir}')
 label = '{label}'
 logfile = '{label}.log'
 
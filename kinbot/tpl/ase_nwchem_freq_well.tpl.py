@@ -17,7 +17,7 @@ import ase
 from ase import Atoms
 from ase.calculators.nwchem import NWChem
 from ase.vibrations import Vibrations
-from ase.db import connect
+from kinbot.db_shards import connect_db
 from ase.io import read
 
 
@@ -65,10 +65,10 @@ try:
             zpe = float(line.split()[8])
             break  
 
-    db = connect('kinbot.db')
+    db = connect_db('.')
     db.write(mol,name = label,data={{'energy': e, 'frequencies': np.asarray(freq), 'zpe':zpe, 'status' : 'normal'}})
 except RuntimeError, e: 
-    db = connect('kinbot.db')
+    db = connect_db('.')
     db.write(mol, name = label, data = {{'status' : 'error'}})
 
 
@@ -13,7 +13,7 @@ import re
 import numpy as np
 from ase import Atoms
 from ase.calculators.nwchem import NWChem
-from ase.db import connect
+from kinbot.db_shards import connect_db
 
 label = '{label}'
 kwargs = {kwargs}
@@ -40,7 +40,7 @@ try:
                 geom[n][0:3] = np.array(lines[-index + 3 + n].split()[3:6]).astype(float)
             break
     mol.positions = geom
-    db = connect('kinbot.db')
+    db = connect_db('.')
     db.write(mol, name=label, data={{'energy': e, 'status': 'normal'}})
 except RuntimeError as e:
     # read the geometry from the output file
@@ -57,10 +57,10 @@ except RuntimeError as e:
             break
     if new_geom:
         mol.positions = geom
-        db = connect('kinbot.db')
+        db = connect_db('.')
         db.write(mol, name=label, data={{'status': 'normal'}})  # although there is an error, continue from the final geometry
     else:
-        db = connect('kinbot.db')
+        db = connect_db('.')
         db.write(mol, name=label, data={{'status': 'error'}})
 
 f = open(label + '.out', 'a')
@@ -16,7 +16,7 @@ import numpy as np
 import ase
 from ase import Atoms
 from ase.calculators.nwchem import NWChem
-from ase.db import connect
+from kinbot.db_shards import connect_db
 
 
 label = '{label}'
@@ -80,10 +80,10 @@ try:
             zpe = float(line.split()[8])
             break  
 
-    db = connect('kinbot.db')
+    db = connect_db('.')
     db.write(mol,name = label,data={{'energy': e, 'frequencies': np.asarray(freq), 'zpe':zpe, 'status' : 'normal'}})
 except RuntimeError, e: 
-    db = connect('kinbot.db')
+    db = connect_db('.')
     db.write(mol, name = label, data = {{'status' : 'error'}})
 
 f = open(label + '.out','a')
@@ -20,7 +20,7 @@ import numpy as np
 import ase
 from ase import Atoms
 from ase.calculators.nwchem import NWChem
-from ase.db import connect
+from kinbot.db_shards import connect_db
 
 
 label = '{label}'
@@ -55,10 +55,10 @@ try:
     #mol.set_calculator(calc)
     #mol.get_potential_energy() # use the NWChem optimizer (task optimize)
     
-    db = connect('kinbot.db')
+    db = connect_db('.')
     db.write(mol, name = label, data = {{'energy':e, 'status' : 'normal'}})
 except RuntimeError, e: 
-    db = connect('kinbot.db')
+    db = connect_db('.')
     db.write(mol, name = label, data = {{'status' : 'error'}})
 
 
@@ -17,7 +17,7 @@ from math import pi
 from ase import Atoms
 from ase.calculators.nwchem import NWChem
 from ase.optimize import BFGS
-from ase.db import connect
+from kinbot.db_shards import connect_db
 from kinbot.ase_modules.constraints import FixInternals
 
 label = '{label}'
@@ -71,11 +71,11 @@ cons.adjust_positions(mol, mol.positions)
 try:
     dyn = BFGS(mol, trajectory='%s.traj' % label)
     dyn.run(fmax=0.05)
-    db = connect('kinbot.db')
+    db = connect_db('.')
     db.write(mol, name=label, data={{'status': 'normal'}})
 except RuntimeError as e:
     print('error')
-    db = connect('kinbot.db')
+    db = connect_db('.')
     db.write(mol, name=label, data={{'status': 'error'}})
 
 """
@@ -91,10 +91,10 @@ try:
                 geom[n][0:3] = np.array(lines[-index+3+n].split()[3:6]).astype(float)
             break
     mol.positions = geom
-    db = connect('kinbot.db')
+    db = connect_db('.')
     db.write(mol, name = label, data = {{'status' : 'normal'}})
 except RuntimeError, e: 
-    db = connect('kinbot.db')
+    db = connect_db('.')
     db.write(mol, name = label, data = {{'status' : 'error'}})
 
 """
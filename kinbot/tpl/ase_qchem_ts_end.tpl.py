@@ -1,12 +1,12 @@
 import numpy as np
 from ase import Atoms
 from ase.calculators.qchem import QChem
-from ase.db import connect
+from kinbot.db_shards import connect_db
 
 from kinbot import reader_qchem
 from kinbot.utils import iowait
 
-db = connect('{working_dir}/kinbot.db')
+db = connect_db('{working_dir}')
 label = '{label}'
 logfile = '{label}.out'
 
@@ -1,13 +1,13 @@
 import os
 
 from ase import Atoms
-from ase.db import connect
+from kinbot.db_shards import connect_db
 
 from sella import Sella, IRC
 
 from kinbot.ase_modules.calculators.{code} import {Code}
 
-db = connect('{working_dir}/kinbot.db')
+db = connect_db('{working_dir}')
 mol = Atoms(symbols={atom}, 
             positions={geom})
 
@@ -4,42 +4,42 @@ import shutil
 
 import numpy as np
 from ase import Atoms
-from ase.db import connect
-from ase.vibrations import Vibrations
+from kinbot.db_shards import connect_db
 from sella import Sella
 
-from kinbot.constants import EVtoHARTREE
+from kinbot.constants import AUtoCM
 from kinbot.ase_modules.calculators.{code} import {Code}
 from kinbot.stationary_pt import StationaryPoint
 from kinbot.frequencies import get_frequencies
+from kinbot.fd_hessian import calc_hessian
 
 def calc_vibrations(mol):
-        mol.calc.label = '{label}_vib'
-        if 'chk' in mol.calc.parameters:
-            del mol.calc.parameters['chk']
-        # Compute frequencies in a separate temporary directory to avoid 
-        # conflicts accessing the cache in parallel calculations.
-        if not os.path.isdir('{label}_vib'):
-            os.mkdir('{label}_vib')
-        init_dir = os.getcwd()
-        os.chdir('{label}_vib')
-        if os.path.isdir('vib'):
-            shutil.rmtree('vib')
-        vib = Vibrations(mol)
-        vib.run()
-        # Use kinbot frequencies to avoid mixing low vib frequencies with 
-        # the values associated with external rotations.
-        _ = vib.get_frequencies()
-        zpe = vib.get_zero_point_energy() * EVtoHARTREE
-        hessian = vib.H / 97.17370087
+        if '{Code}' == 'Nn_surr':
+            # The surrogate provides the Hessian directly.
+            hessian = mol.calc.get_hessian(mol)
+        else:
+            mol.calc.label = '{label}_vib'
+            if 'chk' in mol.calc.parameters:
+                del mol.calc.parameters['chk']
+            # Compute frequencies in a separate temporary directory to avoid 
+            # conflicts between the displaced calculations.
+            if not os.path.isdir('{label}_vib'):
+                os.mkdir('{label}_vib')
+            init_dir = os.getcwd()
+            os.chdir('{label}_vib')
+            hessian = calc_hessian(mol, '{label}_vib', nproc={ppn})
+            os.chdir(init_dir)
+            shutil.rmtree('{label}_vib')
+        hessian = hessian / 97.17370087
         st_pt = StationaryPoint.from_ase_atoms(mol)
         st_pt.characterize()
+        # Use kinbot frequencies to avoid mixing low vib frequencies with 
+        # the values associated with external rotations.
         freqs, _ = get_frequencies(st_pt, hessian, st_pt.geom)
-        os.chdir(init_dir)
-        shutil.rmtree('{label}_vib')
+        zpe = 0.5 * sum([fr for fr in freqs if fr > 0.]) / AUtoCM
         return freqs, zpe, hessian
 
-db = connect('{working_dir}/kinbot.db')
+db = connect_db('{working_dir}')
 mol = Atoms(symbols={atom}, 
             positions={geom})
 
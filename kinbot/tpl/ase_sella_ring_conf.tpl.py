@@ -4,14 +4,14 @@ import shutil
 
 import numpy as np
 from ase import Atoms
-from ase.db import connect
+from kinbot.db_shards import connect_db
 from sella import Sella, Constraints
 
 from kinbot.ase_modules.calculators.{code} import {Code}
 from kinbot.stationary_pt import StationaryPoint
 
 
-db = connect('{working_dir}/kinbot.db')
+db = connect_db('{working_dir}')
 mol = Atoms(symbols={atom}, 
             positions={geom})
 
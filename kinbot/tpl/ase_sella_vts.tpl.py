@@ -4,13 +4,13 @@ import copy
 
 import numpy as np
 from ase import Atoms
-from ase.db import connect
+from kinbot.db_shards import connect_db
 import rmsd
 from sella import Sella, Constraints, Internals
 
 from kinbot.ase_modules.calculators.{code} import {Code}
 
-db = connect('{working_dir}/kinbot.db')
+db = connect_db('{working_dir}')
 label = '{label}'
 logfile = '{label}.log'
 
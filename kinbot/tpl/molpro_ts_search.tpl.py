@@ -1,11 +1,11 @@
 from ase import Atoms
-from ase.db import connect
+from kinbot.db_shards import connect_db
 
 from kinbot.molpro_calculator import Molpro_calc
 from kinbot import reader_molpro
 from kinbot.utils import iowait
 
-db = connect('{working_dir}/kinbot.db')
+db = connect_db('{working_dir}')
 label = '{label}'
 xmlfile = '{label}.xml'
 
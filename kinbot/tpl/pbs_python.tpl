@@ -1,3 +1,4 @@
 cd ${{PBS_O_WORKDIR}}
+[ -f kinbot_profile.jsonl ] && printf '{{"event": "started", "time": %s, "job": "%s"}}\n' $(date +%s.%N) {name} >> kinbot_profile.jsonl
 python {python_file} {arguments}
 
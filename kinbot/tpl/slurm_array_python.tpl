@@ -0,0 +1,3 @@
+jobs=({jobs})
+[ -f kinbot_profile.jsonl ] && printf '{{"event": "started", "time": %s, "job": "%s"}}\n' $(date +%s.%N) ${{jobs[$SLURM_ARRAY_TASK_ID]}} >> kinbot_profile.jsonl
+python ${{jobs[$SLURM_ARRAY_TASK_ID]}}.py
@@ -0,0 +1,144 @@
+###################################################
+##                                               ##
+## This file is part of the KinBot code v2.0     ##
+##                                               ##
+## The contents are covered by the terms of the  ##
+## BSD 3-clause license included in the LICENSE  ##
+## file, found at the root.                      ##
+##                                               ##
+## Copyright 2018 National Technology &          ##
+## Engineering Solutions of Sandia, LLC (NTESS). ##
+## Under the terms of Contract DE-NA0003525 with ##
+## NTESS, the U.S. Government retains certain    ##
+## rights to this software.                      ##
+##                                               ##
+###################################################
+"""
+This class tests the generation of the reactions of the combinatorial family
+
+The pruned generators are compared to filtering all the itertools
+combinations, which is how the reactions were generated before.
+"""
+import itertools
+import unittest
+
+import numpy as np
+
+from kinbot.stationary_pt import StationaryPoint
+from kinbot import bond_combinations
+
+
+def all_product_bonds(bonds, break_valence, rad=-1):
+    """
+    The product bonds by filtering all combinations of the new pairs.
+    """
+    atoms = []
+    for bi in bonds:
+        atoms.extend(bi)
+    if rad > -1:
+        if any(rad in bond for bond in bonds):
+            return []
+        atoms.append(rad)
+    pairs = []
+    for i, at1 in enumerate(atoms[:-1]):
+        for at2 in atoms[i+1:]:
+            if not sorted([at1, at2]) in bonds:
+                pairs.append([at1, at2])
+    prods = []
+    for prod in itertools.combinations(pairs, len(bonds)):
+        prod_atoms = []
+        for pi in prod:
+            prod_atoms.extend(pi)
+        if rad == -1:
+            if sorted(atoms) == sorted(prod_atoms):
+                prods.append(sorted(prod))
+                if break_valence:
+                    for i in range(len(prod)):
+                        prods.append(prod[:i]+prod[i+1:])
+        else:
+            count = 0
+            atom = []
+            for at in atoms:
+                if atoms.count(at) != prod_atoms.count(at):
+                    count += np.abs(atoms.count(at) - prod_atoms.count(at))
+                    atom.append(at)
+            if count == 1 and atom[0] != rad:
+                prods.append(sorted(prod))
+    return prods
+
+
+class TestBondCombinations(unittest.TestCase):
+    def setUp(self):
+        self.par = {'min_bond_break': 2,
+                    'max_bond_break': 3,
+                    'comb_molec': 1,
+                    'comb_rad': 1,
+                    'comb_pi': 1,
+                    'comb_lone': 1,
+                    'break_valence': 1,
+                    }
+
+    def testValenceCombinations(self):
+        """
+        The combinations within the budget, in itertools order.
+        """
+        atoms = [0, 1, 1, 2, 3, 4, 4]
+        pairs = [[at1, at2] for at1, at2 in itertools.combinations(sorted(set(atoms)), 2)]
+        for npair in range(1, 5):
+            budget = {at: atoms.count(at) for at in atoms}
+            found = [list(prod) for prod in bond_combinations.valence_combinations(pairs, npair, budget)]
+            self.assertEqual(budget, {at: atoms.count(at) for at in atoms})
+            expected = []
+            for prod in itertools.combinations(pairs, npair):
+                prod_atoms = [at for pair in prod for at in pair]
+                if all(prod_atoms.count(at) <= atoms.count(at) for at in set(prod_atoms)):
+                    expected.append(list(prod))
+            self.assertEqual(found, expected, msg=npair)
+
+    def testProductBonds(self):
+        """
+        The product bonds of the broken bonds of a molecule, with and
+        without a radical site, are the same as without pruning.
+        """
+        mol = StationaryPoint('well0', 0, 2, smiles='[CH2]CC=O')
+        mol.characterize()
+        bonds = [[i, j] for i in range(mol.natom - 1) for j in range(i + 1, mol.natom)
+                 if mol.bond[i][j] > 0]
+        for break_valence in [0, 1]:
+            self.par['break_valence'] = break_valence
+            for nbonds in [1, 2, 3]:
+                for comb in itertools.combinations(bonds, nbonds):
+                    for rad in [-1, 0, 3]:
+                        found = [list(prod) for prod in bond_combinations.get_product_bonds(comb, self.par, rad=rad)]
+                        expected = [list(prod) for prod in all_product_bonds(comb, break_valence, rad=rad)]
+                        self.assertEqual(found, expected, msg=(comb, rad))
+
+    def testReactionKey(self):
+        """
+        Each reaction of the propyl radical is only kept once, reactions
+        at equivalent atoms are the same, and at different atoms are not.
+        """
+        mol = StationaryPoint('well0', 0, 2, smiles='[CH2]CC')
+        mol.characterize()
+        eqv_class = bond_combinations.equivalence_classes(mol)
+        dist = bond_combinations.distances(mol)
+        # H transfers from the methyl group to the radical site
+        h7 = bond_combinations.reaction_key([[2, 7]], [[0, 7]], eqv_class, dist)
+        h8 = bond_combinations.reaction_key([[2, 8]], [[8, 0]], eqv_class, dist)
+        h5 = bond_combinations.reaction_key([[1, 5]], [[0, 5]], eqv_class, dist)
+        self.assertEqual(h7, h8)
+        self.assertNotEqual(h7, h5)
+
+        reactions = list(bond_combinations.generate_product_bond_matrices(mol, mol.bond, 1, self.par, rad=0))
+        self.assertEqual([(list(map(list, reac)), prod) for reac, prod, _, _ in reactions],
+                         [([[1, 2]], [[1, 0]]),
+                          ([[1, 2]], [[2, 0]]),
+                          ([[1, 5]], [[1, 0]]),
+                          ([[1, 5]], [[5, 0]]),
+                          ([[2, 7]], [[2, 0]]),
+                          ([[2, 7]], [[7, 0]]),
+                          ])
+
+
+if __name__ == "__main__":
+    unittest.main()
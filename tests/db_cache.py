@@ -0,0 +1,89 @@
+###################################################
+##                                               ##
+## This file is part of the KinBot code v2.0     ##
+##                                               ##
+## The contents are covered by the terms of the  ##
+## BSD 3-clause license included in the LICENSE  ##
+## file, found at the root.                      ##
+##                                               ##
+## Copyright 2018 National Technology &          ##
+## Engineering Solutions of Sandia, LLC (NTESS). ##
+## Under the terms of Contract DE-NA0003525 with ##
+## NTESS, the U.S. Government retains certain    ##
+## rights to this software.                      ##
+##                                               ##
+###################################################
+"""
+This class tests the in-memory index of the database
+"""
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from ase import Atoms
+from ase.db import connect
+
+from kinbot.db_cache import DatabaseCache
+
+
+class TestDatabaseCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db = connect(f'{self.dir}/kinbot.db')
+        self.cache = DatabaseCache(self.db)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testMissing(self):
+        self.assertIsNone(self.cache.get('job'))
+        self.assertIsNone(self.cache.get_data('job', 'energy'))
+
+    def testNewRows(self):
+        """
+        Rows written after a lookup are seen by the next one,
+        and the last row of a job is used.
+        """
+        first = Atoms('H2', positions=[[0., 0., 0.], [0., 0., 0.7]])
+        self.db.write(first, name='job', data={'status': 'normal', 'energy': -1.,
+                                               'frequencies': [4000.]})
+        entry = self.cache.get('job')
+        self.assertEqual(entry['status'], 'normal')
+        self.assertEqual(entry['energy'], -1.)
+        self.assertIsNone(entry['prev_positions'])
+        self.assertEqual(list(entry['symbols']), ['H', 'H'])
+
+        second = Atoms('H2', positions=[[0., 0., 0.], [0., 0., 0.8]])
+        self.db.write(second, name='job', data={'status': 'normal', 'energy': -2., 'zpe': 0.01})
+        self.db.write(first, name='other', data={'status': 'error'})
+        entry = self.cache.get('job')
+        self.assertEqual(entry['energy'], -2.)
+        self.assertEqual(entry['zpe'], 0.01)
+        np.testing.assert_allclose(entry['positions'], second.positions)
+        np.testing.assert_allclose(entry['prev_positions'], first.positions)
+        # the frequencies are kept from the earlier rows if not written again
+        self.assertEqual(entry['frequencies'], [4000.])
+        self.assertEqual(self.cache.get('other')['status'], 'error')
+        self.assertEqual(self.cache.count('job'), 2)
+        self.assertEqual(self.cache.count('other'), 1)
+        self.assertEqual(self.cache.count('missing'), 0)
+        self.assertEqual(self.cache.get_data('job', 'energy'), -2.)
+
+    def testRowWithoutData(self):
+        self.db.write(Atoms('H'), name='job')
+        entry = self.cache.get('job')
+        self.assertIsNone(entry['status'])
+        self.assertIsNone(entry['energy'])
+
+    def testOtherConnection(self):
+        """
+        Rows written by the jobs through their own connection are seen.
+        """
+        self.cache.get('job')
+        connect(f'{self.dir}/kinbot.db').write(Atoms('H'), name='job', data={'status': 'normal'})
+        self.assertEqual(self.cache.get('job')['status'], 'normal')
+
+
+if __name__ == "__main__":
+    unittest.main()
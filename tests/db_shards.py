@@ -0,0 +1,90 @@
+###################################################
+##                                               ##
+## This file is part of the KinBot code v2.0     ##
+##                                               ##
+## The contents are covered by the terms of the  ##
+## BSD 3-clause license included in the LICENSE  ##
+## file, found at the root.                      ##
+##                                               ##
+## Copyright 2018 National Technology &          ##
+## Engineering Solutions of Sandia, LLC (NTESS). ##
+## Under the terms of Contract DE-NA0003525 with ##
+## NTESS, the U.S. Government retains certain    ##
+## rights to this software.                      ##
+##                                               ##
+###################################################
+"""
+This class tests the sharded writing of the job results
+"""
+import os
+import glob
+import shutil
+import tempfile
+import unittest
+
+from ase import Atoms
+from ase.db import connect
+
+from kinbot.db_cache import DatabaseCache
+from kinbot.db_shards import ShardWriter, connect_db, merge_shards
+
+
+class TestDatabaseShards(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.shard_dir = f'{self.dir}/shards'
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testConnect(self):
+        """
+        The jobs only write shards if the directory exists.
+        """
+        db = connect_db(self.dir)
+        self.assertNotIsInstance(db, ShardWriter)
+        db.write(Atoms('H'), name='job')
+        self.assertEqual(connect(f'{self.dir}/kinbot.db').count(), 1)
+        os.makedirs(self.shard_dir)
+        self.assertIsInstance(connect_db(self.dir), ShardWriter)
+
+    def testMerge(self):
+        """
+        The rows are merged in the order they were written, with their
+        key-value pairs and data, and the shards are removed.
+        """
+        os.makedirs(self.shard_dir)
+        writer = connect_db(self.dir)
+        for i in range(3):
+            writer.write(Atoms('H'), name='job', data={'energy': float(i)})
+        writer.write(Atoms('H2', positions=[[0., 0., 0.], [0., 0., 0.7]]), name='other',
+                     data={'status': 'normal'})
+        self.assertEqual(len(glob.glob(f'{self.shard_dir}/*.db')), 4)
+        self.assertEqual(len(glob.glob(f'{self.shard_dir}/.*')), 0)
+
+        db = connect(f'{self.dir}/kinbot.db')
+        self.assertEqual(merge_shards(self.shard_dir, db), 4)
+        self.assertEqual(glob.glob(f'{self.shard_dir}/*'), [])
+        rows = list(db.select(sort='id'))
+        self.assertEqual([row.name for row in rows], ['job', 'job', 'job', 'other'])
+        self.assertEqual([row.data.get('energy') for row in rows[:3]], [0., 1., 2.])
+        self.assertEqual(rows[3].natoms, 2)
+        self.assertEqual(merge_shards(self.shard_dir, db), 0)
+
+    def testCache(self):
+        """
+        The cache merges the shards before reading the database.
+        """
+        os.makedirs(self.shard_dir)
+        db = connect(f'{self.dir}/kinbot.db')
+        cache = DatabaseCache(db, shard_dir=self.shard_dir)
+        self.assertIsNone(cache.get('job'))
+        ShardWriter(self.shard_dir).write(Atoms('H'), name='job', data={'status': 'normal', 'energy': -0.5})
+        self.assertEqual(cache.get('job')['energy'], -0.5)
+        ShardWriter(self.shard_dir).write(Atoms('H'), name='job', data={'status': 'error'})
+        self.assertEqual(cache.get('job')['status'], 'error')
+        self.assertEqual(db.count(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
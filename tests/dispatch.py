@@ -0,0 +1,123 @@
+###################################################
+##                                               ##
+## This file is part of the KinBot code v2.0     ##
+##                                               ##
+## The contents are covered by the terms of the  ##
+## BSD 3-clause license included in the LICENSE  ##
+## file, found at the root.                      ##
+##                                               ##
+## Copyright 2018 National Technology &          ##
+## Engineering Solutions of Sandia, LLC (NTESS). ##
+## Under the terms of Contract DE-NA0003525 with ##
+## NTESS, the U.S. Government retains certain    ##
+## rights to this software.                      ##
+##                                               ##
+###################################################
+"""
+This class tests the order in which the waiting jobs are submitted
+"""
+import unittest
+
+from kinbot.dispatch import Dispatcher, job_stage
+
+
+class Queue:
+    """
+    The jobs in the queue, in place of QueueStatus.
+    """
+    def __init__(self):
+        self.jobs = []
+        # all jobs, in the order of submission
+        self.submitted = []
+
+    def njobs(self, force=False):
+        return len(self.jobs)
+
+    def submit(self, job, template_head_file):
+        self.jobs.append(job)
+        self.submitted.append(job)
+
+
+class TestDispatch(unittest.TestCase):
+    def setUp(self):
+        self.queue = Queue()
+        self.dispatcher = Dispatcher(self.queue.submit, self.queue, 1)
+
+    def release(self):
+        """
+        Let the jobs finish one by one, returns the order they were submitted in.
+        """
+        while len(self.dispatcher.pending) > 0:
+            self.queue.jobs.pop()
+            self.dispatcher.drain()
+        return self.queue.submitted
+
+    def testJobStage(self):
+        self.assertEqual(job_stage('intra_H_migration_1_2_IRC_F'), 0)
+        self.assertEqual(job_stage('123456789_well'), 0)
+        self.assertEqual(job_stage('123456789_well_mp2'), 0)
+        self.assertEqual(job_stage('123456789_well_bls'), 0)
+        self.assertEqual(job_stage('123456789_well_high'), 1)
+        self.assertEqual(job_stage('intra_H_migration_1_2_high'), 1)
+        self.assertEqual(job_stage('conf/123456789_well_0001'), 2)
+        self.assertEqual(job_stage('hir/123456789_hir_0_00'), 2)
+        self.assertEqual(job_stage('vrc_tst/123456789_1_2'), 3)
+        self.assertEqual(job_stage('intra_H_migration_1_2'), 4)
+
+    def testUnlimited(self):
+        dispatcher = Dispatcher(self.queue.submit, self.queue, -1)
+        for job in ['a_1', 'b_2', 'c_3']:
+            self.assertTrue(dispatcher.submit(job, 'tpl'))
+        self.assertEqual(self.queue.submitted, ['a_1', 'b_2', 'c_3'])
+
+    def testStage(self):
+        self.assertTrue(self.dispatcher.submit('first_1', 'tpl'))
+        for job in ['search_1', 'conf/prod_well_0001', 'prod_well_high', 'prod_well', 'search_1_IRC_F']:
+            self.assertFalse(self.dispatcher.submit(job, 'tpl'))
+            self.assertTrue(self.dispatcher.is_deferred(job))
+        self.assertEqual(self.release()[-5:],
+                         ['prod_well', 'search_1_IRC_F', 'prod_well_high', 'conf/prod_well_0001', 'search_1'])
+
+    def testBarrier(self):
+        self.dispatcher.submit('first_1', 'tpl')
+        self.dispatcher.set_barrier('rxn_1_2', 20.)
+        self.dispatcher.set_barrier('rxn_3_4', 10.)
+        for job in ['rxn_5_6_high', 'rxn_1_2_high', 'rxn_3_4_high']:
+            self.dispatcher.submit(job, 'tpl')
+        # the barriers known by the time the slots free up count
+        self.dispatcher.set_barrier('rxn_5_6', 5.)
+        self.assertEqual(self.release()[-3:], ['rxn_5_6_high', 'rxn_3_4_high', 'rxn_1_2_high'])
+
+    def testBarrierName(self):
+        self.dispatcher.set_barrier('Korcek_step2_1_2_3', 10.)
+        self.assertEqual(self.dispatcher.barrier('Korcek_step2_1_2_3'), 10.)
+        self.assertEqual(self.dispatcher.barrier('Korcek_step2_1_2_3_IRC_F_prod'), 10.)
+        self.assertEqual(self.dispatcher.barrier('Korcek_step2_1_2_3_high'), 10.)
+        # another reaction, whose name starts with the one above
+        self.assertEqual(self.dispatcher.barrier('Korcek_step2_1_2_3_4'), float('inf'))
+        self.assertEqual(self.dispatcher.barrier('Korcek_step2_1_2_3_4_high'), float('inf'))
+
+    def testCost(self):
+        self.dispatcher.submit('first_1', 'tpl')
+        self.dispatcher.submit('big_1', 'tpl', natom=10)
+        self.dispatcher.submit('mp2_1', 'tpl', jobtype='mp2', natom=5)
+        self.dispatcher.submit('small_1', 'tpl', natom=5)
+        self.dispatcher.submit('am1_1', 'tpl', jobtype='am1', natom=10)
+        self.assertEqual(self.release()[-4:], ['am1_1', 'small_1', 'mp2_1', 'big_1'])
+
+    def testRequestOrder(self):
+        self.dispatcher.submit('first_1', 'tpl')
+        for job in ['c_1', 'a_1', 'b_1']:
+            self.dispatcher.submit(job, 'tpl')
+        self.assertEqual(self.release()[-3:], ['c_1', 'a_1', 'b_1'])
+
+    def testCancel(self):
+        self.dispatcher.submit('first_1', 'tpl')
+        self.dispatcher.submit('second_1', 'tpl')
+        self.assertTrue(self.dispatcher.cancel('second_1'))
+        self.assertFalse(self.dispatcher.cancel('second_1'))
+        self.assertEqual(self.release(), ['first_1'])
+
+
+if __name__ == "__main__":
+    unittest.main()
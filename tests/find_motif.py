@@ -157,6 +157,67 @@ class TestFindMotif(unittest.TestCase):
         warn += '{}, expected {}, calculated {}'.format(smi, exp, count)
         self.assertEqual(exp, count, warn)
 
+    def testSameAsRecursive(self):
+        """
+        Test that start_motif finds the same chains in the same order
+        as the recursive reference implementation
+        """
+        data = {'CCCO[O]': 2,
+                'C=CC=C': 1,
+                'c1ccccc1': 1,
+                'CC(C)(C)OO': 1,
+                'OCC=CC(=O)C': 1,
+                }
+        motifs = [['H', 'C', 'C', 'O'],
+                  ['X', 'X', 'X', 'X'],
+                  ['C', 'C', 'C', 'C', 'C'],
+                  ['H', 'X', 'X', 'X', 'X', 'O'],
+                  ['O', 'X'],
+                  ]
+
+        for smi, mult in data.items():
+            st_pt = StationaryPoint(smi, 0, mult, smiles=smi)
+            st_pt.characterize()
+            bond = st_pt.bond
+            natom = st_pt.natom
+            atom = st_pt.atom
+            for eqv in [st_pt.atom_eqv, [[k] for k in range(natom)]]:
+                for motif in motifs:
+                    for start in [-1] + list(range(natom)):
+                        exp = find_motif.start_motif_recursive(motif, natom, bond, atom, start, eqv)
+                        cal = find_motif.start_motif(motif, natom, bond, atom, start, eqv)
+                        warn = 'Different motif hits for {} {} from atom {}'.format(smi, motif, start)
+                        self.assertEqual(exp, cal, warn)
+
+    def testMatcher(self):
+        """
+        Test that the motifs searched together by the matcher have the
+        same hits as when searched one by one
+        """
+        smi = 'C=CC(=O)C[CH2]'
+        st_pt = StationaryPoint(smi, 0, 2, smiles=smi)
+        st_pt.characterize()
+        bond = st_pt.bond
+        natom = st_pt.natom
+        atom = st_pt.atom
+        eqv = st_pt.atom_eqv
+        patterns = [(['X', 'X', 'X', 'H'], -1),
+                    (['X', 'X', 'X', 'X', 'H'], -1),
+                    (['X', 'X', 'X'], -1),
+                    (['X', 'X', 'X', 'X'], 5),
+                    (['C', 'X', 'O'], -1),
+                    (['O', 'C', 'C', 'C'], -1),
+                    ]
+        matcher = find_motif.MotifMatcher(natom, bond, atom, eqv)
+        for motif, start in patterns:
+            matcher.add(motif, start)
+        matcher.run()
+        for motif, start in patterns:
+            exp = find_motif.start_motif(motif, natom, bond, atom, start, eqv)
+            cal = matcher.get(motif, start)
+            warn = 'Different motif hits for {} from atom {}'.format(motif, start)
+            self.assertEqual(exp, cal, warn)
+
 
 if __name__ == "__main__":
     unittest.main()
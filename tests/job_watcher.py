@@ -0,0 +1,70 @@
+###################################################
+##                                               ##
+## This file is part of the KinBot code v2.0     ##
+##                                               ##
+## The contents are covered by the terms of the  ##
+## BSD 3-clause license included in the LICENSE  ##
+## file, found at the root.                      ##
+##                                               ##
+## Copyright 2018 National Technology &          ##
+## Engineering Solutions of Sandia, LLC (NTESS). ##
+## Under the terms of Contract DE-NA0003525 with ##
+## NTESS, the U.S. Government retains certain    ##
+## rights to this software.                      ##
+##                                               ##
+###################################################
+"""
+This class tests the waiting for the done stamp of the logs
+"""
+import os
+import shutil
+import asyncio
+import tempfile
+import unittest
+
+from kinbot.job_watcher import JobWatcher
+
+
+class TestJobWatcher(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.log = os.path.join(self.dir, 'rxn_1_2.log')
+        self.watcher = JobWatcher({'job_watch_max_interval': 1., 'job_watch_timeout': 2.})
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, text):
+        with open(self.log, 'w') as f:
+            f.write(text)
+
+    def testDone(self):
+        self.write('step 0\ndone\n')
+        self.assertEqual(self.watcher.wait([self.log]), [self.log])
+
+    def testStaleStamp(self):
+        """
+        The stamp left by the previous step does not count
+        until the log changes.
+        """
+        self.write('step 0\ndone\n')
+        self.watcher.mark_submitted(self.log)
+        self.assertFalse(self.watcher.is_finished(self.log))
+        self.assertEqual(self.watcher.wait([self.log], timeout=1.), [])
+
+        async def step():
+            await asyncio.sleep(0.5)
+            self.write('step 1\ndone\n')
+
+        async def wait():
+            writer = asyncio.ensure_future(step())
+            done = await self.watcher.wait_async([self.log], timeout=5.)
+            await writer
+            return done
+
+        self.assertEqual(asyncio.run(wait()), [self.log])
+        self.assertTrue(self.watcher.is_finished(self.log))
+
+
+if __name__ == "__main__":
+    unittest.main()
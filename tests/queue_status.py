@@ -0,0 +1,63 @@
+###################################################
+##                                               ##
+## This file is part of the KinBot code v2.0     ##
+##                                               ##
+## The contents are covered by the terms of the  ##
+## BSD 3-clause license included in the LICENSE  ##
+## file, found at the root.                      ##
+##                                               ##
+## Copyright 2018 National Technology &          ##
+## Engineering Solutions of Sandia, LLC (NTESS). ##
+## Under the terms of Contract DE-NA0003525 with ##
+## NTESS, the U.S. Government retains certain    ##
+## rights to this software.                      ##
+##                                               ##
+###################################################
+"""
+This class tests the parsing of the job lists of the queuing systems
+"""
+import time
+import unittest
+
+from kinbot.queue_status import QueueStatus
+
+
+class TestQueueStatus(unittest.TestCase):
+    def status(self, queuing):
+        par = {'queuing': queuing, 'queue_status_ttl': 60., 'username': 'user'}
+        return QueueStatus(par)
+
+    def testParseSlurm(self):
+        qs = self.status('slurm')
+        out = '1234\n  1235  \n\n1236_4\n1237_[1-3,7]\n'
+        self.assertEqual(qs.parse(out),
+                         {'1234', '1235', '1236_4', '1237_1', '1237_2', '1237_3', '1237_7'})
+
+    def testParsePbs(self):
+        qs = self.status('pbs')
+        out = '1234.server\n1235.server.domain\n1236\n'
+        self.assertEqual(qs.parse(out), {'1234', '1235', '1236'})
+
+    def testExpandArray(self):
+        qs = self.status('slurm')
+        self.assertEqual(qs.expand_array('123_[1-5%2]'),
+                         {'123_1', '123_2', '123_3', '123_4', '123_5'})
+        self.assertEqual(qs.expand_array('123_[0-2,5,8-9%10]'),
+                         {'123_0', '123_1', '123_2', '123_5', '123_8', '123_9'})
+        self.assertEqual(qs.expand_array('123_[4]'), {'123_4'})
+
+    def testAddRemove(self):
+        qs = self.status('slurm')
+        # a fresh snapshot, so that the queue is not asked
+        qs.stamp = time.time()
+        self.assertFalse(qs.is_queued(42))
+        qs.add(42)
+        self.assertTrue(qs.is_queued(42))
+        self.assertTrue(qs.is_queued('42'))
+        qs.remove('42')
+        self.assertFalse(qs.is_queued(42))
+        self.assertFalse(qs.is_queued(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
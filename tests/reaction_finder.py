@@ -0,0 +1,192 @@
+###################################################
+##                                               ##
+## This file is part of the KinBot code v2.0     ##
+##                                               ##
+## The contents are covered by the terms of the  ##
+## BSD 3-clause license included in the LICENSE  ##
+## file, found at the root.                      ##
+##                                               ##
+## Copyright 2018 National Technology &          ##
+## Engineering Solutions of Sandia, LLC (NTESS). ##
+## Under the terms of Contract DE-NA0003525 with ##
+## NTESS, the U.S. Government retains certain    ##
+## rights to this software.                      ##
+##                                               ##
+###################################################
+"""
+This class tests the search of the reaction families
+"""
+import os
+import json
+import random
+import shutil
+import tempfile
+import unittest
+
+from kinbot.parameters import Parameters
+from kinbot.reaction_finder import ReactionFinder
+from kinbot.stationary_pt import StationaryPoint
+
+
+def pairwise_new_reaction(rf, rxns, name, a=None, b=None, c=None, d=None, e=None,
+                          length=None, full=False, cross=False, aid=False, solute_only=True):
+    """
+    new_reaction comparing each instance with all the accepted ones,
+    which is how the duplicates were found before the index.
+    """
+    for inst in rxns:
+        new = True
+        for instance in rf.reactions[name]:
+            if aid:
+                if (rf.species.atomid[inst[a]] == rf.species.atomid[instance[a]] and
+                        rf.species.atomid[inst[b]] == rf.species.atomid[instance[b]]):
+                    new = False
+                    break
+                if (rf.species.atomid[inst[b]] == rf.species.atomid[instance[a]] and
+                        rf.species.atomid[inst[a]] == rf.species.atomid[instance[b]]):
+                    new = False
+                    break
+            if cross:
+                if inst[a] == instance[a] and inst[b] == instance[b]:
+                    new = False
+                    break
+                if inst[a] == instance[b] and inst[b] == instance[a]:
+                    new = False
+                    break
+            if any(ll is not None and inst[ll] != instance[ll] for ll in [a, b, c, d, e]):
+                continue
+            if length is not None and len(inst) != len(instance):
+                continue
+            if full and (len(inst) != len(instance) or any(inst[i] != instance[i] for i, _ in enumerate(inst))):
+                continue
+            new = False
+        if new:
+            if rf.par['cluster'] and solute_only:
+                testing = [inst[ll] for ll in [a, b, c, d, e] if ll is not None]
+                if len([tt for tt in testing if tt in rf.par['solute']]) == 0:
+                    continue
+            rf.reactions[name].append(inst)
+    return 0
+
+
+class TestReactionFinder(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        inp = os.path.join(self.dir, 'input.json')
+        with open(inp, 'w') as f:
+            json.dump({'title': 'test', 'smiles': 'C', 'barrier_threshold': 50.}, f)
+        self.par = Parameters(inp).par
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def finder(self, smi, mult):
+        species = StationaryPoint(smi, 0, mult, smiles=smi)
+        species.characterize()
+        species.calc_chemid()
+        species.reac_name = []
+        rf = ReactionFinder(species, self.par, None)
+        rf.reaction_matrix = lambda *args: 0
+        return rf
+
+    def find(self, smi, mult):
+        """
+        Search the reactions of the species, without writing anything.
+        """
+        rf = self.finder(smi, mult)
+        rf.find_reactions()
+        return rf.reactions
+
+    def testNewReaction(self):
+        """
+        The index of new_reaction keeps the same instances as comparing
+        them pairwise, in each of its modes.
+        """
+        rf = self.finder('CC(C)CC[CH2]', 2)
+        ref = self.finder('CC(C)CC[CH2]', 2)
+        rng = random.Random(1)
+        natom = rf.species.natom
+        modes = [{'a': 0, 'b': 1},
+                 {'a': 0, 'b': 2, 'c': 1},
+                 {'a': 0, 'b': -1, 'length': True},
+                 {'a': 0, 'b': 1, 'full': True},
+                 {'a': 0, 'b': -1, 'cross': True},
+                 {'a': 0, 'b': 1, 'aid': True},
+                 {'a': 0, 'b': -1, 'c': 1, 'cross': True, 'aid': True},
+                 ]
+        for cluster in [0, 1]:
+            rf.par['cluster'] = cluster
+            rf.par['solute'] = [0, 1, 2]
+            for mi, mode in enumerate(modes):
+                name = f'mode_{mi}'
+                rf.reactions[name] = []
+                ref.reactions[name] = []
+                # in several calls, as by the searches of the resonance structures
+                for _ in range(4):
+                    rxns = [[rng.randrange(3) for _ in range(rng.randrange(3, 5))] for _ in range(30)]
+                    rxns += [[rng.randrange(natom) for _ in range(rng.randrange(3, 5))] for _ in range(30)]
+                    rf.new_reaction(rxns, name, **mode)
+                    pairwise_new_reaction(ref, rxns, name, **mode)
+                self.assertEqual(rf.reactions[name], ref.reactions[name], msg=(cluster, mode))
+
+    def testReactionIndex(self):
+        """
+        The index follows the changes made to the list of instances
+        outside of new_reaction.
+        """
+        rf = self.finder('CCC', 1)
+        name = 'test'
+        rf.reactions[name] = []
+        rf.new_reaction([[0, 1, 2]], name, a=0, b=2)
+        # appended directly
+        rf.reactions[name].append([1, 2, 0])
+        rf.new_reaction([[1, 5, 0], [1, 2, 3]], name, a=0, b=2)
+        self.assertEqual(rf.reactions[name], [[0, 1, 2], [1, 2, 0], [1, 2, 3]])
+        # shortened in place
+        del rf.reactions[name][1:]
+        rf.new_reaction([[1, 5, 0]], name, a=0, b=2)
+        self.assertEqual(rf.reactions[name], [[0, 1, 2], [1, 5, 0]])
+        # replaced
+        rf.reactions[name] = [[1, 2, 3]]
+        rf.new_reaction([[0, 1, 2], [1, 4, 3]], name, a=0, b=2)
+        self.assertEqual(rf.reactions[name], [[1, 2, 3], [0, 1, 2]])
+        # other options
+        rf.new_reaction([[0, 4, 2], [0, 1, 3]], name, a=0, b=1)
+        self.assertEqual(rf.reactions[name], [[1, 2, 3], [0, 1, 2], [0, 4, 2]])
+
+    def testParallelSearch(self):
+        """
+        The parallel search finds the same reactions in the same order
+        as the serial one, also with several resonance structures.
+        """
+        self.par['families'] = ['all']
+        smi = 'C=CC=C[CH2]'
+        serial = self.find(smi, 2)
+        self.par['family_search_nproc'] = 2
+        parallel = self.find(smi, 2)
+        self.assertEqual(list(serial), list(parallel))
+        for name in serial:
+            self.assertEqual([list(map(int, inst)) for inst in serial[name]],
+                             [list(map(int, inst)) for inst in parallel[name]],
+                             msg=name)
+
+    def testClusterSolute(self):
+        """
+        In cluster mode, the 12_shift_S families are not restricted to
+        the solute, while the other families are.
+        """
+        self.par['families'] = ['12_shift_S_F', '12_shift_S_R', 'intra_H_migration']
+        smi = 'CS[CH2]'
+        free = self.find(smi, 2)
+        self.par['cluster'] = 1
+        self.par['solute'] = []
+        cluster = self.find(smi, 2)
+        self.assertGreater(len(free['12_shift_S_F']) + len(free['12_shift_S_R']), 0)
+        self.assertGreater(len(free['intra_H_migration']), 0)
+        self.assertEqual(free['12_shift_S_F'], cluster['12_shift_S_F'])
+        self.assertEqual(free['12_shift_S_R'], cluster['12_shift_S_R'])
+        self.assertEqual(cluster['intra_H_migration'], [])
+
+
+if __name__ == "__main__":
+    unittest.main()